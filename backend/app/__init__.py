@@ -3,9 +3,11 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
+from backend.app.utils.replica import init_replica_routing
+from backend.app.utils.sharding import ShardingSession, init_sharding
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": ShardingSession})
 migrate = Migrate()
 jwt = JWTManager()
 
@@ -28,18 +30,50 @@ def create_app(config_name='development'):
     # Enable CORS
     CORS(app)
 
+    # Send reads of read-only endpoints to the replica, if one is configured
+    init_replica_routing(app)
+
+    # Shed load and rate-limit clients before requests reach the database
+    from backend.app.utils.ratelimit import init_rate_limiting
+
+    init_rate_limiting(app)
+
+    # Work in the shard of the rental, transfer, vehicle or store a request names, if sharded.
+    # Registered after rate limiting: locating the shard queries the shard databases
+    init_sharding(app)
+
+    # Reject revoked tokens on every request
+    from backend.app.utils.revocation import init_token_revocation
+
+    init_token_revocation(jwt)
+
+    # Profile requests on demand (X-Profile header) or at PROFILE_SAMPLE_RATE
+    from backend.app.utils.profiling import init_profiling
+
+    init_profiling(app)
+
     # Register blueprints
     from backend.app.routes.vehicle_routes import vehicle_bp
     from backend.app.routes.user_routes import user_bp
     from backend.app.routes.store_routes import store_bp
     from backend.app.routes.rental_routes import rental_bp
     from backend.app.routes.vehicle_transfer_routes import vehicle_transfer_bp
+    from backend.app.routes.view_routes import view_bp
+    from backend.app.routes.report_routes import report_bp
+    from backend.app.routes.search_routes import search_bp
+    from backend.app.routes.job_routes import job_bp
+    from backend.app.routes.profile_routes import profile_bp
 
     app.register_blueprint(vehicle_bp, url_prefix='/api/vehicles')
     app.register_blueprint(user_bp, url_prefix='/api/users')
     app.register_blueprint(store_bp, url_prefix='/api/stores')
     app.register_blueprint(rental_bp, url_prefix='/api/rentals')
     app.register_blueprint(vehicle_transfer_bp, url_prefix='/api/transfers')
+    app.register_blueprint(view_bp, url_prefix='/api/views')
+    app.register_blueprint(report_bp, url_prefix='/api/reports')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    app.register_blueprint(job_bp, url_prefix='/api/jobs')
+    app.register_blueprint(profile_bp, url_prefix='/api/profiles')
 
     # Create a route for testing the API
     @app.route('/api/health')
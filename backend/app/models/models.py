@@ -1,7 +1,16 @@
 from datetime import datetime
+from sqlalchemy import DDL, event
 from backend.app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 
+RENTAL_STATUSES = ('pending', 'active', 'returned', 'cancelled', 'extension_requested')
+TRANSFER_STATUSES = ('pending', 'approved', 'completed', 'cancelled')
+
+# Native enums on PostgreSQL (4 bytes, compared as integers); elsewhere a
+# VARCHAR with a CHECK constraint. Python code and the JSON API see the strings.
+RentalStatus = db.Enum(*RENTAL_STATUSES, name='rental_status', create_constraint=True)
+TransferStatus = db.Enum(*TRANSFER_STATUSES, name='transfer_status', create_constraint=True)
+
 class VehicleType(db.Model):
     """Vehicle Type Model"""
     __tablename__ = 'vehicle_types'
@@ -61,6 +70,8 @@ class User(db.Model):
     # Authentication fields
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    # Bumped to revoke every token issued so far; new tokens carry the current value
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     rentals = db.relationship('Rental', backref='user', lazy=True)
@@ -102,6 +113,8 @@ class Store(db.Model):
     store_name = db.Column(db.String(100), nullable=False)
     address = db.Column(db.String(255), nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
+    latitude = db.Column(db.Float, nullable=True)  # Degrees, used for nearest-store lookup
+    longitude = db.Column(db.Float, nullable=True)
 
     # Relationships
     managers = db.relationship('User', backref='managed_store', lazy=True)
@@ -113,7 +126,9 @@ class Store(db.Model):
             'store_id': self.store_id,
             'store_name': self.store_name,
             'address': self.address,
-            'phone_number': self.phone_number
+            'phone_number': self.phone_number,
+            'latitude': self.latitude,
+            'longitude': self.longitude
         }
 
 class VehicleTransfer(db.Model):
@@ -121,11 +136,11 @@ class VehicleTransfer(db.Model):
     __tablename__ = 'vehicle_transfers'
 
     transfer_id = db.Column(db.Integer, primary_key=True)
-    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.vehicle_id'), nullable=False)
-    source_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False)
-    destination_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.vehicle_id'), nullable=False, index=True)
+    source_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False, index=True)
+    destination_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False, index=True)
     transfer_date = db.Column(db.Date, default=datetime.utcnow, nullable=False)
-    transfer_status = db.Column(db.String(20), nullable=False, default='pending')  # pending, approved, completed, cancelled
+    transfer_status = db.Column(TransferStatus, nullable=False, default='pending')
     approved_by = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=True)
     completed_date = db.Column(db.Date, nullable=True)
     notes = db.Column(db.String(255), nullable=True)
@@ -156,17 +171,65 @@ class VehicleTransfer(db.Model):
 class Rental(db.Model):
     """Rental Model"""
     __tablename__ = 'rentals'
+    __table_args__ = (
+        # Serves overlap checks for a vehicle's rental periods
+        db.Index('ix_rentals_vehicle_period', 'vehicle_id', 'rental_date', 'expected_return_date'),
+        # Never reuse ids of rentals moved to the archive
+        {'sqlite_autoincrement': True},
+    )
 
     rental_id = db.Column(db.Integer, primary_key=True)
     rental_date = db.Column(db.Date, nullable=False)
-    rental_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    rental_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.vehicle_id'), nullable=True)  # Changed to nullable
     vehicle_type_id = db.Column(db.Integer, db.ForeignKey('vehicle_types.type_id'), nullable=True)  # Added field for user's preferred vehicle type
     expected_return_date = db.Column(db.Date, nullable=False)
-    return_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False)
-    rental_status = db.Column(db.String(20), nullable=False, default='pending')  # pending, active, returned, cancelled, extension_requested
+    return_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False, index=True)
+    rental_status = db.Column(RentalStatus, nullable=False, default='pending')
+    is_overdue = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'rental_id': self.rental_id,
+            'rental_date': self.rental_date.strftime('%Y-%m-%d'),
+            'rental_store_id': self.rental_store_id,
+            'user_id': self.user_id,
+            'vehicle_id': self.vehicle_id,
+            'vehicle_type_id': self.vehicle_type_id,
+            'expected_return_date': self.expected_return_date.strftime('%Y-%m-%d'),
+            'return_store_id': self.return_store_id,
+            'rental_status': self.rental_status,
+            'is_overdue': self.is_overdue,
+            'user': self.user.to_dict() if self.user else None,
+            'vehicle': self.vehicle.to_dict() if self.vehicle else None,
+            'vehicle_type': self.vehicle_type.to_dict() if self.vehicle_type else None,
+            'rental_store': self.rental_store.to_dict() if self.rental_store else None,
+            'return_store': self.return_store.to_dict() if self.return_store else None
+        }
+
+class ArchivedRental(db.Model):
+    """Archived Rental Model (returned / cancelled rentals moved out of the hot table)"""
+    __tablename__ = 'rentals_archive'
+
+    rental_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rental_date = db.Column(db.Date, nullable=False, index=True)
+    rental_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.vehicle_id'), nullable=True, index=True)
+    vehicle_type_id = db.Column(db.Integer, db.ForeignKey('vehicle_types.type_id'), nullable=True)
+    expected_return_date = db.Column(db.Date, nullable=False)
+    return_store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False, index=True)
+    rental_status = db.Column(RentalStatus, nullable=False)  # returned, cancelled
     is_overdue = db.Column(db.Boolean, nullable=False, default=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Relationships (read-only, the archive is never modified through the ORM)
+    user = db.relationship('User', lazy=True, viewonly=True)
+    vehicle = db.relationship('Vehicle', lazy=True, viewonly=True)
+    vehicle_type = db.relationship('VehicleType', lazy=True, viewonly=True)
+    rental_store = db.relationship('Store', foreign_keys=[rental_store_id], lazy=True, viewonly=True)
+    return_store = db.relationship('Store', foreign_keys=[return_store_id], lazy=True, viewonly=True)
 
     def to_dict(self):
         return {
@@ -180,9 +243,196 @@ class Rental(db.Model):
             'return_store_id': self.return_store_id,
             'rental_status': self.rental_status,
             'is_overdue': self.is_overdue,
+            'archived': True,
             'user': self.user.to_dict() if self.user else None,
             'vehicle': self.vehicle.to_dict() if self.vehicle else None,
             'vehicle_type': self.vehicle_type.to_dict() if self.vehicle_type else None,
             'rental_store': self.rental_store.to_dict() if self.rental_store else None,
             'return_store': self.return_store.to_dict() if self.return_store else None
         }
+
+# On PostgreSQL a GiST exclusion constraint guarantees that no two rentals holding
+# the same vehicle have overlapping [rental_date, expected_return_date) periods
+event.listen(
+    Rental.__table__,
+    'after_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'),
+)
+event.listen(
+    Rental.__table__,
+    'after_create',
+    DDL(
+        "ALTER TABLE rentals ADD CONSTRAINT rentals_vehicle_period_excl EXCLUDE USING gist ("
+        "vehicle_id WITH =, "
+        "daterange(rental_date, GREATEST(expected_return_date, rental_date + 1)) WITH &&"
+        ") WHERE (rental_status IN ('active', 'extension_requested'))"
+    ).execute_if(dialect='postgresql'),
+)
+
+class RentalDailyRollup(db.Model):
+    """Daily Rental Rollup Model (pre-aggregated per day, store and vehicle type)"""
+    __tablename__ = 'rental_daily_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'store_id', 'vehicle_type_id', name='uq_rental_daily_rollups_key'),
+    )
+
+    rollup_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.store_id'), nullable=False)
+    vehicle_type_id = db.Column(db.Integer, db.ForeignKey('vehicle_types.type_id'), nullable=False)
+    # Flow counters, incremented as rental transitions happen
+    new_rentals = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    # Gauges, snapshotted by the rollup job
+    active_count = db.Column(db.Integer, nullable=False, default=0)
+    overdue_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'day': self.day.strftime('%Y-%m-%d'),
+            'store_id': self.store_id,
+            'vehicle_type_id': self.vehicle_type_id,
+            'new_rentals': self.new_rentals,
+            'returns': self.returns,
+            'cancellations': self.cancellations,
+            'active_count': self.active_count,
+            'overdue_count': self.overdue_count
+        }
+
+class Job(db.Model):
+    """Background Job Model (durable queue of deferred work, run by `flask worker`)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_claim', 'queue', 'status', 'run_at'),
+    )
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    # Enqueueing twice with the same key creates a single job
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'queue': self.queue,
+            'name': self.name,
+            'payload': self.payload,
+            'status': self.status,
+            'idempotency_key': self.idempotency_key,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None,
+            'locked_by': self.locked_by,
+            'last_error': self.last_error
+        }
+
+class IdempotencyKey(db.Model):
+    """Idempotency Key Model (saved responses of POST requests sent with an Idempotency-Key header)"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'endpoint', 'key', name='uq_idempotency_keys_scope'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    # Hash of the request body, so a key reused for a different request is rejected
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, completed
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    """Rate Limit Bucket Model (token buckets shared by all workers when RATELIMIT_BACKEND is "database")"""
+    __tablename__ = 'rate_limit_buckets'
+
+    bucket_key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix timestamp of the last refill
+
+class TokenRevocation(db.Model):
+    """Token Revocation Model (revoked token ids and per-user token version bumps)"""
+    __tablename__ = 'token_revocations'
+
+    revocation_id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=True)  # Set when a single token is revoked
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
+    token_version = db.Column(db.Integer, nullable=True)  # Set when all of a user's tokens are revoked
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # No affected token outlives this
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class StatusEvent(db.Model):
+    """Status Event Model (append-only log of rental and transfer status transitions)"""
+    __tablename__ = 'status_events'
+    __table_args__ = (
+        db.Index('ix_status_events_entity', 'entity_type', 'entity_id', 'occurred_at'),
+        db.Index('ix_status_events_vehicle', 'vehicle_id', 'occurred_at'),
+    )
+
+    event_id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # rental, transfer
+    # No foreign keys: events outlive archived rentals
+    entity_id = db.Column(db.Integer, nullable=False)
+    vehicle_id = db.Column(db.Integer, nullable=True)
+    old_status = db.Column(db.String(20), nullable=True)  # None when the entity was created
+    new_status = db.Column(db.String(20), nullable=False)
+    actor_id = db.Column(db.Integer, nullable=True)  # None for background jobs and CLI commands
+    # Other tracked fields changed together with the status, as {field: [old, new]}
+    details = db.Column(db.JSON, nullable=True)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'event_id': self.event_id,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'vehicle_id': self.vehicle_id,
+            'old_status': self.old_status,
+            'new_status': self.new_status,
+            'actor_id': self.actor_id,
+            'details': self.details,
+            'occurred_at': self.occurred_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+# On PostgreSQL, trigram GIN indexes back the substring / similarity matching of /api/search
+SEARCH_TRIGRAM_COLUMNS = (
+    (User.__table__, 'name'),
+    (User.__table__, 'email'),
+    (User.__table__, 'phone_number'),
+    (Store.__table__, 'store_name'),
+    (Store.__table__, 'address'),
+    (VehicleType.__table__, 'brand'),
+    (VehicleType.__table__, 'model'),
+)
+for _table, _column in SEARCH_TRIGRAM_COLUMNS:
+    event.listen(
+        _table,
+        'after_create',
+        DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'),
+    )
+    event.listen(
+        _table,
+        'after_create',
+        DDL(
+            f'CREATE INDEX IF NOT EXISTS ix_{_table.name}_{_column}_trgm '
+            f'ON {_table.name} USING gin ({_column} gin_trgm_ops)'
+        ).execute_if(dialect='postgresql'),
+    )
@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.app.models.models import Job
+from backend.app.utils.statements import load_user_or_404
+from backend.app.utils.jobs import queue_stats
+from backend.app.utils.permissions import is_global_admin
+
+job_bp = Blueprint("jobs", __name__)
+
+
+@job_bp.route("/stats", methods=["GET"])
+@jwt_required()
+def get_job_stats():
+    """Job queue depth, latency and recent failures (global admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    if not is_global_admin(current_user):
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Global admin access required."}
+        ), 200
+
+    queue = request.args.get("queue")
+    stats = queue_stats(queue)
+
+    failed = Job.query.filter_by(status="failed")
+    if queue:
+        failed = failed.filter_by(queue=queue)
+    stats["recent_failures"] = [
+        job.to_dict() for job in failed.order_by(Job.finished_at.desc()).limit(20)
+    ]
+
+    return jsonify({"code": 200, "msg": "Success", "data": stats})
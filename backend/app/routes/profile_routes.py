@@ -0,0 +1,65 @@
+from flask import Blueprint, request, jsonify, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.app.utils.statements import load_user_or_404
+from backend.app.utils.permissions import is_global_admin
+from backend.app.utils.profiling import list_profiles, load_profile, profile_path
+
+profile_bp = Blueprint("profiles", __name__)
+
+DOWNLOADS = {
+    "pstats": (".prof", "application/octet-stream"),
+    "stacks": (".folded", "text/plain"),
+}
+
+
+def _global_admin_or_403():
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+    if not is_global_admin(current_user):
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Global admin access required."}
+        ), 200
+    return None
+
+
+@profile_bp.route("", methods=["GET"])
+@jwt_required()
+def get_profiles():
+    """List stored request profiles, newest first (global admin only)"""
+    denied = _global_admin_or_403()
+    if denied:
+        return denied
+
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    return jsonify({"code": 200, "msg": "Success", "data": list_profiles(limit)})
+
+
+@profile_bp.route("/<profile_id>", methods=["GET"])
+@jwt_required()
+def get_profile(profile_id):
+    """Get a request profile with its SQL timeline and slowest functions (global admin only)"""
+    denied = _global_admin_or_403()
+    if denied:
+        return denied
+
+    profile = load_profile(profile_id)
+    if profile is None:
+        return jsonify({"code": 404, "msg": "Profile not found"}), 200
+    return jsonify({"code": 200, "msg": "Success", "data": profile})
+
+
+@profile_bp.route("/<profile_id>/<kind>", methods=["GET"])
+@jwt_required()
+def download_profile(profile_id, kind):
+    """Download a profile as cProfile stats (pstats) or collapsed stacks (stacks) (global admin only)"""
+    denied = _global_admin_or_403()
+    if denied:
+        return denied
+
+    if kind not in DOWNLOADS:
+        return jsonify({"code": 400, "msg": "Download must be one of: pstats, stacks"}), 200
+    suffix, mimetype = DOWNLOADS[kind]
+    path = profile_path(profile_id, suffix)
+    if path is None:
+        return jsonify({"code": 404, "msg": "Profile not found"}), 200
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=f"{profile_id}{suffix}")
@@ -1,41 +1,57 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.app import db
-from backend.app.models.models import Rental, User, Vehicle, Store, VehicleType
+from backend.app.models.models import ArchivedRental, Rental
+from backend.app.utils.statements import (
+    load_user_or_404,
+    load_vehicle,
+    store_exists,
+    vehicle_type_exists,
+)
 from backend.app.utils.rental_utils import check_overdue_rentals, check_rental_overdue
+from backend.app.utils.archive import get_rental_history
+from backend.app.utils.bulk import bulk_transition, merge_bulk_results
+from backend.app.utils.events import rental_events
+from backend.app.utils.jobs import enqueue
+from backend.app.utils.permissions import get_rental_or_404, rental_scope, scoped_rentals
+from backend.app.utils.rollups import record_rental_transition
+from backend.app.utils.reservations import find_conflict, is_reservation_conflict, period_end
+from backend.app.routes.view_routes import get_pagination_args
+from backend.app.utils.idempotency import idempotent
+from backend.app.utils.replica import on_primary, read_replica
+from backend.app.utils.sharding import RENTAL_TABLES, gather, gather_page, group_by_shard, use_shard
 from datetime import datetime
+from sqlalchemy.exc import DBAPIError
 
 rental_bp = Blueprint("rentals", __name__)
 
 
 @rental_bp.route("", methods=["GET"])
 @jwt_required()
+@read_replica
 def get_rentals():
     """Get rentals based on user role"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
-
-    # Check for overdue rentals
-    check_overdue_rentals()
-
-    # If user is global admin, return all rentals
-    if current_user.is_admin and current_user.managed_store_id is None:
-        rentals = Rental.query.all()
-    # If user is store admin, return rentals for their store
-    elif current_user.is_admin and current_user.managed_store_id is not None:
-        store_id = current_user.managed_store_id
-        rentals = Rental.query.filter(
-            (Rental.rental_store_id == store_id) | (Rental.return_store_id == store_id)
-        ).all()
-    # If user is regular user, return their rentals
-    else:
-        rentals = Rental.query.filter_by(user_id=current_user_id).all()
+    current_user = load_user_or_404(current_user_id)
+
+    def shard_rentals():
+        # Check for overdue rentals. The sweep writes to the primary, so it
+        # also reads there; the list below may still come from the replica
+        with on_primary():
+            check_overdue_rentals()
+
+        # Global admins see all rentals, store admins those from/to their store,
+        # regular users their own
+        return [rental.to_dict() for rental in scoped_rentals(current_user)]
 
     return jsonify(
         {
             "code": 200,
             "msg": "Success",
-            "data": [rental.to_dict() for rental in rentals],
+            "data": sorted(
+                (rental for part in gather(shard_rentals) for rental in part),
+                key=lambda rental: rental["rental_id"],
+            ),
         }
     )
 
@@ -45,12 +61,13 @@ def get_rentals():
 def get_rental(rental_id):
     """Get a specific rental"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
-    rental = Rental.query.get_or_404(rental_id)
+    # Archived rentals stay reachable by id
+    rental, permitted = get_rental_or_404(current_user, rental_id, "view", include_archived=True)
 
     # Check if user has permission to view this rental
-    if not current_user.is_admin and rental.user_id != current_user_id:
+    if not permitted and not current_user.is_admin:
         return jsonify(
             {
                 "code": 403,
@@ -58,29 +75,87 @@ def get_rental(rental_id):
             }
         ), 200
 
-    # If user is store admin, check if rental is from/to their store
-    if current_user.is_admin and current_user.managed_store_id is not None:
-        store_id = current_user.managed_store_id
-        if rental.rental_store_id != store_id and rental.return_store_id != store_id:
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only view rentals from/to your store.",
-                }
-            ), 200
+    # Store admins can only view rentals from/to their store
+    if not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only view rentals from/to your store.",
+            }
+        ), 200
 
-    # Check if rental is overdue
-    check_rental_overdue(rental)
+    # Check if rental is overdue; archived rentals are closed and never change
+    if not isinstance(rental, ArchivedRental):
+        check_rental_overdue(rental)
 
     return jsonify({"code": 200, "msg": "Success", "data": rental.to_dict()})
 
 
+@rental_bp.route("/<int:rental_id>/events", methods=["GET"])
+@jwt_required()
+def get_rental_events(rental_id):
+    """Get the status history of a rental"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    rental, permitted = get_rental_or_404(current_user, rental_id, "view", include_archived=True)
+    if not permitted:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. You cannot view this rental."}
+        ), 200
+
+    return jsonify(
+        {
+            "code": 200,
+            "msg": "Success",
+            "data": [e.to_dict() for e in rental_events(rental.rental_id)],
+        }
+    )
+
+
+@rental_bp.route("/history", methods=["GET"])
+@jwt_required()
+@read_replica
+def get_rental_history_page():
+    """Get a page of rentals including archived ones, newest first"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    def history_page(page, page_size):
+        rentals, total = get_rental_history(
+            rental_scope(current_user),
+            rental_scope(current_user, "view", ArchivedRental),
+            page,
+            page_size,
+        )
+        return [rental.to_dict() for rental in rentals], total
+
+    page, page_size = get_pagination_args()
+    items, total = gather_page(
+        history_page, page, page_size, key=lambda r: (r["rental_date"], r["rental_id"]), reverse=True
+    )
+
+    return jsonify(
+        {
+            "code": 200,
+            "msg": "Success",
+            "data": {
+                "items": items,
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+            },
+        }
+    )
+
+
 @rental_bp.route("", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_rental():
     """Create a new rental request"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     data = request.json
     required_fields = (
@@ -98,33 +173,43 @@ def create_rental():
         ), 200
 
     # Check if stores exist
-    rental_store = Store.query.get(data["rental_store_id"])
-    return_store = Store.query.get(data["return_store_id"])
-    if not rental_store or not return_store:
+    if not all(store_exists(s) for s in {data["rental_store_id"], data["return_store_id"]}):
         return jsonify(
             {"code": 404, "msg": "Rental store or return store not found"}
         ), 200
 
     # Check if vehicle type exists
-    vehicle_type = VehicleType.query.get(data["vehicle_type_id"])
-    if not vehicle_type:
+    if not vehicle_type_exists(data["vehicle_type_id"]):
         return jsonify({"code": 404, "msg": "Vehicle type not found"}), 200
 
-    # Parse and validate expected return date
+    # Parse and validate the rental period; rental_date is optional and allows
+    # booking ahead, defaulting to today
     try:
+        today = datetime.utcnow().date()
+        rental_date = today
+        if data.get("rental_date"):
+            rental_date = datetime.strptime(data["rental_date"], "%Y-%m-%d").date()
+            if rental_date < today:
+                return jsonify(
+                    {"code": 400, "msg": "Rental date cannot be in the past"}
+                ), 200
         expected_return_date = datetime.strptime(
             data["expected_return_date"], "%Y-%m-%d"
         ).date()
-        if expected_return_date < datetime.utcnow().date():
+        if expected_return_date < today:
             return jsonify(
                 {"code": 400, "msg": "Expected return date cannot be in the past"}
             ), 200
+        if expected_return_date < rental_date:
+            return jsonify(
+                {"code": 400, "msg": "Expected return date cannot be before rental date"}
+            ), 200
     except ValueError:
         return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
 
     # Create rental with pending status (admin will assign vehicle later)
     rental = Rental(
-        rental_date=datetime.utcnow().date(),
+        rental_date=rental_date,
         rental_store_id=data["rental_store_id"],
         user_id=current_user_id,
         vehicle_id=None,  # Will be assigned by admin
@@ -135,6 +220,7 @@ def create_rental():
     )
 
     db.session.add(rental)
+    record_rental_transition(rental, "created", rental.rental_date)
     db.session.commit()
 
     return jsonify(
@@ -151,7 +237,7 @@ def create_rental():
 def approve_rental(rental_id):
     """Approve a rental request and assign a vehicle (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -160,33 +246,38 @@ def approve_rental(rental_id):
         ), 200
 
     # If store admin, check if rental is from their store
-    if current_user.managed_store_id is not None:
-        rental = Rental.query.get_or_404(rental_id)
-        if rental.rental_store_id != current_user.managed_store_id:
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only approve rentals from your store.",
-                }
-            ), 200
+    rental, permitted = get_rental_or_404(current_user, rental_id, "approve")
+    if not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only approve rentals from your store.",
+            }
+        ), 200
 
     data = request.json
     if not data or "vehicle_id" not in data:
         return jsonify({"code": 400, "msg": "Vehicle ID is required"}), 200
 
-    rental = Rental.query.get_or_404(rental_id)
-
     # Check if vehicle exists
-    vehicle = Vehicle.query.get(data["vehicle_id"])
+    vehicle = load_vehicle(data["vehicle_id"])
     if not vehicle:
         return jsonify({"code": 404, "msg": "Vehicle not found"}), 200
 
-    # Check if vehicle is already rented
-    active_rental = Rental.query.filter_by(
-        vehicle_id=data["vehicle_id"], rental_status="active"
-    ).first()
-    if active_rental:
-        return jsonify({"code": 400, "msg": "Vehicle is already rented"}), 200
+    # Check if vehicle is already rented or reserved during the rental period
+    conflict = find_conflict(
+        data["vehicle_id"],
+        rental.rental_date,
+        period_end(rental.rental_date, rental.expected_return_date),
+        exclude_rental_id=rental.rental_id,
+    )
+    if conflict:
+        return jsonify(
+            {
+                "code": 400,
+                "msg": f"Vehicle is already rented during this period (rental #{conflict.rental_id})",
+            }
+        ), 200
 
     # Check if vehicle is at the rental store
     if vehicle.store_id != rental.rental_store_id:
@@ -219,7 +310,16 @@ def approve_rental(rental_id):
     rental.vehicle_id = data["vehicle_id"]
     rental.rental_status = "active"
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except DBAPIError as e:
+        # A concurrent approval took the vehicle (PostgreSQL exclusion constraint)
+        db.session.rollback()
+        if not is_reservation_conflict(e):
+            raise
+        return jsonify(
+            {"code": 409, "msg": "Vehicle was just rented for an overlapping period"}
+        ), 200
 
     return jsonify(
         {"code": 200, "msg": "Rental approved successfully", "data": rental.to_dict()}
@@ -231,12 +331,12 @@ def approve_rental(rental_id):
 def return_rental(rental_id):
     """Mark a rental as returned (admin or rental owner)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
-    rental = Rental.query.get_or_404(rental_id)
+    rental, permitted = get_rental_or_404(current_user, rental_id, "return")
 
     # Check if user is the rental owner or an admin
-    if not current_user.is_admin and rental.user_id != current_user_id:
+    if not permitted and not current_user.is_admin:
         return jsonify(
             {
                 "code": 403,
@@ -245,11 +345,7 @@ def return_rental(rental_id):
         ), 200
 
     # If store admin, check if rental is to their store
-    if (
-        current_user.is_admin
-        and current_user.managed_store_id is not None
-        and rental.return_store_id != current_user.managed_store_id
-    ):
+    if not permitted:
         return jsonify(
             {
                 "code": 403,
@@ -272,32 +368,21 @@ def return_rental(rental_id):
 
     # Update vehicle's store_id to the return store only if it's being returned to the same store it was rented from
     if rental.vehicle_id != -1:  # Skip for pending rentals
-        vehicle = Vehicle.query.get(rental.vehicle_id)
+        vehicle = load_vehicle(rental.vehicle_id)
         if vehicle:
             if rental.return_store_id != rental.rental_store_id:
-                # Need to create a vehicle transfer if returning to a different store
-                from backend.app.models.models import VehicleTransfer
-
-                # Check if there's already a pending transfer
-                existing_transfer = VehicleTransfer.query.filter_by(
-                    vehicle_id=rental.vehicle_id, transfer_status="pending"
-                ).first()
-
-                if not existing_transfer:
-                    # Create a transfer request
-                    transfer = VehicleTransfer(
-                        vehicle_id=rental.vehicle_id,
-                        source_store_id=rental.rental_store_id,
-                        destination_store_id=rental.return_store_id,
-                        transfer_date=datetime.utcnow().date(),
-                        transfer_status="pending",
-                        notes=f"Auto-created from rental #{rental.rental_id} return",
-                    )
-                    db.session.add(transfer)
+                # Returning to a different store needs a vehicle transfer, which the
+                # background worker creates once this return is committed
+                enqueue(
+                    "create_return_transfer",
+                    {"rental_id": rental.rental_id},
+                    idempotency_key=f"return-transfer:{rental.rental_id}",
+                )
             else:
                 # If returned to the same store, update directly
                 vehicle.store_id = rental.return_store_id
 
+    record_rental_transition(rental, "returned")
     db.session.commit()
 
     return jsonify(
@@ -310,12 +395,12 @@ def return_rental(rental_id):
 def request_extension(rental_id):
     """Request an extension for a rental"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
-    rental = Rental.query.get_or_404(rental_id)
+    rental, permitted = get_rental_or_404(current_user, rental_id, "extend")
 
     # Check if user owns this rental
-    if rental.user_id != current_user_id:
+    if not permitted:
         return jsonify(
             {
                 "code": 403,
@@ -353,13 +438,40 @@ def request_extension(rental_id):
     except ValueError:
         return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
 
+    # Check that the vehicle is not promised to another rental during the extension
+    if rental.vehicle_id is not None:
+        conflict = find_conflict(
+            rental.vehicle_id,
+            rental.expected_return_date,
+            new_return_date,
+            exclude_rental_id=rental.rental_id,
+        )
+        if conflict:
+            return jsonify(
+                {
+                    "code": 409,
+                    "msg": "Vehicle is reserved by another rental during the requested extension",
+                }
+            ), 200
+
     # Update rental status to extension_requested and store new date
     rental.rental_status = "extension_requested"
     # Store the requested new date in a temporary field or in a separate extension request table
     # For simplicity, we'll just update the expected return date directly
     rental.expected_return_date = new_return_date
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except DBAPIError as e:
+        db.session.rollback()
+        if not is_reservation_conflict(e):
+            raise
+        return jsonify(
+            {
+                "code": 409,
+                "msg": "Vehicle is reserved by another rental during the requested extension",
+            }
+        ), 200
 
     return jsonify(
         {
@@ -375,7 +487,7 @@ def request_extension(rental_id):
 def approve_extension(rental_id):
     """Approve an extension request (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -383,17 +495,15 @@ def approve_extension(rental_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    rental = Rental.query.get_or_404(rental_id)
-
     # If store admin, check if rental is from their store
-    if current_user.managed_store_id is not None:
-        if rental.rental_store_id != current_user.managed_store_id:
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only approve extensions for rentals from your store.",
-                }
-            ), 200
+    rental, permitted = get_rental_or_404(current_user, rental_id, "review_extension")
+    if not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only approve extensions for rentals from your store.",
+            }
+        ), 200
 
     # Check if rental has an extension request
     if rental.rental_status != "extension_requested":
@@ -424,7 +534,7 @@ def approve_extension(rental_id):
 def reject_extension(rental_id):
     """Reject an extension request (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -432,17 +542,15 @@ def reject_extension(rental_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    rental = Rental.query.get_or_404(rental_id)
-
     # If store admin, check if rental is from their store
-    if current_user.managed_store_id is not None:
-        if rental.rental_store_id != current_user.managed_store_id:
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only reject extensions for rentals from your store.",
-                }
-            ), 200
+    rental, permitted = get_rental_or_404(current_user, rental_id, "review_extension")
+    if not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only reject extensions for rentals from your store.",
+            }
+        ), 200
 
     # Check if rental has an extension request
     if rental.rental_status != "extension_requested":
@@ -485,13 +593,13 @@ def reject_extension(rental_id):
 def cancel_rental(rental_id):
     """Cancel a rental (user can cancel pending, admin can cancel any)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
-    rental = Rental.query.get_or_404(rental_id)
+    rental, permitted = get_rental_or_404(current_user, rental_id, "cancel")
 
     # Regular users can only cancel their own pending rentals
     if not current_user.is_admin:
-        if rental.user_id != current_user_id:
+        if not permitted:
             return jsonify(
                 {
                     "code": 403,
@@ -505,17 +613,13 @@ def cancel_rental(rental_id):
             ), 200
 
     # Store admins can only cancel rentals from/to their store
-    if current_user.is_admin and current_user.managed_store_id is not None:
-        if (
-            rental.rental_store_id != current_user.managed_store_id
-            and rental.return_store_id != current_user.managed_store_id
-        ):
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only cancel rentals from/to your store.",
-                }
-            ), 200
+    if current_user.is_admin and not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only cancel rentals from/to your store.",
+            }
+        ), 200
 
     # Cannot cancel already returned or cancelled rentals
     if rental.rental_status in ["returned", "cancelled"]:
@@ -530,8 +634,121 @@ def cancel_rental(rental_id):
     rental.rental_status = "cancelled"
     rental.is_overdue = False
 
+    record_rental_transition(rental, "cancelled")
     db.session.commit()
 
     return jsonify(
         {"code": 200, "msg": "Rental cancelled successfully", "data": rental.to_dict()}
     )
+
+
+def _bulk_rental_ids(values):
+    """Validate a list of rental ids from a bulk request body, or return an error message."""
+    if not isinstance(values, list) or not values:
+        return None, "rental_ids must be a non-empty list"
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return None, "rental_ids must be integers"
+    limit = current_app.config["BULK_MAX_RENTALS"]
+    if len(values) > limit:
+        return None, f"At most {limit} rentals can be processed per request"
+    return values, None
+
+
+def _run_bulk_transition(current_user, action, rental_ids, return_dates=None):
+    # With sharding, each shard's rentals are updated in a transaction of their own
+    parts = []
+    for shard, shard_rental_ids in group_by_shard(RENTAL_TABLES, rental_ids).items():
+        with use_shard(shard):
+            parts.append(bulk_transition(current_user, action, shard_rental_ids, return_dates))
+            db.session.commit()
+    result = merge_bulk_results(parts, rental_ids)
+    return jsonify(
+        {
+            "code": 200,
+            "msg": f"{result['succeeded']} succeeded, {result['failed']} failed",
+            "data": result,
+        }
+    )
+
+
+@rental_bp.route("/bulk/return", methods=["PUT"])
+@jwt_required()
+def bulk_return_rentals():
+    """Mark many rentals as returned (admin or rental owner)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    rental_ids, error = _bulk_rental_ids((request.json or {}).get("rental_ids"))
+    if error:
+        return jsonify({"code": 400, "msg": error}), 200
+
+    return _run_bulk_transition(current_user, "return", rental_ids)
+
+
+@rental_bp.route("/bulk/cancel", methods=["PUT"])
+@jwt_required()
+def bulk_cancel_rentals():
+    """Cancel many rentals (user can cancel pending, admin can cancel any)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    rental_ids, error = _bulk_rental_ids((request.json or {}).get("rental_ids"))
+    if error:
+        return jsonify({"code": 400, "msg": error}), 200
+
+    return _run_bulk_transition(current_user, "cancel", rental_ids)
+
+
+@rental_bp.route("/bulk/approve-extension", methods=["PUT"])
+@jwt_required()
+def bulk_approve_extensions():
+    """Approve many extension requests (admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Admin access required."}
+        ), 200
+
+    rental_ids, error = _bulk_rental_ids((request.json or {}).get("rental_ids"))
+    if error:
+        return jsonify({"code": 400, "msg": error}), 200
+
+    return _run_bulk_transition(current_user, "approve_extension", rental_ids)
+
+
+@rental_bp.route("/bulk/reject-extension", methods=["PUT"])
+@jwt_required()
+def bulk_reject_extensions():
+    """Reject many extension requests, restoring each original return date (admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Admin access required."}
+        ), 200
+
+    # Each item: {"rental_id": ..., "original_return_date": "YYYY-MM-DD"}
+    items = (request.json or {}).get("items")
+    if not isinstance(items, list) or not all(
+        isinstance(item, dict) and "original_return_date" in item for item in items
+    ):
+        return jsonify(
+            {"code": 400, "msg": "items must be a list of rental_id / original_return_date pairs"}
+        ), 200
+
+    rental_ids, error = _bulk_rental_ids([item.get("rental_id") for item in items])
+    if error:
+        return jsonify({"code": 400, "msg": error}), 200
+
+    try:
+        return_dates = {
+            item["rental_id"]: datetime.strptime(item["original_return_date"], "%Y-%m-%d").date()
+            for item in items
+        }
+    except (TypeError, ValueError):
+        return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
+
+    return _run_bulk_transition(current_user, "reject_extension", rental_ids, return_dates)
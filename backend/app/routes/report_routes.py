@@ -0,0 +1,139 @@
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.app.utils.statements import load_user_or_404
+from backend.app.utils.reports import revenue_report
+from backend.app.utils.rollups import rental_trend
+from backend.app.utils.utilization import cached_utilization_report
+from backend.app.utils.replica import read_replica
+from datetime import datetime, timedelta
+
+report_bp = Blueprint("reports", __name__)
+
+
+def parse_date_arg(name):
+    """Parse an optional YYYY-MM-DD query argument (raises ValueError)."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+@report_bp.route("/revenue", methods=["GET"])
+@jwt_required()
+@read_replica
+def get_revenue_report():
+    """Revenue per store / vehicle type / period (admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    # Check if user is admin
+    if not current_user.is_admin:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Admin access required."}
+        ), 200
+
+    try:
+        start_date = parse_date_arg("start")
+        end_date = parse_date_arg("end")
+    except ValueError:
+        return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
+
+    group_by = [g for g in request.args.get("group_by", "store,period").split(",") if g]
+    period = request.args.get("period", "month")
+
+    # Store admins only see revenue generated by their own store
+    store_id = request.args.get("store_id", type=int)
+    if current_user.managed_store_id is not None:
+        store_id = current_user.managed_store_id
+
+    try:
+        report = revenue_report(
+            start_date=start_date,
+            end_date=end_date,
+            group_by=group_by,
+            period=period,
+            store_id=store_id,
+            surcharge_rate=current_app.config["OVERDUE_SURCHARGE_RATE"],
+        )
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 200
+
+    return jsonify({"code": 200, "msg": "Success", "data": report})
+
+
+@report_bp.route("/utilization", methods=["GET"])
+@jwt_required()
+@read_replica
+def get_utilization_report():
+    """Fleet utilization per vehicle / type / store over a date window (admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    # Check if user is admin
+    if not current_user.is_admin:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Admin access required."}
+        ), 200
+
+    try:
+        start_date = parse_date_arg("start")
+        end_date = parse_date_arg("end")
+    except ValueError:
+        return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
+    if not start_date or not end_date:
+        return jsonify({"code": 400, "msg": "Missing required parameters: start, end"}), 200
+
+    # Store admins only see vehicles at their own store
+    store_id = request.args.get("store_id", type=int)
+    if current_user.managed_store_id is not None:
+        store_id = current_user.managed_store_id
+
+    try:
+        report = cached_utilization_report(
+            start_date,
+            end_date,
+            group_by=request.args.get("group_by", "vehicle"),
+            store_id=store_id,
+            ttl=current_app.config["UTILIZATION_CACHE_TTL"],
+        )
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 200
+
+    return jsonify({"code": 200, "msg": "Success", "data": report})
+
+
+@report_bp.route("/rental-trend", methods=["GET"])
+@jwt_required()
+@read_replica
+def get_rental_trend():
+    """Daily rental counters from the rollup table (admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    # Check if user is admin
+    if not current_user.is_admin:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Admin access required."}
+        ), 200
+
+    try:
+        end_date = parse_date_arg("end") or datetime.utcnow().date()
+        start_date = parse_date_arg("start") or end_date - timedelta(days=6)
+    except ValueError:
+        return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
+    if end_date < start_date:
+        return jsonify({"code": 400, "msg": "End date must not be before start date"}), 200
+
+    # Store admins only see their own store
+    store_id = request.args.get("store_id", type=int)
+    if current_user.managed_store_id is not None:
+        store_id = current_user.managed_store_id
+
+    trend = rental_trend(
+        start_date,
+        end_date,
+        store_id=store_id,
+        vehicle_type_id=request.args.get("vehicle_type_id", type=int),
+    )
+
+    return jsonify({"code": 200, "msg": "Success", "data": trend})
@@ -0,0 +1,40 @@
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.app.utils.statements import load_user_or_404
+from backend.app.routes.view_routes import get_pagination_args
+from backend.app.utils.search import SEARCH_KINDS, search
+from backend.app.utils.replica import read_replica
+
+search_bp = Blueprint("search", __name__)
+
+
+@search_bp.route("", methods=["GET"])
+@jwt_required()
+@read_replica
+def search_all():
+    """Search users, stores, vehicle types and rental ids visible to the current user"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"code": 400, "msg": "Missing search query"}), 200
+
+    kinds = [k for k in request.args.get("kinds", ",".join(SEARCH_KINDS)).split(",") if k]
+    unknown = set(kinds) - set(SEARCH_KINDS)
+    if unknown:
+        return jsonify(
+            {"code": 400, "msg": f"Unsupported kinds: {', '.join(sorted(unknown))}"}
+        ), 200
+
+    page, page_size = get_pagination_args()
+    results = search(
+        query,
+        current_user,
+        kinds=kinds,
+        page=page,
+        page_size=page_size,
+        ttl=current_app.config["SEARCH_INDEX_TTL"],
+    )
+
+    return jsonify({"code": 200, "msg": "Success", "data": results})
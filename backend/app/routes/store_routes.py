@@ -1,10 +1,45 @@
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.app import db
 from backend.app.models.models import Store, User
+from backend.app.utils.statements import load_user_or_404, load_store_or_404
+from backend.app.utils.geo import store_index
+from backend.app.utils.reservations import period_end, stores_with_available_vehicles
+from backend.app.utils.sharding import gather
 
 store_bp = Blueprint('stores', __name__)
 
+# Most stores returned by /nearby
+MAX_NEARBY_STORES = 50
+
+
+def parse_coordinates(data):
+    """
+    Validate optional latitude / longitude fields of a store payload.
+
+    Returns:
+        tuple: (fields to set, error message or None)
+    """
+    fields = {}
+    for name, bound in (('latitude', 90), ('longitude', 180)):
+        if name not in data:
+            continue
+        value = data[name]
+        if value is None:
+            fields[name] = None
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None, f'{name} must be a number'
+        if not -bound <= value <= bound:
+            return None, f'{name} must be between -{bound} and {bound}'
+        fields[name] = value
+    if ('latitude' in fields) != ('longitude' in fields):
+        return None, 'latitude and longitude must be set together'
+    return fields, None
+
 @store_bp.route('', methods=['GET'])
 def get_stores():
     """Get all stores"""
@@ -15,10 +50,55 @@ def get_stores():
         'data': [store.to_dict() for store in stores]
     })
 
+@store_bp.route('/nearby', methods=['GET'])
+def get_nearby_stores():
+    """Get the stores closest to a point, optionally only those with an available vehicle of a type"""
+    try:
+        latitude = float(request.args['lat'])
+        longitude = float(request.args['lon'])
+    except KeyError:
+        return jsonify({'code': 400, 'msg': 'Missing required parameters: lat, lon'}), 200
+    except ValueError:
+        return jsonify({'code': 400, 'msg': 'lat and lon must be numbers'}), 200
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({'code': 400, 'msg': 'Coordinates out of range'}), 200
+
+    k = min(max(request.args.get('k', 5, type=int), 1), MAX_NEARBY_STORES)
+
+    # Restrict to stores with a vehicle of the type free for the period (default: today)
+    allowed = None
+    type_id = request.args.get('type_id', type=int)
+    if type_id is not None:
+        try:
+            today = datetime.utcnow().date()
+            start_date = datetime.strptime(request.args.get('start', today.isoformat()), '%Y-%m-%d').date()
+            end_date = datetime.strptime(
+                request.args.get('end', (start_date + timedelta(days=1)).isoformat()), '%Y-%m-%d'
+            ).date()
+        except ValueError:
+            return jsonify({'code': 400, 'msg': 'Invalid date format. Use YYYY-MM-DD'}), 200
+        allowed = set().union(
+            *gather(stores_with_available_vehicles, start_date, period_end(start_date, end_date), type_id)
+        )
+
+    nearest = store_index.nearest(
+        latitude, longitude, k, allowed, ttl=current_app.config['STORE_INDEX_TTL']
+    )
+    stores = {s.store_id: s for s in Store.query.filter(Store.store_id.in_([sid for sid, _ in nearest]))}
+    return jsonify({
+        'code': 200,
+        'msg': 'Success',
+        'data': [
+            {**stores[store_id].to_dict(), 'distance_km': round(distance, 3)}
+            for store_id, distance in nearest
+            if store_id in stores
+        ]
+    })
+
 @store_bp.route('/<int:store_id>', methods=['GET'])
 def get_store(store_id):
     """Get a specific store"""
-    store = Store.query.get_or_404(store_id)
+    store = load_store_or_404(store_id)
     return jsonify({
         'code': 200,
         'msg': 'Success',
@@ -30,7 +110,7 @@ def get_store(store_id):
 def create_store():
     """Create a new store (global admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
     
     # Check if user is global admin
     if not current_user.is_admin or current_user.managed_store_id is not None:
@@ -47,10 +127,15 @@ def create_store():
             'msg': f'Missing required fields: {", ".join(required_fields)}'
         }), 200
     
+    coordinates, error = parse_coordinates(data)
+    if error:
+        return jsonify({'code': 400, 'msg': error}), 200
+
     store = Store(
         store_name=data['store_name'],
         address=data['address'],
-        phone_number=data['phone_number']
+        phone_number=data['phone_number'],
+        **coordinates
     )
     
     db.session.add(store)
@@ -67,7 +152,7 @@ def create_store():
 def update_store(store_id):
     """Update a store (global admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
     
     # Check if user is global admin
     if not current_user.is_admin or current_user.managed_store_id is not None:
@@ -76,8 +161,13 @@ def update_store(store_id):
             'msg': 'Permission denied. Global admin access required.'
         }), 200
     
-    store = Store.query.get_or_404(store_id)
+    store = load_store_or_404(store_id)
     data = request.json
+
+    # Validate before touching the store, so a rejected update leaves it unmodified
+    coordinates, error = parse_coordinates(data)
+    if error:
+        return jsonify({'code': 400, 'msg': error}), 200
     
     if 'store_name' in data:
         store.store_name = data['store_name']
@@ -85,6 +175,8 @@ def update_store(store_id):
         store.address = data['address']
     if 'phone_number' in data:
         store.phone_number = data['phone_number']
+    for name, value in coordinates.items():
+        setattr(store, name, value)
     
     db.session.commit()
     
@@ -99,7 +191,7 @@ def update_store(store_id):
 def delete_store(store_id):
     """Delete a store (global admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
     
     # Check if user is global admin
     if not current_user.is_admin or current_user.managed_store_id is not None:
@@ -108,7 +200,7 @@ def delete_store(store_id):
             'msg': 'Permission denied. Global admin access required.'
         }), 200
     
-    store = Store.query.get_or_404(store_id)
+    store = load_store_or_404(store_id)
     
     # Check if store has managers
     if store.managers:
@@ -117,13 +209,13 @@ def delete_store(store_id):
             'msg': 'Cannot delete store with assigned managers'
         }), 200
     
-    # Check if store has active rentals
+    # Check if store has active rentals (rentals returning here may be in other shards)
     from backend.app.models.models import Rental
-    active_rentals = Rental.query.filter(
+    active_rentals = gather(lambda: Rental.query.filter(
         (Rental.rental_store_id == store_id) | (Rental.return_store_id == store_id)
-    ).filter(Rental.rental_status.in_(['pending', 'active'])).first()
+    ).filter(Rental.rental_status.in_(['pending', 'active'])).first() is not None)
     
-    if active_rentals:
+    if any(active_rentals):
         return jsonify({
             'code': 400,
             'msg': 'Cannot delete store with active rentals'
@@ -142,7 +234,7 @@ def delete_store(store_id):
 def get_store_managers(store_id):
     """Get all managers for a store (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
     
     # Check if user is admin
     if not current_user.is_admin:
@@ -151,7 +243,7 @@ def get_store_managers(store_id):
             'msg': 'Permission denied. Admin access required.'
         }), 200
     
-    store = Store.query.get_or_404(store_id)
+    store = load_store_or_404(store_id)
     managers = User.query.filter_by(managed_store_id=store_id, is_admin=True).all()
     
     return jsonify({
@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
     jwt_required,
+    get_jwt,
     get_jwt_identity,
 )
 from backend.app import db
 from backend.app.models.models import User
+from backend.app.utils.statements import load_user_or_404, store_exists
+from backend.app.utils.provisioning import provision_users
+from backend.app.utils.replica import read_replica
+from backend.app.utils.revocation import revoke_token, revoke_user_tokens
 from datetime import datetime
 
 user_bp = Blueprint("users", __name__)
@@ -88,6 +93,39 @@ def register():
     )
 
 
+@user_bp.route("/bulk", methods=["POST"])
+@jwt_required()
+def bulk_register():
+    """Create many regular users at once (global admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    # Check if user is global admin
+    if not current_user.is_admin or current_user.managed_store_id is not None:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Global admin access required."}
+        ), 200
+
+    users = (request.json or {}).get("users")
+    if not isinstance(users, list) or not users:
+        return jsonify({"code": 400, "msg": "users must be a non-empty list"}), 200
+    limit = current_app.config["BULK_MAX_USERS"]
+    if len(users) > limit:
+        return jsonify(
+            {"code": 400, "msg": f"At most {limit} users can be created per request"}
+        ), 200
+
+    result = provision_users(users, current_app.config["PROVISION_HASH_WORKERS"])
+
+    return jsonify(
+        {
+            "code": 200,
+            "msg": f"{result['created']} users created, {result['failed']} failed",
+            "data": result,
+        }
+    )
+
+
 @user_bp.route("/refresh", methods=["POST"])
 @jwt_required(refresh=True)
 def refresh():
@@ -102,12 +140,22 @@ def refresh():
     )
 
 
+@user_bp.route("/logout", methods=["POST"])
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke the access or refresh token sent with the request"""
+    revoke_token(get_jwt())
+    db.session.commit()
+
+    return jsonify({"code": 200, "msg": "Logged out"})
+
+
 @user_bp.route("/profile", methods=["GET"])
 @jwt_required()
 def get_profile():
     """Get current user profile"""
     current_user_id = get_jwt_identity()
-    user = User.query.get_or_404(current_user_id)
+    user = load_user_or_404(current_user_id)
 
     return jsonify({"code": 200, "msg": "Success", "data": user.to_dict()})
 
@@ -117,7 +165,7 @@ def get_profile():
 def update_profile():
     """Update current user profile"""
     current_user_id = get_jwt_identity()
-    user = User.query.get_or_404(current_user_id)
+    user = load_user_or_404(current_user_id)
     data = request.json
 
     # Update user fields
@@ -127,22 +175,27 @@ def update_profile():
         user.address = data["address"]
     if "phone_number" in data:
         user.phone_number = data["phone_number"]
-    if "password" in data:
+    password_changed = "password" in data
+    if password_changed:
         user.set_password(data["password"])
+        # Sessions opened with the old password must log in again
+        revoke_user_tokens(user.user_id)
 
     db.session.commit()
 
-    return jsonify(
-        {"code": 200, "msg": "Profile updated successfully", "data": user.to_dict()}
-    )
+    msg = "Profile updated successfully"
+    if password_changed:
+        msg += ". Please log in again with your new password"
+    return jsonify({"code": 200, "msg": msg, "data": user.to_dict()})
 
 
 @user_bp.route("", methods=["GET"])
 @jwt_required()
+@read_replica
 def get_users():
     """Get all users (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -167,7 +220,7 @@ def get_users():
 def get_user(user_id):
     """Get a specific user (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -175,7 +228,7 @@ def get_user(user_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    user = User.query.get_or_404(user_id)
+    user = load_user_or_404(user_id)
 
     # Store admin can only view non-admin users
     if current_user.managed_store_id is not None and user.is_admin:
@@ -191,7 +244,7 @@ def get_user(user_id):
 def update_user_permissions(user_id):
     """Update user permissions (global admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is global admin
     if not current_user.is_admin or current_user.managed_store_id is not None:
@@ -199,7 +252,7 @@ def update_user_permissions(user_id):
             {"code": 403, "msg": "Permission denied. Global admin access required."}
         ), 200
 
-    user = User.query.get_or_404(user_id)
+    user = load_user_or_404(user_id)
     data = request.json
 
     if "is_admin" in data:
@@ -208,13 +261,14 @@ def update_user_permissions(user_id):
     if "managed_store_id" in data:
         if data["managed_store_id"] is not None:
             # Check if store exists
-            from backend.app.models.models import Store
-
-            store = Store.query.get(data["managed_store_id"])
-            if not store:
+            if not store_exists(data["managed_store_id"]):
                 return jsonify({"code": 404, "msg": "Store not found"}), 200
         user.managed_store_id = data["managed_store_id"]
 
+    # Tokens issued under the old role must not outlive it
+    if db.session.is_modified(user):
+        revoke_user_tokens(user.user_id)
+
     db.session.commit()
 
     return jsonify(
@@ -224,3 +278,23 @@ def update_user_permissions(user_id):
             "data": user.to_dict(),
         }
     )
+
+
+@user_bp.route("/<int:user_id>/revoke-tokens", methods=["POST"])
+@jwt_required()
+def revoke_tokens(user_id):
+    """Sign a user out of every session (global admin only)"""
+    current_user_id = get_jwt_identity()
+    current_user = load_user_or_404(current_user_id)
+
+    # Check if user is global admin
+    if not current_user.is_admin or current_user.managed_store_id is not None:
+        return jsonify(
+            {"code": 403, "msg": "Permission denied. Global admin access required."}
+        ), 200
+
+    user = load_user_or_404(user_id)
+    revoke_user_tokens(user.user_id)
+    db.session.commit()
+
+    return jsonify({"code": 200, "msg": "All tokens of the user have been revoked"})
@@ -1,9 +1,30 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.app import db
-from backend.app.models.models import VehicleType, Vehicle, Rental, User
+from backend.app.models.models import VehicleType, Vehicle, Rental
+from backend.app.utils.statements import (
+    load_user_or_404,
+    load_vehicle_or_404,
+    load_vehicle_type_or_404,
+    store_exists,
+    vehicle_type_exists,
+    active_rental_for_vehicle,
+    outstanding_rental_for_vehicle,
+    open_transfer_for_vehicle,
+)
+from backend.app.utils.events import vehicle_events
+from backend.app.utils.reservations import available_vehicles, period_end
+from backend.app.utils.sharding import (
+    crosses_shards,
+    default_shard,
+    gather,
+    owned_vehicles,
+    sharding_enabled,
+    use_shard,
+)
 from datetime import datetime
 from functools import wraps
+from sqlalchemy import select, update
 
 vehicle_bp = Blueprint("vehicles", __name__)
 
@@ -14,7 +35,7 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         current_user_id = get_jwt_identity()
-        user = User.query.get_or_404(current_user_id)
+        user = load_user_or_404(current_user_id)
 
         if not user.is_admin:
             return jsonify(
@@ -26,6 +47,14 @@ def admin_required(f):
     return decorated_function
 
 
+def release_vehicle_type(type_id):
+    """Clear the requested type of the current shard's rentals of a type being deleted."""
+    db.session.execute(
+        update(Rental).where(Rental.vehicle_type_id == type_id).values(vehicle_type_id=None)
+    )
+    db.session.commit()
+
+
 # Vehicle Type Routes
 @vehicle_bp.route("/types", methods=["GET"])
 def get_vehicle_types():
@@ -39,7 +68,7 @@ def get_vehicle_types():
 @vehicle_bp.route("/types/<int:type_id>", methods=["GET"])
 def get_vehicle_type(type_id):
     """Get a specific vehicle type"""
-    vehicle_type = VehicleType.query.get_or_404(type_id)
+    vehicle_type = load_vehicle_type_or_404(type_id)
     return jsonify({"code": 200, "msg": "Success", "data": vehicle_type.to_dict()})
 
 
@@ -75,7 +104,7 @@ def create_vehicle_type():
 @admin_required
 def update_vehicle_type(type_id):
     """Update a vehicle type (admin only)"""
-    vehicle_type = VehicleType.query.get_or_404(type_id)
+    vehicle_type = load_vehicle_type_or_404(type_id)
     data = request.json
 
     if "brand" in data:
@@ -101,16 +130,22 @@ def update_vehicle_type(type_id):
 @admin_required
 def delete_vehicle_type(type_id):
     """Delete a vehicle type (admin only)"""
-    vehicle_type = VehicleType.query.get_or_404(type_id)
+    vehicle_type = load_vehicle_type_or_404(type_id)
 
     # Check if there are vehicles of this type
-    if vehicle_type.vehicles:
+    if any(gather(lambda: bool(db.session.get(VehicleType, type_id).vehicles))):
         return jsonify(
             {"code": 400, "msg": "Cannot delete vehicle type with associated vehicles"}
         ), 200
 
-    db.session.delete(vehicle_type)
-    db.session.commit()
+    if sharding_enabled():
+        # Rentals requesting the type forget it in each shard, as the delete
+        # cascade does on an unsharded database; the cascade then finds none
+        gather(release_vehicle_type, type_id)
+
+    with use_shard(default_shard()):
+        db.session.delete(vehicle_type)
+        db.session.commit()
 
     return jsonify({"code": 200, "msg": "Vehicle type deleted successfully"})
 
@@ -121,9 +156,51 @@ def delete_vehicle_type(type_id):
 @admin_required
 def get_vehicles():
     """Get all vehicles (admin only)"""
-    vehicles = Vehicle.query.all()
+    vehicles = gather(lambda: [v.to_dict() for v in db.session.scalars(owned_vehicles(select(Vehicle)))])
+    return jsonify(
+        {
+            "code": 200,
+            "msg": "Success",
+            "data": sorted((v for part in vehicles for v in part), key=lambda v: v["vehicle_id"]),
+        }
+    )
+
+
+@vehicle_bp.route("/available", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_available_vehicles():
+    """Get vehicles free for a whole rental period (admin only)"""
+    try:
+        start_date = datetime.strptime(request.args["start"], "%Y-%m-%d").date()
+        end_date = datetime.strptime(request.args["end"], "%Y-%m-%d").date()
+    except KeyError:
+        return jsonify({"code": 400, "msg": "Missing required parameters: start, end"}), 200
+    except ValueError:
+        return jsonify({"code": 400, "msg": "Invalid date format. Use YYYY-MM-DD"}), 200
+
+    if end_date < start_date:
+        return jsonify(
+            {"code": 400, "msg": "End date cannot be before start date"}
+        ), 200
+
+    vehicles = gather(
+        lambda: [
+            v.to_dict()
+            for v in available_vehicles(
+                start_date,
+                period_end(start_date, end_date),
+                store_id=request.args.get("store_id", type=int),
+                type_id=request.args.get("type_id", type=int),
+            )
+        ]
+    )
     return jsonify(
-        {"code": 200, "msg": "Success", "data": [v.to_dict() for v in vehicles]}
+        {
+            "code": 200,
+            "msg": "Success",
+            "data": sorted((v for part in vehicles for v in part), key=lambda v: v["vehicle_id"]),
+        }
     )
 
 
@@ -132,10 +209,29 @@ def get_vehicles():
 @admin_required
 def get_vehicle(vehicle_id):
     """Get a specific vehicle (admin only)"""
-    vehicle = Vehicle.query.get_or_404(vehicle_id)
+    vehicle = load_vehicle_or_404(vehicle_id)
     return jsonify({"code": 200, "msg": "Success", "data": vehicle.to_dict()})
 
 
+@vehicle_bp.route("/<int:vehicle_id>/events", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_vehicle_events(vehicle_id):
+    """Get the rental and transfer status history of a vehicle (admin only)"""
+    vehicle = load_vehicle_or_404(vehicle_id)
+    # A vehicle transferred between shards has events in each of them
+    events = gather(lambda: [e.to_dict() for e in vehicle_events(vehicle.vehicle_id)])
+    return jsonify(
+        {
+            "code": 200,
+            "msg": "Success",
+            "data": sorted(
+                (e for part in events for e in part), key=lambda e: (e["occurred_at"], e["event_id"])
+            ),
+        }
+    )
+
+
 @vehicle_bp.route("", methods=["POST"])
 @jwt_required()
 @admin_required
@@ -153,15 +249,11 @@ def create_vehicle():
         ), 200
 
     # Check if vehicle type exists
-    vehicle_type = VehicleType.query.get(data["type_id"])
-    if not vehicle_type:
+    if not vehicle_type_exists(data["type_id"]):
         return jsonify({"code": 404, "msg": "Vehicle type not found"}), 200
 
     # Check if store exists
-    from backend.app.models.models import Store
-
-    store = Store.query.get(data["store_id"])
-    if not store:
+    if not store_exists(data["store_id"]):
         return jsonify({"code": 404, "msg": "Store not found"}), 200
 
     try:
@@ -190,13 +282,12 @@ def create_vehicle():
 @admin_required
 def update_vehicle(vehicle_id):
     """Update a vehicle (admin only)"""
-    vehicle = Vehicle.query.get_or_404(vehicle_id)
+    vehicle = load_vehicle_or_404(vehicle_id)
     data = request.json
 
     if "type_id" in data:
         # Check if vehicle type exists
-        vehicle_type = VehicleType.query.get(data["type_id"])
-        if not vehicle_type:
+        if not vehicle_type_exists(data["type_id"]):
             return jsonify({"code": 404, "msg": "Vehicle type not found"}), 200
         vehicle.type_id = data["type_id"]
 
@@ -212,17 +303,20 @@ def update_vehicle(vehicle_id):
 
     if "store_id" in data:
         # Check if store exists
-        from backend.app.models.models import Store
-
-        store = Store.query.get(data["store_id"])
-        if not store:
+        if not store_exists(data["store_id"]):
             return jsonify({"code": 404, "msg": "Store not found"}), 200
 
+        # Moves between shards copy the vehicle, which only a transfer does
+        if crosses_shards(vehicle.store_id, data["store_id"]):
+            return jsonify(
+                {
+                    "code": 400,
+                    "msg": "The new store's data is in another shard; use a vehicle transfer",
+                }
+            ), 200
+
         # Check if vehicle is currently rented
-        active_rental = Rental.query.filter_by(
-            vehicle_id=vehicle_id, rental_status="active"
-        ).first()
-        if active_rental:
+        if active_rental_for_vehicle(vehicle_id):
             return jsonify(
                 {
                     "code": 400,
@@ -231,14 +325,7 @@ def update_vehicle(vehicle_id):
             ), 200
 
         # Check if there's a pending transfer for this vehicle
-        from backend.app.models.models import VehicleTransfer
-
-        pending_transfer = (
-            VehicleTransfer.query.filter_by(vehicle_id=vehicle_id)
-            .filter(VehicleTransfer.transfer_status.in_(["pending", "approved"]))
-            .first()
-        )
-        if pending_transfer:
+        if open_transfer_for_vehicle(vehicle_id):
             return jsonify(
                 {
                     "code": 400,
@@ -260,15 +347,10 @@ def update_vehicle(vehicle_id):
 @admin_required
 def delete_vehicle(vehicle_id):
     """Delete a vehicle (admin only)"""
-    vehicle = Vehicle.query.get_or_404(vehicle_id)
+    vehicle = load_vehicle_or_404(vehicle_id)
 
     # Check if vehicle is currently rented
-    active_rentals = (
-        Rental.query.filter_by(vehicle_id=vehicle_id)
-        .filter(Rental.rental_status.in_(["pending", "active"]))
-        .first()
-    )
-    if active_rentals:
+    if outstanding_rental_for_vehicle(vehicle_id):
         return jsonify(
             {"code": 400, "msg": "Cannot delete vehicle with active rentals"}
         ), 200
@@ -1,7 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.app import db
-from backend.app.models.models import VehicleTransfer, Vehicle, User, Store
+from backend.app.models.models import VehicleTransfer
+from backend.app.utils.statements import (
+    load_user_or_404,
+    load_vehicle,
+    store_exists,
+    outstanding_rental_for_vehicle,
+    pending_transfer_for_vehicle,
+)
+from backend.app.utils.permissions import get_transfer_or_404, scoped_transfers
+from backend.app.utils.idempotency import idempotent
+from backend.app.utils.replica import read_replica
+from backend.app.utils.sharding import gather, move_vehicle
 from datetime import datetime
 
 vehicle_transfer_bp = Blueprint("vehicle_transfers", __name__)
@@ -9,10 +20,11 @@ vehicle_transfer_bp = Blueprint("vehicle_transfers", __name__)
 
 @vehicle_transfer_bp.route("", methods=["GET"])
 @jwt_required()
+@read_replica
 def get_transfers():
     """Get all vehicle transfers based on user role"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -20,22 +32,17 @@ def get_transfers():
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    # If user is global admin, return all transfers
-    if current_user.managed_store_id is None:
-        transfers = VehicleTransfer.query.all()
-    # If user is store admin, return transfers for their store
-    else:
-        store_id = current_user.managed_store_id
-        transfers = VehicleTransfer.query.filter(
-            (VehicleTransfer.source_store_id == store_id)
-            | (VehicleTransfer.destination_store_id == store_id)
-        ).all()
+    # Global admins see all transfers, store admins those from/to their store
+    transfers = gather(lambda: [transfer.to_dict() for transfer in scoped_transfers(current_user)])
 
     return jsonify(
         {
             "code": 200,
             "msg": "Success",
-            "data": [transfer.to_dict() for transfer in transfers],
+            "data": sorted(
+                (transfer for part in transfers for transfer in part),
+                key=lambda transfer: transfer["transfer_id"],
+            ),
         }
     )
 
@@ -45,7 +52,7 @@ def get_transfers():
 def get_transfer(transfer_id):
     """Get a specific vehicle transfer"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -53,31 +60,27 @@ def get_transfer(transfer_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    transfer = VehicleTransfer.query.get_or_404(transfer_id)
+    transfer, permitted = get_transfer_or_404(current_user, transfer_id, "view")
 
     # If user is store admin, check if transfer is from/to their store
-    if current_user.managed_store_id is not None:
-        store_id = current_user.managed_store_id
-        if (
-            transfer.source_store_id != store_id
-            and transfer.destination_store_id != store_id
-        ):
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only view transfers from/to your store.",
-                }
-            ), 200
+    if not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only view transfers from/to your store.",
+            }
+        ), 200
 
     return jsonify({"code": 200, "msg": "Success", "data": transfer.to_dict()})
 
 
 @vehicle_transfer_bp.route("", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_transfer():
     """Initiate a vehicle transfer (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -96,14 +99,12 @@ def create_transfer():
         ), 200
 
     # Check if vehicle exists
-    vehicle = Vehicle.query.get(data["vehicle_id"])
+    vehicle = load_vehicle(data["vehicle_id"])
     if not vehicle:
         return jsonify({"code": 404, "msg": "Vehicle not found"}), 200
 
     # Check if stores exist
-    source_store = Store.query.get(data["source_store_id"])
-    destination_store = Store.query.get(data["destination_store_id"])
-    if not source_store or not destination_store:
+    if not store_exists(data["source_store_id"]) or not store_exists(data["destination_store_id"]):
         return jsonify(
             {"code": 404, "msg": "Source store or destination store not found"}
         ), 200
@@ -121,14 +122,7 @@ def create_transfer():
         ), 200
 
     # Check if vehicle is currently rented
-    from backend.app.models.models import Rental
-
-    active_rental = (
-        Rental.query.filter_by(vehicle_id=data["vehicle_id"])
-        .filter(Rental.rental_status.in_(["pending", "active"]))
-        .first()
-    )
-    if active_rental:
+    if outstanding_rental_for_vehicle(data["vehicle_id"]):
         return jsonify(
             {
                 "code": 400,
@@ -137,10 +131,7 @@ def create_transfer():
         ), 200
 
     # Check if vehicle already has a pending transfer
-    pending_transfer = VehicleTransfer.query.filter_by(
-        vehicle_id=data["vehicle_id"], transfer_status="pending"
-    ).first()
-    if pending_transfer:
+    if pending_transfer_for_vehicle(data["vehicle_id"]):
         return jsonify(
             {"code": 400, "msg": "Vehicle already has a pending transfer"}
         ), 200
@@ -172,7 +163,7 @@ def create_transfer():
 def approve_transfer(transfer_id):
     """Approve a vehicle transfer (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -180,13 +171,10 @@ def approve_transfer(transfer_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    transfer = VehicleTransfer.query.get_or_404(transfer_id)
+    transfer, permitted = get_transfer_or_404(current_user, transfer_id, "approve")
 
     # If user is store admin, check if they manage the source store
-    if (
-        current_user.managed_store_id is not None
-        and transfer.source_store_id != current_user.managed_store_id
-    ):
+    if not permitted:
         return jsonify(
             {
                 "code": 403,
@@ -223,7 +211,7 @@ def approve_transfer(transfer_id):
 def complete_transfer(transfer_id):
     """Complete a vehicle transfer (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -231,13 +219,10 @@ def complete_transfer(transfer_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    transfer = VehicleTransfer.query.get_or_404(transfer_id)
+    transfer, permitted = get_transfer_or_404(current_user, transfer_id, "complete")
 
     # If user is store admin, check if they manage the destination store
-    if (
-        current_user.managed_store_id is not None
-        and transfer.destination_store_id != current_user.managed_store_id
-    ):
+    if not permitted:
         return jsonify(
             {
                 "code": 403,
@@ -258,9 +243,9 @@ def complete_transfer(transfer_id):
     transfer.transfer_status = "completed"
     transfer.completed_date = datetime.utcnow().date()
 
-    # Update vehicle's store_id
-    vehicle = Vehicle.query.get(transfer.vehicle_id)
-    vehicle.store_id = transfer.destination_store_id
+    # Update vehicle's store_id (copying it over if the destination is in another shard)
+    vehicle = load_vehicle(transfer.vehicle_id)
+    move_vehicle(vehicle, transfer.destination_store_id)
 
     db.session.commit()
 
@@ -278,7 +263,7 @@ def complete_transfer(transfer_id):
 def cancel_transfer(transfer_id):
     """Cancel a vehicle transfer (admin only)"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get_or_404(current_user_id)
+    current_user = load_user_or_404(current_user_id)
 
     # Check if user is admin
     if not current_user.is_admin:
@@ -286,21 +271,16 @@ def cancel_transfer(transfer_id):
             {"code": 403, "msg": "Permission denied. Admin access required."}
         ), 200
 
-    transfer = VehicleTransfer.query.get_or_404(transfer_id)
+    transfer, permitted = get_transfer_or_404(current_user, transfer_id, "cancel")
 
     # If user is store admin, check if transfer is from/to their store
-    if current_user.managed_store_id is not None:
-        store_id = current_user.managed_store_id
-        if (
-            transfer.source_store_id != store_id
-            and transfer.destination_store_id != store_id
-        ):
-            return jsonify(
-                {
-                    "code": 403,
-                    "msg": "Permission denied. You can only cancel transfers from/to your store.",
-                }
-            ), 200
+    if not permitted:
+        return jsonify(
+            {
+                "code": 403,
+                "msg": "Permission denied. You can only cancel transfers from/to your store.",
+            }
+        ), 200
 
     # Check if transfer is in pending or approved status
     if transfer.transfer_status not in ["pending", "approved"]:
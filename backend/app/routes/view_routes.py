@@ -0,0 +1,115 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import case, exists, func, select
+from sqlalchemy.orm import contains_eager
+from backend.app import db
+from backend.app.models.models import Rental, Store, Vehicle, VehicleTransfer, VehicleType
+from backend.app.routes.vehicle_routes import admin_required
+from backend.app.utils.replica import read_replica
+from backend.app.utils.sharding import gather_page, owned_vehicles
+from datetime import datetime
+
+view_bp = Blueprint("views", __name__)
+
+# Rental / transfer statuses that keep a vehicle out of the available pool
+RENTED_STATUSES = ("active", "extension_requested")
+TRANSFER_STATUSES = ("pending", "approved")
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def vehicle_status_expression():
+    """Derived vehicle status (rented / in_transfer / available) as a SQL CASE."""
+    # Approved bookings that start in the future do not make the vehicle rented yet
+    is_rented = exists().where(
+        Rental.vehicle_id == Vehicle.vehicle_id,
+        Rental.rental_status.in_(RENTED_STATUSES),
+        Rental.rental_date <= datetime.utcnow().date(),
+    )
+    is_in_transfer = exists().where(
+        VehicleTransfer.vehicle_id == Vehicle.vehicle_id,
+        VehicleTransfer.transfer_status.in_(TRANSFER_STATUSES),
+    )
+    return case(
+        (is_rented, "rented"),
+        (is_in_transfer, "in_transfer"),
+        else_="available",
+    )
+
+
+def get_pagination_args():
+    """Read page / page_size query arguments, clamped to sane bounds."""
+    page = max(request.args.get("page", 1, type=int), 1)
+    page_size = request.args.get("page_size", DEFAULT_PAGE_SIZE, type=int)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    return page, page_size
+
+
+@view_bp.route("/vehicle-instances", methods=["GET"])
+@jwt_required()
+@admin_required
+@read_replica
+def get_vehicle_instances_view():
+    """Everything the vehicle instance page needs in one round trip (admin only)"""
+    page, page_size = get_pagination_args()
+    status = vehicle_status_expression().label("status")
+
+    query = (
+        select(Vehicle, status)
+        .join(Vehicle.type)
+        .outerjoin(Vehicle.store)
+        .options(contains_eager(Vehicle.type), contains_eager(Vehicle.store))
+    )
+
+    # Optional filters, mirroring the search form on the page
+    brand = request.args.get("brand", "").strip()
+    model = request.args.get("model", "").strip()
+    store_id = request.args.get("store_id", type=int)
+    status_filter = request.args.get("status")
+    if brand:
+        query = query.where(VehicleType.brand.ilike(f"%{brand}%"))
+    if model:
+        query = query.where(VehicleType.model.ilike(f"%{model}%"))
+    if store_id is not None:
+        query = query.where(Vehicle.store_id == store_id)
+    if status_filter:
+        query = query.where(status == status_filter)
+
+    def instances_page(page, page_size):
+        shard_query = owned_vehicles(query)
+        total = db.session.scalar(
+            select(func.count()).select_from(shard_query.order_by(None).subquery())
+        )
+        rows = db.session.execute(
+            shard_query.order_by(Vehicle.vehicle_id)
+            .limit(page_size)
+            .offset((page - 1) * page_size)
+        ).all()
+
+        items = []
+        for vehicle, vehicle_status in rows:
+            item = vehicle.to_dict()
+            item["status"] = vehicle_status
+            items.append(item)
+        return items, total
+
+    items, total = gather_page(instances_page, page, page_size, key=lambda item: item["vehicle_id"])
+
+    vehicle_types = db.session.scalars(select(VehicleType).order_by(VehicleType.type_id))
+    stores = db.session.scalars(select(Store).order_by(Store.store_id))
+
+    return jsonify(
+        {
+            "code": 200,
+            "msg": "Success",
+            "data": {
+                "items": items,
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "vehicle_types": [vt.to_dict() for vt in vehicle_types],
+                "stores": [store.to_dict() for store in stores],
+            },
+        }
+    )
@@ -0,0 +1,125 @@
+from datetime import datetime
+from sqlalchemy import delete, func, literal, select, union_all
+from backend.app import db
+from backend.app.models.models import ArchivedRental, Rental
+
+# Terminal statuses; rentals in these states never change again
+ARCHIVABLE_STATUSES = ("returned", "cancelled")
+
+# Columns shared by the hot rentals table and the archive
+RENTAL_COLUMNS = (
+    "rental_id",
+    "rental_date",
+    "rental_store_id",
+    "user_id",
+    "vehicle_id",
+    "vehicle_type_id",
+    "expected_return_date",
+    "return_store_id",
+    "rental_status",
+    "is_overdue",
+)
+
+
+def archive_rentals(cutoff_date, batch_size=1000, max_batches=None, progress=None):
+    """
+    Move returned / cancelled rentals that started before `cutoff_date` to the archive.
+
+    Each batch is copied and deleted in its own transaction, so the job can be
+    interrupted at any point and simply run again to resume.
+
+    Args:
+        cutoff_date: Archive rentals with rental_date before this date
+        batch_size: Rentals moved per transaction
+        max_batches: Stop after this many batches (None for no limit)
+        progress: Optional callable invoked with the running total after each batch
+
+    Returns:
+        int: Number of rentals archived
+    """
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = db.session.scalars(
+            select(Rental.rental_id)
+            .where(
+                Rental.rental_status.in_(ARCHIVABLE_STATUSES),
+                Rental.rental_date < cutoff_date,
+            )
+            .order_by(Rental.rental_id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        columns = [getattr(Rental, c) for c in RENTAL_COLUMNS]
+        db.session.execute(
+            ArchivedRental.__table__.insert().from_select(
+                list(RENTAL_COLUMNS) + ["archived_at"],
+                select(*columns, literal(datetime.utcnow())).where(Rental.rental_id.in_(ids)),
+            )
+        )
+        db.session.execute(delete(Rental).where(Rental.rental_id.in_(ids)))
+        db.session.commit()
+
+        archived += len(ids)
+        batches += 1
+        if progress:
+            progress(archived)
+    return archived
+
+
+def rental_history():
+    """
+    All rentals, hot and archived, as one selectable for historical reports.
+
+    Returns:
+        A subquery exposing the shared rental columns
+    """
+    return union_all(
+        select(*[getattr(Rental, c) for c in RENTAL_COLUMNS]),
+        select(*[getattr(ArchivedRental, c) for c in RENTAL_COLUMNS]),
+    ).subquery("rental_history")
+
+
+def get_rental_history(hot_scope, archive_scope, page, page_size):
+    """
+    One page of rentals across the hot table and the archive, newest first.
+
+    Args:
+        hot_scope: Permission predicate over Rental
+        archive_scope: The same predicate over ArchivedRental
+        page: 1-based page number
+        page_size: Rentals per page
+
+    Returns:
+        tuple: (rentals, total) - a list of Rental / ArchivedRental objects
+    """
+    keys = union_all(
+        select(Rental.rental_id, Rental.rental_date, literal(False).label("archived")).where(hot_scope),
+        select(
+            ArchivedRental.rental_id, ArchivedRental.rental_date, literal(True).label("archived")
+        ).where(archive_scope),
+    ).subquery()
+
+    total = db.session.scalar(select(func.count()).select_from(keys))
+    page_keys = db.session.execute(
+        select(keys.c.rental_id, keys.c.archived)
+        .order_by(keys.c.rental_date.desc(), keys.c.rental_id.desc())
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+    ).all()
+
+    hot_ids = [rental_id for rental_id, archived in page_keys if not archived]
+    archived_ids = [rental_id for rental_id, archived in page_keys if archived]
+    loaded = {}
+    if hot_ids:
+        for rental in Rental.query.filter(Rental.rental_id.in_(hot_ids)):
+            loaded[(rental.rental_id, False)] = rental
+    if archived_ids:
+        for rental in ArchivedRental.query.filter(ArchivedRental.rental_id.in_(archived_ids)):
+            loaded[(rental.rental_id, True)] = rental
+
+    # A rental archived between the two queries is simply skipped on this page
+    rentals = [loaded.get((rental_id, bool(archived))) for rental_id, archived in page_keys]
+    return [rental for rental in rentals if rental is not None], total
@@ -0,0 +1,237 @@
+"""
+Asyncio read path for the heavy list, search and report endpoints.
+
+`AsyncReadApp` wraps the Flask app in an ASGI application. GET requests to
+the read-only endpoints (every @read_replica handler, or the endpoints listed
+in ASYNC_READ_ENDPOINTS) run on the event loop: the handler is the same Flask
+view, but its session is bound to async engines (asyncpg / aiosqlite) and
+SQLAlchemy hands control back to the loop while a statement waits on the
+database. Many slow reads therefore overlap on one worker instead of each
+holding a thread. Every other request goes to the WSGI app on a thread pool,
+as under `flask serve`.
+
+Replica routing and read-your-writes behave as on the sync path. The checks
+that would block the loop (the revocation cache sync and the replica lag
+probe) run on a thread before the handler starts. With RATELIMIT_BACKEND =
+"database", each async request still makes one blocking round trip for its
+rate limit bucket.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+from backend.app import db
+from backend.app.utils.replica import REPLICA_BIND, replica_lag
+from backend.app.utils.revocation import revocation_cache
+from backend.app.utils.sharding import ShardingSession
+
+# Async driver of each dialect
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+ASYNC_METHODS = ("GET", "HEAD")
+
+
+def async_url(url):
+    """`url` with the async driver of its dialect, e.g. postgresql+pg8000 -> postgresql+asyncpg."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver is known for {backend} databases; set ASYNC_DATABASE_URL")
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        raise ValueError("The async read path cannot share an in-memory SQLite database")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def async_endpoints(app):
+    """Endpoints served on the event loop: ASYNC_READ_ENDPOINTS, or every @read_replica handler."""
+    configured = app.config["ASYNC_READ_ENDPOINTS"]
+    if configured:
+        return set(configured)
+    return {name for name, view in app.view_functions.items() if getattr(view, "read_only", False)}
+
+
+class BridgedSession(ShardingSession):
+    """ShardingSession that runs each bind's statements on the matching async engine."""
+
+    def __init__(self, db, bridges, **kwargs):
+        super().__init__(db, **kwargs)
+        # sync engine -> sync facade of its async engine
+        self._bridges = bridges
+
+    def for_shard(self, name):
+        return type(self)(self._db, self._bridges, shard=name)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        return self._bridges[super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)]
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ of an ASGI HTTP request."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is already buffered, so it has a length even when it was sent chunked
+    if body:
+        environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def _collect(wsgi_app, environ):
+    """Call a WSGI app (or response) and return its (status, ASGI headers, body)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class AsyncReadApp:
+    """ASGI application serving the read-only endpoints of a Flask app on the event loop."""
+
+    def __init__(self, app, threads=None):
+        self.app = app
+        self.endpoints = async_endpoints(app)
+        # Runs the requests that stay on the sync path
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or app.config["SERVER_THREADS"], thread_name_prefix="wsgi"
+        )
+        self.async_engines = None
+
+    def _create_engines(self):
+        config = self.app.config
+        options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        engines = {}
+        with self.app.app_context():
+            for key, engine in db.engines.items():
+                url = config["ASYNC_DATABASE_URL"] if key is None else None
+                url = make_url(url) if url else async_url(engine.url)
+                engine_options = dict(options)
+                # aiosqlite opens one connection per session (NullPool); server databases pool them
+                if url.get_backend_name() != "sqlite":
+                    engine_options["pool_size"] = config["ASYNC_POOL_SIZE"]
+                engines[engine] = create_async_engine(url, **engine_options)
+        return engines
+
+    def _bridges(self):
+        if self.async_engines is None:
+            self.async_engines = self._create_engines()
+        return {engine: async_engine.sync_engine for engine, async_engine in self.async_engines.items()}
+
+    def _endpoint(self, environ):
+        adapter = self.app.url_map.bind_to_environ(environ)
+        try:
+            endpoint, _ = adapter.match()
+        except HTTPException:
+            return None
+        return endpoint
+
+    def _prepare(self):
+        """Do the blocking checks the handler would otherwise make on the event loop."""
+        with self.app.app_context():
+            revocation_cache.sync(self.app.config["REVOCATION_SYNC_INTERVAL"])
+            if REPLICA_BIND in db.engines:
+                replica_lag(db.engines[REPLICA_BIND])
+
+    def _handle(self, session, environ):
+        # Runs in SQLAlchemy's greenlet: sync code whose queries await the async driver.
+        # The request gets an app context of its own even when the task inherited one
+        # (e.g. from `flask serve-async`), since db.session is scoped by app context
+        app_ctx = self.app.app_context()
+        ctx = self.app.request_context(environ)
+        error = None
+        try:
+            try:
+                app_ctx.push()
+                ctx.push()
+                db.session.registry.set(session)
+                response = self.app.full_dispatch_request()
+            except Exception as e:
+                error = e
+                response = self.app.handle_exception(e)
+            return _collect(response, environ)
+        finally:
+            ctx.pop(error)
+            # Teardown closes `session` through db.session.remove()
+            app_ctx.pop(error)
+
+    async def _dispatch_async(self, environ):
+        await asyncio.to_thread(self._prepare)
+        async with AsyncSession(sync_session_class=BridgedSession, db=db, bridges=self._bridges()) as session:
+            return await session.run_sync(self._handle, environ)
+
+    async def _lifespan(self, receive, send):
+        from backend.app.utils.server import warm_up
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await asyncio.to_thread(warm_up, self.app, 1)
+                self._bridges()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for async_engine in (self.async_engines or {}).values():
+                    await async_engine.dispose()
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        environ = wsgi_environ(scope, await _read_body(receive))
+        if scope["method"] in ASYNC_METHODS and self._endpoint(environ) in self.endpoints:
+            status, headers, body = await self._dispatch_async(environ)
+        else:
+            loop = asyncio.get_running_loop()
+            status, headers, body = await loop.run_in_executor(self.executor, _collect, self.app, environ)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,316 @@
+"""
+Storage and query benchmarks run against the configured database.
+
+Storage benchmarks work on scratch tables of their own, created and dropped
+within the run, so they can be pointed at a copy of production without
+touching the application's tables. Lookup benchmarks only read. The
+concurrent read benchmark drives running servers over HTTP.
+"""
+import random
+import statistics
+import threading
+import time
+from sqlalchemy import Column, Enum, Index, Integer, MetaData, SmallInteger, String, Table, event, func, select
+from backend.app import db
+from backend.app.models.models import RENTAL_STATUSES, Rental, Store, User, Vehicle, VehicleTransfer, VehicleType
+from backend.app.utils import statements
+
+# Roughly the mix of a mature rentals table: mostly finished rentals
+STATUS_WEIGHTS = {
+    "returned": 80,
+    "cancelled": 8,
+    "active": 8,
+    "pending": 2,
+    "extension_requested": 2,
+}
+
+# Smallint code of each status, in declaration order
+STATUS_CODES = {status: code for code, status in enumerate(RENTAL_STATUSES)}
+
+
+def _status_column_types(dialect):
+    """Column type of each encoding that is stored differently on `dialect`."""
+    types = {"varchar": String(20)}
+    # Without native enums an Enum is a VARCHAR with a CHECK, stored exactly like
+    # "varchar"; measuring it too would only compare two copies of one table
+    if dialect.supports_native_enum:
+        types["enum"] = Enum(*RENTAL_STATUSES, name="bench_rental_status", create_constraint=True)
+    types["smallint"] = SmallInteger()
+    return types
+
+
+def _relation_sizes(conn, table_name):
+    """(table bytes, index bytes) of a table, or (None, None) if the database cannot tell."""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        row = conn.execute(
+            select(
+                func.pg_relation_size(table_name),
+                func.pg_indexes_size(table_name),
+            )
+        ).first()
+        return row[0], row[1]
+    if dialect == "sqlite":
+        try:
+            table_bytes = conn.exec_driver_sql(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (table_name,)
+            ).scalar()
+            index_bytes = conn.exec_driver_sql(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?)",
+                (table_name,),
+            ).scalar()
+            return table_bytes, index_bytes
+        except Exception:
+            return None, None
+    return None, None
+
+
+def _elapsed(conn, query):
+    started = time.perf_counter()
+    conn.execute(query).all()
+    return time.perf_counter() - started
+
+
+def bench_status_encoding(rows=1000000, repeats=5, seed=0, progress=None):
+    """
+    Compare VARCHAR, enum and smallint encodings of a rental status column.
+
+    A scratch table (id, store_id, status) with an index on status is filled
+    with `rows` rows per encoding, then all tables are measured and dropped.
+    The enum encoding is left out on databases without native enums, where
+    it is stored like VARCHAR. Each table is read once before timing starts,
+    and each round times the tables in the opposite order of the previous
+    one, so neither cache warm-up nor table order favours an encoding.
+
+    Args:
+        rows: Rows per table
+        repeats: Timed rounds per query; the median time is reported
+        seed: Random seed of the status mix, so runs are comparable
+        progress: Optional callable receiving a message per step
+
+    Returns:
+        list: One dict per encoding with column_type, table_bytes, index_bytes,
+            and median seconds for a selective indexed filter (active /
+            extension_requested) and a full-scan count per status
+    """
+    rng = random.Random(seed)
+    statuses = rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()), k=rows)
+    stores = [rng.randrange(1, 51) for _ in range(rows)]
+
+    engine = db.engine
+    metadata = MetaData()
+    benches = []
+    for name, column_type in _status_column_types(engine.dialect).items():
+        table_name = f"bench_status_{name}"
+        table = Table(
+            table_name,
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column("store_id", Integer, nullable=False),
+            Column("status", column_type, nullable=False),
+            Index(f"ix_{table_name}_status", "status"),
+        )
+        encode = STATUS_CODES.get if name == "smallint" else (lambda status: status)
+        outstanding = [encode(s) for s in ("active", "extension_requested")]
+        queries = {
+            "selective_filter_seconds": select(func.count()).select_from(table).where(table.c.status.in_(outstanding)),
+            "full_scan_seconds": select(table.c.status, func.count()).group_by(table.c.status),
+        }
+        benches.append((name, column_type, table, encode, queries))
+
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        for name, _, table, encode, _ in benches:
+            if progress:
+                progress(f"Filling {table.name} with {rows} rows")
+            with engine.begin() as conn:
+                for offset in range(0, rows, 10000):
+                    conn.execute(
+                        table.insert(),
+                        [
+                            {"id": i + 1, "store_id": stores[i], "status": encode(statuses[i])}
+                            for i in range(offset, min(offset + 10000, rows))
+                        ],
+                    )
+            # Fresh statistics, so the planner picks the status index where it pays off
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ANALYZE {table.name}")
+
+        timings = {name: {key: [] for key in queries} for name, _, _, _, queries in benches}
+        with engine.connect() as conn:
+            # Warm-up: bring every table and index into the cache before timing
+            for _, _, _, _, queries in benches:
+                for query in queries.values():
+                    _elapsed(conn, query)
+            for round_ in range(repeats):
+                if progress:
+                    progress(f"Timing round {round_ + 1} of {repeats}")
+                for name, _, _, _, queries in benches if round_ % 2 == 0 else reversed(benches):
+                    for key, query in queries.items():
+                        timings[name][key].append(_elapsed(conn, query))
+
+            results = []
+            for name, column_type, table, _, _ in benches:
+                table_bytes, index_bytes = _relation_sizes(conn, table.name)
+                results.append(
+                    {
+                        "encoding": name,
+                        "column_type": str(column_type.compile(dialect=engine.dialect)),
+                        "table_bytes": table_bytes,
+                        "index_bytes": index_bytes,
+                        **{key: statistics.median(values) for key, values in timings[name].items()},
+                    }
+                )
+    finally:
+        metadata.drop_all(engine)
+    return results
+
+
+def _lookup_pairs(user_id, vehicle_id, store_id, type_id):
+    """(name, legacy Model.query lookup, prebuilt statement lookup) for each hot lookup."""
+    return [
+        ("user by id", lambda: User.query.get(user_id), lambda: statements.load_user_or_404(user_id)),
+        ("vehicle by id", lambda: Vehicle.query.get(vehicle_id), lambda: statements.load_vehicle(vehicle_id)),
+        ("store exists", lambda: Store.query.get(store_id) is not None, lambda: statements.store_exists(store_id)),
+        (
+            "type exists",
+            lambda: VehicleType.query.get(type_id) is not None,
+            lambda: statements.vehicle_type_exists(type_id),
+        ),
+        (
+            "outstanding rental by vehicle",
+            lambda: Rental.query.filter_by(vehicle_id=vehicle_id)
+            .filter(Rental.rental_status.in_(["pending", "active"]))
+            .first(),
+            lambda: statements.outstanding_rental_for_vehicle(vehicle_id),
+        ),
+        (
+            "pending transfer by vehicle",
+            lambda: VehicleTransfer.query.filter_by(vehicle_id=vehicle_id, transfer_status="pending").first(),
+            lambda: statements.pending_transfer_for_vehicle(vehicle_id),
+        ),
+    ]
+
+
+def bench_lookups(iterations=2000):
+    """
+    Compare the legacy Model.query lookups with the prebuilt statements.
+
+    Each lookup runs `iterations` times against an empty session, as on the
+    first lookup of a request. Time spent inside the database driver is
+    measured separately, so the remainder is SQLAlchemy and Python overhead.
+
+    Returns:
+        list: One dict per lookup with microseconds per call (total and
+            outside the driver) for both paths
+    """
+    ids = db.session.execute(
+        select(Vehicle.vehicle_id, Vehicle.store_id, Vehicle.type_id).where(Vehicle.store_id.is_not(None)).limit(1)
+    ).first()
+    user_id = db.session.scalar(select(User.user_id).limit(1))
+    if ids is None or user_id is None:
+        raise ValueError("The lookup benchmark needs at least one user and one vehicle at a store")
+    vehicle_id, store_id, type_id = ids
+
+    driver_seconds = [0.0]
+    started = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        started.append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        driver_seconds[0] += time.perf_counter() - started.pop()
+
+    def run(lookup):
+        # Warm the compiled statement caches first, as a running server has them
+        for _ in range(min(iterations, 200)):
+            lookup()
+            db.session.expunge_all()
+        driver_seconds[0] = 0.0
+        begin = time.perf_counter()
+        for _ in range(iterations):
+            lookup()
+            db.session.expunge_all()
+        total = time.perf_counter() - begin
+        return total / iterations * 1e6, (total - driver_seconds[0]) / iterations * 1e6
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    results = []
+    try:
+        for name, legacy, prebuilt in _lookup_pairs(user_id, vehicle_id, store_id, type_id):
+            legacy_total, legacy_python = run(legacy)
+            prebuilt_total, prebuilt_python = run(prebuilt)
+            results.append(
+                {
+                    "lookup": name,
+                    "legacy_us": legacy_total,
+                    "legacy_python_us": legacy_python,
+                    "prebuilt_us": prebuilt_total,
+                    "prebuilt_python_us": prebuilt_python,
+                }
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+        db.session.rollback()
+    return results
+
+
+def global_admin_token():
+    """An access token of the first global admin, for benchmarks against a running server."""
+    from flask_jwt_extended import create_access_token
+
+    user_id = db.session.scalar(
+        select(User.user_id)
+        .where(User.is_admin.is_(True), User.managed_store_id.is_(None))
+        .order_by(User.user_id)
+        .limit(1)
+    )
+    if user_id is None:
+        raise ValueError("The read benchmark needs a global admin account")
+    return create_access_token(identity=user_id)
+
+
+def bench_concurrent_reads(base_url, paths, token, concurrency=32, requests=500):
+    """
+    Send `requests` GETs, `concurrency` at a time, round-robin over `paths` to a running server.
+
+    Returns:
+        dict: Throughput, latency percentiles and error rates, overall and per path
+    """
+    from backend.app.utils.loadsim import Accounts, Client, Stats, summarize
+
+    stats = Stats()
+    headers = {"Authorization": f"Bearer {token}"}
+    sent = [0]
+    lock = threading.Lock()
+
+    def run():
+        client = Client(base_url, stats, Accounts())
+        try:
+            while True:
+                with lock:
+                    if sent[0] >= requests:
+                        return
+                    path = paths[sent[0] % len(paths)]
+                    sent[0] += 1
+                client.call("GET", path, path, headers=headers)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=run, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 2),
+        "overall": summarize(stats.total, seconds),
+        "paths": {path: summarize(bucket, seconds) for path, bucket in stats.endpoints.items()},
+    }
@@ -0,0 +1,250 @@
+"""
+Bulk rental state transitions.
+
+Each bulk action validates every requested rental (existence, permission and
+status) with one SELECT, applies the transition to the valid ones with one
+set-based UPDATE, and reports a result per rental id. Because the UPDATEs
+bypass the ORM, status events and rollup counters are written explicitly.
+"""
+from datetime import datetime
+from sqlalchemy import case, func, insert, select, update
+from backend.app import db
+from backend.app.models.models import Rental, Vehicle, VehicleTransfer
+from backend.app.utils.events import record_events
+from backend.app.utils.permissions import rental_scope
+from backend.app.utils.rollups import record_rental_transitions
+
+# Per action: permission scope, new status, rollup transition and result message
+BULK_ACTIONS = {
+    "return": ("return", "returned", "returned", "Rental returned successfully"),
+    "cancel": ("cancel", "cancelled", "cancelled", "Rental cancelled successfully"),
+    "approve_extension": ("review_extension", "active", None, "Extension approved successfully"),
+    "reject_extension": ("review_extension", "active", None, "Extension rejected successfully"),
+}
+
+# Statuses each action may start from (cancel depends on the caller's role)
+ALLOWED_STATUSES = {
+    "return": ("active",),
+    "approve_extension": ("extension_requested",),
+    "reject_extension": ("extension_requested",),
+}
+USER_CANCELLABLE_STATUSES = ("pending",)
+ADMIN_CANCELLABLE_STATUSES = ("pending", "active", "extension_requested")
+
+
+def _allowed_statuses(user, action):
+    if action == "cancel":
+        return ADMIN_CANCELLABLE_STATUSES if user.is_admin else USER_CANCELLABLE_STATUSES
+    return ALLOWED_STATUSES[action]
+
+
+def _denied_message(user, action):
+    if action == "return":
+        if user.is_admin:
+            return "Permission denied. You can only process returns at your store."
+        return "Permission denied. You can only return your own rentals."
+    if action == "cancel":
+        if user.is_admin:
+            return "Permission denied. You can only cancel rentals from/to your store."
+        return "Permission denied. You can only cancel your own rentals."
+    verb = "approve" if action == "approve_extension" else "reject"
+    return f"Permission denied. You can only {verb} extensions for rentals from your store."
+
+
+def _status_message(user, action, status):
+    if action == "return":
+        return f"Cannot return rental with status: {status}"
+    if action == "cancel":
+        if not user.is_admin:
+            return "You can only cancel pending rentals."
+        return f"Cannot cancel rental with status: {status}"
+    return f"No extension request for rental with status: {status}"
+
+
+def _load_for_update(user, action, rental_ids):
+    """The requested rentals with the caller's permission, locked for the update."""
+    rows = db.session.execute(
+        select(
+            Rental.rental_id,
+            Rental.vehicle_id,
+            Rental.rental_store_id,
+            Rental.return_store_id,
+            Rental.rental_status,
+            Rental.expected_return_date,
+            # Pending rentals carry the requested type, approved ones a vehicle
+            func.coalesce(Rental.vehicle_type_id, Vehicle.type_id).label("vehicle_type_id"),
+            rental_scope(user, BULK_ACTIONS[action][0]).label("permitted"),
+        )
+        .outerjoin(Vehicle, Vehicle.vehicle_id == Rental.vehicle_id)
+        .where(Rental.rental_id.in_(rental_ids))
+        .with_for_update(of=Rental)
+    ).all()
+    return {row.rental_id: row for row in rows}
+
+
+def _settle_returned_vehicles(rows):
+    """
+    Move vehicles returned to their own store, and create transfers for the others.
+
+    Returns:
+        list: Ids of the transfers created
+    """
+    same_store = {r.vehicle_id: r.return_store_id for r in rows
+                  if r.vehicle_id is not None and r.return_store_id == r.rental_store_id}
+    cross_store = {r.vehicle_id: r for r in rows
+                   if r.vehicle_id is not None and r.return_store_id != r.rental_store_id}
+
+    if same_store:
+        db.session.execute(
+            update(Vehicle)
+            .where(Vehicle.vehicle_id.in_(same_store))
+            .values(store_id=case(same_store, value=Vehicle.vehicle_id)),
+            execution_options={"synchronize_session": False},
+        )
+
+    if not cross_store:
+        return []
+    # A vehicle never has more than one pending transfer
+    already_pending = set(
+        db.session.scalars(
+            select(VehicleTransfer.vehicle_id).where(
+                VehicleTransfer.vehicle_id.in_(cross_store),
+                VehicleTransfer.transfer_status == "pending",
+            )
+        )
+    )
+    today = datetime.utcnow().date()
+    transfers = [
+        {
+            "vehicle_id": vehicle_id,
+            "source_store_id": r.rental_store_id,
+            "destination_store_id": r.return_store_id,
+            "transfer_date": today,
+            "transfer_status": "pending",
+            "notes": f"Auto-created from rental #{r.rental_id} return",
+        }
+        for vehicle_id, r in cross_store.items()
+        if vehicle_id not in already_pending
+    ]
+    if not transfers:
+        return []
+    created = db.session.execute(
+        insert(VehicleTransfer).returning(VehicleTransfer.transfer_id, VehicleTransfer.vehicle_id),
+        transfers,
+    ).all()
+    record_events(
+        [
+            {
+                "entity_type": "transfer",
+                "entity_id": transfer_id,
+                "vehicle_id": vehicle_id,
+                "old_status": None,
+                "new_status": "pending",
+            }
+            for transfer_id, vehicle_id in created
+        ]
+    )
+    return [transfer_id for transfer_id, _ in created]
+
+
+def bulk_transition(user, action, rental_ids, return_dates=None):
+    """
+    Apply one transition to many rentals in the caller's transaction.
+
+    Rentals that do not exist, are not the caller's to change, or are in the
+    wrong status are skipped and reported; the others are updated together.
+
+    Args:
+        user: The current User
+        action: One of return, cancel, approve_extension, reject_extension
+        rental_ids: Rental ids, duplicates ignored
+        return_dates: For reject_extension, the original return date per rental id
+
+    Returns:
+        dict: results (one per distinct rental id, in request order), succeeded,
+            failed and transfer_ids (transfers created for cross-store returns)
+    """
+    _, new_status, transition, success_msg = BULK_ACTIONS[action]
+    rental_ids = list(dict.fromkeys(rental_ids))
+    rows = _load_for_update(user, action, rental_ids)
+    allowed = _allowed_statuses(user, action)
+
+    results = []
+    valid = []
+    for rental_id in rental_ids:
+        row = rows.get(rental_id)
+        if row is None:
+            results.append({"rental_id": rental_id, "code": 404, "msg": "Rental not found"})
+        elif not row.permitted:
+            results.append({"rental_id": rental_id, "code": 403, "msg": _denied_message(user, action)})
+        elif row.rental_status not in allowed:
+            results.append(
+                {"rental_id": rental_id, "code": 400, "msg": _status_message(user, action, row.rental_status)}
+            )
+        else:
+            valid.append(row)
+            results.append(
+                {"rental_id": rental_id, "code": 200, "msg": success_msg, "rental_status": new_status}
+            )
+
+    transfer_ids = []
+    if valid:
+        valid_ids = [row.rental_id for row in valid]
+        values = {"rental_status": new_status}
+        if action != "reject_extension":
+            values["is_overdue"] = False
+        else:
+            values["expected_return_date"] = case(
+                {rental_id: return_dates[rental_id] for rental_id in valid_ids},
+                value=Rental.rental_id,
+            )
+        db.session.execute(
+            update(Rental)
+            .where(Rental.rental_id.in_(valid_ids), Rental.rental_status.in_(allowed))
+            .values(**values),
+            execution_options={"synchronize_session": False},
+        )
+
+        events = []
+        for row in valid:
+            event = {
+                "entity_type": "rental",
+                "entity_id": row.rental_id,
+                "vehicle_id": row.vehicle_id,
+                "old_status": row.rental_status,
+                "new_status": new_status,
+            }
+            if action == "reject_extension" and return_dates[row.rental_id] != row.expected_return_date:
+                event["details"] = {
+                    "expected_return_date": [
+                        row.expected_return_date.isoformat(),
+                        return_dates[row.rental_id].isoformat(),
+                    ]
+                }
+            events.append(event)
+        record_events(events)
+
+        if transition is not None:
+            record_rental_transitions(valid, transition)
+        if action == "return":
+            transfer_ids = _settle_returned_vehicles(valid)
+
+    return {
+        "results": results,
+        "succeeded": len(valid),
+        "failed": len(results) - len(valid),
+        "transfer_ids": transfer_ids,
+    }
+
+
+def merge_bulk_results(parts, rental_ids):
+    """Combine the bulk_transition() results of several shards, in request order."""
+    if len(parts) == 1:
+        return parts[0]
+    order = {rental_id: i for i, rental_id in enumerate(dict.fromkeys(rental_ids))}
+    return {
+        "results": sorted((r for part in parts for r in part["results"]), key=lambda r: order[r["rental_id"]]),
+        "succeeded": sum(part["succeeded"] for part in parts),
+        "failed": sum(part["failed"] for part in parts),
+        "transfer_ids": [transfer_id for part in parts for transfer_id in part["transfer_ids"]],
+    }
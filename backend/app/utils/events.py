@@ -0,0 +1,139 @@
+"""
+Append-only status event log.
+
+Every status change of a Rental or VehicleTransfer made through the ORM is
+recorded in status_events automatically: changes are collected before each
+flush and written with one multi-row INSERT after it, in the same
+transaction. Set-based UPDATEs bypass the ORM and must call record_events()
+themselves.
+"""
+from datetime import date, datetime
+from flask import has_request_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import and_, event, inspect, or_, select
+from sqlalchemy.orm import Session
+from backend.app import db
+from backend.app.models.models import Rental, StatusEvent, VehicleTransfer
+
+# Per model: entity type, status column, and other columns logged alongside a status change
+TRACKED_MODELS = {
+    Rental: ("rental", "rental_status", ("vehicle_id", "expected_return_date", "return_store_id")),
+    VehicleTransfer: ("transfer", "transfer_status", ("approved_by", "completed_date")),
+}
+
+
+def current_actor():
+    """The JWT identity of the current request, or None outside a request."""
+    if not has_request_context():
+        return None
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def record_events(events):
+    """
+    Append events in the current transaction with a single INSERT.
+
+    Args:
+        events: Dicts with entity_type, entity_id, vehicle_id, old_status and
+            new_status; actor_id, details and occurred_at are optional
+    """
+    if not events:
+        return
+    defaults = {"actor_id": current_actor(), "details": None, "occurred_at": datetime.utcnow()}
+    rows = [{**defaults, **e} for e in events]
+    db.session.execute(StatusEvent.__table__.insert(), rows)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_status_changes(session, flush_context, instances):
+    pending = session.info.setdefault("pending_status_events", [])
+    for obj in list(session.new) + list(session.dirty):
+        tracked = TRACKED_MODELS.get(type(obj))
+        if tracked is None:
+            continue
+        _, status_column, detail_columns = tracked
+        state = inspect(obj)
+        if state.pending:
+            pending.append((obj, None, {}))
+            continue
+        history = state.attrs[status_column].history
+        if not history.has_changes():
+            continue
+        old_status = history.deleted[0] if history.deleted else None
+        details = {}
+        for column in detail_columns:
+            column_history = state.attrs[column].history
+            if column_history.has_changes():
+                old = column_history.deleted[0] if column_history.deleted else None
+                new = column_history.added[0] if column_history.added else None
+                details[column] = [_json_value(old), _json_value(new)]
+        pending.append((obj, old_status, details))
+
+
+@event.listens_for(Session, "after_flush")
+def _write_status_events(session, flush_context):
+    pending = session.info.pop("pending_status_events", None)
+    if not pending:
+        return
+    now = datetime.utcnow()
+    actor = current_actor()
+    rows = []
+    for obj, old_status, details in pending:
+        entity_type, status_column, _ = TRACKED_MODELS[type(obj)]
+        rows.append(
+            {
+                "entity_type": entity_type,
+                "entity_id": inspect(obj).mapper.primary_key_from_instance(obj)[0],
+                "vehicle_id": obj.vehicle_id,
+                "old_status": old_status,
+                "new_status": getattr(obj, status_column),
+                "actor_id": actor,
+                "details": details or None,
+                "occurred_at": now,
+            }
+        )
+    # Still inside the flush, so this runs on the primary in the same transaction
+    session.connection(bind_arguments={"mapper": StatusEvent}).execute(
+        StatusEvent.__table__.insert(), rows
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_status_changes(session):
+    session.info.pop("pending_status_events", None)
+
+
+def rental_events(rental_id):
+    """Status events of one rental, oldest first."""
+    return db.session.scalars(
+        select(StatusEvent)
+        .where(StatusEvent.entity_type == "rental", StatusEvent.entity_id == rental_id)
+        .order_by(StatusEvent.occurred_at, StatusEvent.event_id)
+    ).all()
+
+
+def vehicle_events(vehicle_id):
+    """Status events of every rental and transfer that involved a vehicle, oldest first."""
+    # Rentals only carry a vehicle once approved; include their earlier events too
+    rental_ids = select(StatusEvent.entity_id).where(
+        StatusEvent.entity_type == "rental", StatusEvent.vehicle_id == vehicle_id
+    )
+    return db.session.scalars(
+        select(StatusEvent)
+        .where(
+            or_(
+                StatusEvent.vehicle_id == vehicle_id,
+                and_(StatusEvent.entity_type == "rental", StatusEvent.entity_id.in_(rental_ids)),
+            )
+        )
+        .order_by(StatusEvent.occurred_at, StatusEvent.event_id)
+    ).all()
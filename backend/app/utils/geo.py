@@ -0,0 +1,133 @@
+"""
+Nearest-store lookup.
+
+Stores with coordinates are kept in an in-process KD-tree over points on the
+unit sphere, where straight-line (chord) distance orders stores the same way
+as great-circle distance. Like the search index, the tree is rebuilt lazily
+after a store is written in this process, and at least every `ttl` seconds to
+pick up writes from other processes.
+"""
+import heapq
+import math
+import threading
+import time
+from itertools import chain
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from backend.app import db
+from backend.app.models.models import Store
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vector(latitude, longitude):
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def chord_to_km(chord):
+    """Great-circle distance in km for a chord length on the unit sphere."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def _build(points, depth=0):
+    """KD-tree of (vector, store_id) as nested (vector, store_id, axis, left, right) tuples."""
+    if not points:
+        return None
+    axis = depth % 3
+    points.sort(key=lambda p: p[0][axis])
+    middle = len(points) // 2
+    vector, store_id = points[middle]
+    return (
+        vector,
+        store_id,
+        axis,
+        _build(points[:middle], depth + 1),
+        _build(points[middle + 1:], depth + 1),
+    )
+
+
+def _nearest(node, target, k, heap, allowed):
+    # heap holds the k best so far as (-squared distance, store_id)
+    if node is None:
+        return
+    vector, store_id, axis, left, right = node
+    if allowed is None or store_id in allowed:
+        d2 = (
+            (vector[0] - target[0]) ** 2
+            + (vector[1] - target[1]) ** 2
+            + (vector[2] - target[2]) ** 2
+        )
+        if len(heap) < k:
+            heapq.heappush(heap, (-d2, store_id))
+        elif d2 < -heap[0][0]:
+            heapq.heapreplace(heap, (-d2, store_id))
+    diff = target[axis] - vector[axis]
+    near, far = (left, right) if diff < 0 else (right, left)
+    _nearest(near, target, k, heap, allowed)
+    # The far side can only hold closer stores if the splitting plane is closer
+    if len(heap) < k or diff * diff < -heap[0][0]:
+        _nearest(far, target, k, heap, allowed)
+
+
+class StoreIndex:
+    """In-process KD-tree of the stores that have coordinates."""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._root = None
+        self._size = 0
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        if self._built_at is not None and time.monotonic() - self._built_at < ttl:
+            return
+        rows = db.session.execute(
+            select(Store.store_id, Store.latitude, Store.longitude).where(
+                Store.latitude.is_not(None), Store.longitude.is_not(None)
+            )
+        ).all()
+        self._root = _build([(_unit_vector(lat, lon), store_id) for store_id, lat, lon in rows])
+        self._size = len(rows)
+        self._built_at = time.monotonic()
+
+    def nearest(self, latitude, longitude, k, allowed=None, ttl=None):
+        """
+        The `k` stores closest to a point.
+
+        Args:
+            latitude: Latitude of the point in degrees
+            longitude: Longitude of the point in degrees
+            k: Number of stores to return
+            allowed: Only consider these store ids (None for all)
+            ttl: Rebuild the tree if it is older than this many seconds
+
+        Returns:
+            list: (store_id, distance in km) pairs, nearest first
+        """
+        with self._lock:
+            self._ensure_built(ttl)
+            root = self._root
+        heap = []
+        _nearest(root, _unit_vector(latitude, longitude), k, heap, allowed)
+        return [
+            (store_id, chord_to_km(math.sqrt(-neg_d2)))
+            for neg_d2, store_id in sorted(heap, reverse=True)
+        ]
+
+
+store_index = StoreIndex()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_store_index(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Store):
+            store_index.invalidate()
+            return
@@ -0,0 +1,211 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from backend.app import db
+from backend.app.models.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+MAX_KEY_LENGTH = 255
+
+# An in-progress key older than this belongs to a request that died (no request
+# runs this long), so a retry may take it over
+IN_PROGRESS_TIMEOUT = 300
+
+
+class ResponseCache:
+    """In-process TTL cache of completed idempotent responses, so replays skip the database."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, scope):
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[scope]
+                return None
+            return value
+
+    def set(self, scope, value, ttl):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop the entry closest to expiry
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[scope] = (time.monotonic() + ttl, value)
+
+
+response_cache = ResponseCache()
+
+
+def _replay(saved):
+    request_hash, status, body = saved
+    response = make_response(body, status)
+    response.mimetype = "application/json"
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _mismatch():
+    return jsonify(
+        {
+            "code": 422,
+            "msg": f"{IDEMPOTENCY_HEADER} was already used for a different request",
+        }
+    ), 200
+
+
+def _claim(user_id, endpoint, key, request_hash, ttl):
+    """
+    Insert an in-progress row for the key, or return the row that already holds it.
+
+    Returns:
+        IdempotencyKey or None: None if this request now owns the key
+    """
+    now = datetime.utcnow()
+    while True:
+        try:
+            db.session.add(
+                IdempotencyKey(
+                    user_id=user_id,
+                    endpoint=endpoint,
+                    key=key,
+                    request_hash=request_hash,
+                    status="in_progress",
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=ttl),
+                )
+            )
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        existing = IdempotencyKey.query.filter_by(
+            user_id=user_id, endpoint=endpoint, key=key
+        ).first()
+        if existing is None:
+            # The holder gave the key up in the meantime; try again
+            continue
+        abandoned = existing.status == "in_progress" and existing.created_at <= now - timedelta(
+            seconds=IN_PROGRESS_TIMEOUT
+        )
+        if existing.expires_at <= now or abandoned:
+            db.session.delete(existing)
+            db.session.commit()
+            continue
+        return existing
+
+
+def _release(scope):
+    user_id, endpoint, key = scope
+    db.session.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.endpoint == endpoint,
+            IdempotencyKey.key == key,
+        )
+    )
+    db.session.commit()
+
+
+def idempotent(f):
+    """
+    Honour an Idempotency-Key header on a JWT-protected POST handler.
+
+    The first request with a given key (per user and endpoint) runs the
+    handler and saves its response for IDEMPOTENCY_KEY_TTL seconds. Repeats
+    get the saved response back without running the handler again; a repeat
+    that arrives while the first request is still running gets a 409. Reusing
+    a key for a different request body is rejected. Requests without the
+    header are handled as usual.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER, "").strip()
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify(
+                {"code": 400, "msg": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}
+            ), 200
+
+        user_id = get_jwt_identity()
+        endpoint = request.endpoint
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        scope = (user_id, endpoint, key)
+        ttl = current_app.config["IDEMPOTENCY_KEY_TTL"]
+
+        saved = response_cache.get(scope)
+        if saved is not None:
+            return _replay(saved) if saved[0] == request_hash else _mismatch()
+
+        existing = _claim(user_id, endpoint, key, request_hash, ttl)
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                return _mismatch()
+            if existing.status != "completed":
+                return jsonify(
+                    {
+                        "code": 409,
+                        "msg": f"A request with this {IDEMPOTENCY_HEADER} is still being processed",
+                    }
+                ), 200
+            saved = (existing.request_hash, existing.response_status, existing.response_body)
+            response_cache.set(scope, saved, ttl)
+            return _replay(saved)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _release(scope)
+            raise
+        if response.status_code >= 500:
+            # Server errors are not final; let a retry run the handler again
+            _release(scope)
+            return response
+
+        saved = (request_hash, response.status_code, response.get_data(as_text=True))
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(user_id=user_id, endpoint=endpoint, key=key).update(
+            {
+                "status": "completed",
+                "response_status": saved[1],
+                "response_body": saved[2],
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        response_cache.set(scope, saved, ttl)
+        return response
+
+    return decorated_function
+
+
+def purge_expired_keys():
+    """
+    Delete saved responses past their TTL.
+
+    Returns:
+        int: Number of keys deleted
+    """
+    result = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,254 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from backend.app import db
+from backend.app.models.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Registered job handlers by name, see @task
+TASKS = {}
+
+# Seconds between retries grow as BASE * 2 ** (attempts - 1), up to MAX
+RETRY_BACKOFF_BASE = 5
+RETRY_BACKOFF_MAX = 3600
+
+
+def task(name):
+    """Register a function as the handler for jobs called `name`."""
+
+    def decorator(func):
+        TASKS[name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, idempotency_key=None, queue="default", run_at=None, max_attempts=5):
+    """
+    Add a job in the caller's transaction.
+
+    The job becomes visible to workers only when the caller commits, so it runs
+    if and only if the state change that produced it was saved.
+
+    Args:
+        name: Registered task name
+        payload: JSON-serialisable arguments for the handler
+        idempotency_key: Jobs enqueued with the same key are created once
+        queue: Queue to put the job on
+        run_at: Earliest time to run the job (defaults to now)
+        max_attempts: Give up and mark the job failed after this many attempts
+
+    Returns:
+        Job: The new job, or the existing one with the same idempotency key
+    """
+    if idempotency_key is not None:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing
+
+    job = Job(
+        queue=queue,
+        name=name,
+        payload=payload or {},
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts,
+        run_at=run_at or datetime.utcnow(),
+    )
+    try:
+        # A savepoint, so losing an idempotency race does not abort the caller's transaction
+        with db.session.begin_nested():
+            db.session.add(job)
+    except IntegrityError:
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    return job
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale_jobs(lock_timeout):
+    """
+    Put jobs back in the queue whose worker died mid-run.
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=lock_timeout)
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == "running", Job.started_at < cutoff)
+        .values(status="queued", locked_by=None, run_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def claim_jobs(worker, queue="default", limit=10):
+    """
+    Claim up to `limit` due jobs for `worker` and mark them running.
+
+    On PostgreSQL rows locked by other workers are skipped (FOR UPDATE SKIP
+    LOCKED), so concurrent workers never wait on each other. The conditional
+    UPDATE keeps claims exclusive on databases without row locks as well.
+
+    Returns:
+        list: The claimed Job objects
+    """
+    now = datetime.utcnow()
+    ids = db.session.scalars(
+        select(Job.job_id)
+        .where(Job.queue == queue, Job.status == "queued", Job.run_at <= now)
+        .order_by(Job.run_at, Job.job_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    if not ids:
+        db.session.commit()
+        return []
+    db.session.execute(
+        update(Job)
+        .where(Job.job_id.in_(ids), Job.status == "queued")
+        .values(status="running", attempts=Job.attempts + 1, started_at=now, locked_by=worker)
+    )
+    db.session.commit()
+    # Jobs another worker claimed between the SELECT and the UPDATE are not ours
+    return (
+        Job.query.filter(
+            Job.job_id.in_(ids), Job.status == "running", Job.locked_by == worker, Job.started_at == now
+        )
+        .order_by(Job.run_at, Job.job_id)
+        .all()
+    )
+
+
+def run_job(job):
+    """
+    Run one claimed job and record the outcome.
+
+    The handler's writes and the job's completion commit together. On error the
+    handler's writes are rolled back and the job is retried with exponential
+    backoff until it runs out of attempts.
+
+    Returns:
+        bool: True if the job succeeded
+    """
+    job_id = job.job_id
+    handler = TASKS.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.name!r}")
+        handler(**job.payload)
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) failed", job_id, job.name)
+
+    job = db.session.get(Job, job_id)
+    job.last_error = error
+    job.locked_by = None
+    if job.attempts >= job.max_attempts:
+        job.status = "failed"
+        job.finished_at = datetime.utcnow()
+    else:
+        delay = min(RETRY_BACKOFF_BASE * 2 ** (job.attempts - 1), RETRY_BACKOFF_MAX)
+        job.status = "queued"
+        job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+    db.session.commit()
+    return False
+
+
+def work(queue="default", batch_size=10, poll_interval=1.0, lock_timeout=300, burst=False, worker=None):
+    """
+    Process jobs until interrupted.
+
+    Args:
+        queue: Queue to consume
+        batch_size: Jobs claimed per round trip
+        poll_interval: Seconds to sleep when the queue is empty
+        lock_timeout: Seconds after which a running job is considered abandoned
+        burst: Return as soon as the queue is empty instead of polling
+        worker: Name recorded on claimed jobs (defaults to host:pid)
+
+    Returns:
+        tuple: (succeeded, failed) job counts
+    """
+    # Importing the task modules registers their handlers
+    import backend.app.utils.tasks  # noqa: F401
+
+    worker = worker or worker_name()
+    succeeded = failed = 0
+    last_requeue = 0.0
+    while True:
+        if time.monotonic() - last_requeue >= lock_timeout / 2:
+            requeue_stale_jobs(lock_timeout)
+            last_requeue = time.monotonic()
+
+        jobs = claim_jobs(worker, queue, batch_size)
+        if not jobs:
+            if burst:
+                return succeeded, failed
+            time.sleep(poll_interval)
+            continue
+        for job in jobs:
+            if run_job(job):
+                succeeded += 1
+            else:
+                failed += 1
+
+
+def queue_stats(queue=None, window_hours=1):
+    """
+    Queue depth and latency.
+
+    Args:
+        queue: Restrict to one queue (all queues by default)
+        window_hours: Look-back window for the wait / run time averages
+
+    Returns:
+        dict: Job counts by status, the age of the oldest due job, and the average
+        wait (created -> started) and run time of jobs finished in the window
+    """
+    now = datetime.utcnow()
+    base = select(Job)
+    if queue is not None:
+        base = base.where(Job.queue == queue)
+    jobs = base.subquery()
+
+    counts = dict(
+        db.session.execute(select(jobs.c.status, func.count()).group_by(jobs.c.status)).all()
+    )
+    oldest_due = db.session.scalar(
+        select(func.min(jobs.c.run_at)).where(jobs.c.status == "queued", jobs.c.run_at <= now)
+    )
+    finished = db.session.execute(
+        select(jobs.c.created_at, jobs.c.started_at, jobs.c.finished_at).where(
+            jobs.c.status == "done",
+            jobs.c.finished_at >= now - timedelta(hours=window_hours),
+        )
+    ).all()
+
+    waits = [(started - created).total_seconds() for created, started, _ in finished]
+    runs = [(done - started).total_seconds() for _, started, done in finished]
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_due_seconds": round((now - oldest_due).total_seconds(), 3) if oldest_due else 0,
+        "finished_in_window": len(finished),
+        "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else None,
+        "avg_run_seconds": round(sum(runs) / len(runs), 3) if runs else None,
+    }
@@ -0,0 +1,586 @@
+"""
+End-to-end workflow load simulator.
+
+`flask load-sim` runs many virtual users against a running API server. Each
+virtual user repeatedly picks a workflow from a weighted mix (customers
+booking and cancelling, store admins approving and returning, extension
+requests and decisions, transfers between stores) and plays it through the
+HTTP API, so requests contend for the same rentals and vehicles the way real
+traffic does. A background sweeper lists all rentals as global admin, which
+runs the overdue sweep of GET /api/rentals underneath the traffic.
+
+Every request is classified as ok, conflict (code 409: lost a race),
+rejected (any other 4xx code, e.g. the rental changed status under us),
+throttled (HTTP 429) or error (HTTP 5xx, transport failures). Latencies are
+kept in fixed-size logarithmic histograms, so a soak of any length uses
+constant memory. Given the server's pid, the resident set size of the server
+and its worker processes is sampled too, and its growth rate reported, to
+catch leaks.
+"""
+import http.client
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+from sqlalchemy import func, select, update
+from backend.app import db
+from backend.app.models.models import User, Vehicle
+from backend.app.utils.provisioning import provision_users
+from backend.app.utils.sharding import gather, owned_vehicles
+
+ACCOUNT_DOMAIN = "loadsim.test"
+ACCOUNT_PASSWORD = "loadsim-password"
+
+DEFAULT_MIX = {
+    "book": 40,
+    "approve": 20,
+    "return": 15,
+    "extend": 15,
+    "transfer": 10,
+}
+
+OUTCOMES = ("ok", "conflict", "rejected", "throttled", "error")
+
+# Distinct failure messages kept per endpoint
+MAX_MESSAGES = 50
+
+# Relative width of a latency histogram bucket (percentiles are this accurate)
+HISTOGRAM_PRECISION = 0.02
+
+
+def parse_mix(spec):
+    """Workflow weights from "book=40,approve=20,..." (missing workflows get 0)."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown workflow: {name} (expected one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("The workflow mix needs at least one positive weight")
+    return mix
+
+
+def prepare_accounts(customers, store_count):
+    """
+    Create the simulator's accounts if missing, in the configured database.
+
+    Uses the stores with the most vehicles, so approvals and transfers have
+    vehicles to work with.
+
+    Args:
+        customers: Regular user accounts to have
+        store_count: Stores to run traffic against; each gets a store admin
+
+    Returns:
+        dict: stores (store id -> list of vehicle type ids there), customers
+            (emails), store_admins (store id -> email) and root (email)
+    """
+    counts = {}
+    for part in gather(
+        lambda: db.session.execute(
+            owned_vehicles(select(Vehicle.store_id, func.count()).where(Vehicle.store_id.is_not(None)))
+            .group_by(Vehicle.store_id)
+        ).all()
+    ):
+        for store_id, count in part:
+            counts[store_id] = counts.get(store_id, 0) + count
+    top = sorted(counts, key=lambda store_id: (-counts[store_id], store_id))[:store_count]
+    if len(top) < 2:
+        raise ValueError("The load simulator needs at least two stores with vehicles")
+    stores = {store_id: set() for store_id in top}
+    for part in gather(
+        lambda: db.session.execute(
+            owned_vehicles(select(Vehicle.store_id, Vehicle.type_id).where(Vehicle.store_id.in_(top))).distinct()
+        ).all()
+    ):
+        for store_id, type_id in part:
+            stores[store_id].add(type_id)
+    stores = {store_id: sorted(type_ids) for store_id, type_ids in stores.items()}
+
+    customer_emails = [f"customer-{i}@{ACCOUNT_DOMAIN}" for i in range(customers)]
+    admin_emails = {store_id: f"admin-{store_id}@{ACCOUNT_DOMAIN}" for store_id in stores}
+    root_email = f"root@{ACCOUNT_DOMAIN}"
+    records = [
+        {"name": email.split("@")[0], "email": email, "password": ACCOUNT_PASSWORD,
+         "address": "Load simulator", "phone_number": "0"}
+        for email in [root_email, *admin_emails.values(), *customer_emails]
+    ]
+    provision_users(records)
+
+    # Admin rights are not part of provisioning; (re)apply them every run
+    db.session.execute(update(User).where(User.email == root_email).values(is_admin=True, managed_store_id=None))
+    for store_id, email in admin_emails.items():
+        db.session.execute(update(User).where(User.email == email).values(is_admin=True, managed_store_id=store_id))
+    db.session.commit()
+    return {
+        "stores": stores,
+        "customers": customer_emails,
+        "store_admins": admin_emails,
+        "root": root_email,
+    }
+
+
+class LatencyHistogram:
+    """Logarithmic latency histogram with bounded memory."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        ms = max(seconds * 1000, 0.001)
+        bucket = math.ceil(math.log(ms) / math.log1p(HISTOGRAM_PRECISION))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += ms
+        self.maximum = max(self.maximum, ms)
+
+    def percentile(self, p):
+        """Latency in ms below which `p` percent of the samples fall (None if empty)."""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min((1 + HISTOGRAM_PRECISION) ** bucket, self.maximum)
+        return self.maximum
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            **{f"p{p}_ms": _round(self.percentile(p)) for p in (50, 95, 99)},
+            "max_ms": round(self.maximum, 2),
+        }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+class Stats:
+    """Thread-safe request outcomes and latencies, overall, per endpoint and per interval."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.interval = self._empty()
+        self.total = self._empty()
+
+    @staticmethod
+    def _empty():
+        return {"latency": LatencyHistogram(), "messages": {}, **{outcome: 0 for outcome in OUTCOMES}}
+
+    def record(self, label, outcome, seconds, message=None):
+        with self._lock:
+            for bucket in (self.endpoints.setdefault(label, self._empty()), self.interval, self.total):
+                bucket[outcome] += 1
+                bucket["latency"].add(seconds)
+            if message is not None:
+                messages = self.endpoints[label]["messages"]
+                # Bounded, in case messages embed ids
+                if message in messages or len(messages) < MAX_MESSAGES:
+                    messages[message] = messages.get(message, 0) + 1
+
+    def take_interval(self):
+        with self._lock:
+            interval, self.interval = self.interval, self._empty()
+        return interval
+
+
+def summarize(bucket, seconds):
+    requests = bucket["latency"].count
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / seconds, 1) if seconds > 0 else None,
+        **{f"{outcome}_rate": round(bucket[outcome] / requests, 4) if requests else 0 for outcome in OUTCOMES[1:]},
+        **bucket["latency"].summary(),
+        "messages": dict(sorted(bucket["messages"].items(), key=lambda item: -item[1])[:5]),
+    }
+
+
+def process_rss(pid):
+    """Resident set size in bytes of `pid` and all its descendants (None if unavailable)."""
+    total, pending, seen = 0, [pid], set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return total
+
+
+def _growth_per_hour(samples):
+    """Least-squares slope in bytes per hour of (seconds, bytes) samples, over the second half."""
+    samples = samples[len(samples) // 2:]
+    if len(samples) < 2:
+        return None
+    n = len(samples)
+    mean_t = sum(t for t, _ in samples) / n
+    mean_v = sum(v for _, v in samples) / n
+    var = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not var:
+        return None
+    return sum((t - mean_t) * (v - mean_v) for t, v in samples) / var * 3600
+
+
+class Accounts:
+    """Access tokens of the simulator's accounts, logged in on first use and after expiry."""
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def token(self, client, email, refresh=False):
+        with self._lock:
+            token = self._tokens.get(email)
+        if token and not refresh:
+            return token
+        body = client.call("POST", "/api/users/login", "POST /api/users/login",
+                           body={"email": email, "password": ACCOUNT_PASSWORD})
+        token = ((body or {}).get("data") or {}).get("access_token")
+        if token:
+            with self._lock:
+                self._tokens[email] = token
+        return token
+
+
+class Client:
+    """One keep-alive HTTP connection, used by one virtual user at a time."""
+
+    def __init__(self, base_url, stats, accounts, timeout=30):
+        parts = urlsplit(base_url)
+        connection = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._connect = lambda: connection(parts.hostname, parts.port, timeout=timeout)
+        self.conn = self._connect()
+        self.stats = stats
+        self.accounts = accounts
+
+    def call(self, method, path, label, as_user=None, body=None, params=None, headers=None):
+        """
+        Send one request and record its outcome.
+
+        Args:
+            as_user: Email of the account to authenticate as (None for anonymous)
+
+        Returns:
+            dict or None: The response body, None if the request failed
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        for attempt in range(2):
+            request_headers = {"Content-Type": "application/json", **(headers or {})}
+            if as_user:
+                token = self.accounts.token(self, as_user, refresh=attempt > 0)
+                if not token:
+                    return None
+                request_headers["Authorization"] = f"Bearer {token}"
+            started = time.perf_counter()
+            try:
+                self.conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                                  headers=request_headers)
+                response = self.conn.getresponse()
+                raw = response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                self.conn = self._connect()
+                self.stats.record(label, "error", time.perf_counter() - started, type(e).__name__)
+                return None
+            elapsed = time.perf_counter() - started
+            # An expired token: log in again and retry once
+            if status == 401 and as_user and attempt == 0:
+                continue
+            try:
+                payload = json.loads(raw) if raw else {}
+            except ValueError:
+                payload = {}
+            code = payload.get("code", status) if isinstance(payload, dict) else status
+            if status == 429:
+                outcome = "throttled"
+            elif status >= 500 or not isinstance(payload, dict) or code >= 500:
+                outcome = "error"
+            elif code == 409:
+                outcome = "conflict"
+            elif status >= 400 or code >= 400:
+                outcome = "rejected"
+            else:
+                outcome = "ok"
+            message = None
+            if outcome != "ok":
+                message = f"{code} {payload.get('msg', '')}" if isinstance(payload, dict) else str(status)
+            self.stats.record(label, outcome, elapsed, message)
+            return payload if outcome == "ok" else None
+        return None
+
+    def close(self):
+        self.conn.close()
+
+
+class VirtualUser:
+    """A simulated person with their own customer account and connection."""
+
+    def __init__(self, index, base_url, stats, accounts, fixtures, mix, think_time, seed):
+        self.rng = random.Random(seed * 100003 + index)
+        self.client = Client(base_url, stats, accounts)
+        self.customer = fixtures["customers"][index % len(fixtures["customers"])]
+        self.fixtures = fixtures
+        self.workflows = list(mix)
+        self.weights = [mix[name] for name in self.workflows]
+        self.think_time = think_time
+
+    def run(self, deadline, stop):
+        while time.monotonic() < deadline and not stop.is_set():
+            name = self.rng.choices(self.workflows, weights=self.weights)[0]
+            WORKFLOWS[name](self)
+            if self.think_time:
+                stop.wait(self.rng.expovariate(1 / self.think_time))
+        self.client.close()
+
+    # Helpers shared by the workflows
+
+    def pick_store(self):
+        return self.rng.choice(list(self.fixtures["stores"]))
+
+    def store_admin(self, store_id):
+        return self.fixtures["store_admins"][store_id]
+
+    def store_rentals(self, store_id, status, store_key="rental_store_id"):
+        rentals = self.client.call("GET", "/api/rentals", "GET /api/rentals [store admin]",
+                                   as_user=self.store_admin(store_id))
+        return [
+            r for r in (rentals or {}).get("data") or []
+            if r["rental_status"] == status and r[store_key] == store_id
+        ]
+
+    def own_rentals(self, status):
+        rentals = self.client.call("GET", "/api/rentals", "GET /api/rentals [customer]", as_user=self.customer)
+        return [r for r in (rentals or {}).get("data") or [] if r["rental_status"] == status]
+
+
+def _date(days):
+    return (datetime.utcnow().date() + timedelta(days=days)).isoformat()
+
+
+def book(vu):
+    """A customer browses stores and books a rental; some cancel it again."""
+    vu.client.call("GET", "/api/stores", "GET /api/stores", as_user=vu.customer)
+    store_id = vu.pick_store()
+    type_ids = vu.fixtures["stores"][store_id]
+    start = vu.rng.randrange(0, 7)
+    created = vu.client.call(
+        "POST", "/api/rentals", "POST /api/rentals", as_user=vu.customer,
+        body={
+            "rental_store_id": store_id,
+            "return_store_id": vu.rng.choice([store_id, vu.pick_store()]),
+            "vehicle_type_id": vu.rng.choice(type_ids),
+            "rental_date": _date(start),
+            "expected_return_date": _date(start + vu.rng.randrange(1, 6)),
+        },
+        headers={"Idempotency-Key": str(uuid.uuid4())},
+    )
+    vu.client.call("GET", "/api/rentals", "GET /api/rentals [customer]", as_user=vu.customer)
+    if created and vu.rng.random() < 0.2:
+        rental_id = created["data"]["rental_id"]
+        vu.client.call("PUT", f"/api/rentals/{rental_id}/cancel", "PUT /api/rentals/<id>/cancel", as_user=vu.customer)
+
+
+def approve(vu):
+    """A store admin approves a pending rental with one of the first free vehicles."""
+    store_id = vu.pick_store()
+    pending = vu.store_rentals(store_id, "pending")
+    if not pending:
+        return
+    rental = vu.rng.choice(pending)
+    available = vu.client.call(
+        "GET", "/api/vehicles/available", "GET /api/vehicles/available", as_user=vu.store_admin(store_id),
+        params={
+            "start": rental["rental_date"],
+            "end": rental["expected_return_date"],
+            "store_id": store_id,
+            "type_id": rental["vehicle_type_id"],
+        },
+    )
+    vehicles = (available or {}).get("data") or []
+    if not vehicles:
+        return
+    # Admins tend to take the first vehicle listed, which makes approvals race
+    vehicle = vu.rng.choice(vehicles[:3])
+    vu.client.call("PUT", f"/api/rentals/{rental['rental_id']}/approve", "PUT /api/rentals/<id>/approve",
+                   as_user=vu.store_admin(store_id), body={"vehicle_id": vehicle["vehicle_id"]})
+
+
+def return_rental(vu):
+    """A store admin takes back an active rental due at their store."""
+    store_id = vu.pick_store()
+    active = vu.store_rentals(store_id, "active", store_key="return_store_id")
+    if active:
+        rental = vu.rng.choice(active)
+        vu.client.call("PUT", f"/api/rentals/{rental['rental_id']}/return", "PUT /api/rentals/<id>/return",
+                       as_user=vu.store_admin(store_id))
+
+
+def extend(vu):
+    """A customer asks for more days on an active rental and the store admin decides."""
+    active = vu.own_rentals("active")
+    if not active:
+        return
+    rental = vu.rng.choice(active)
+    original = rental["expected_return_date"]
+    new_date = (datetime.strptime(original, "%Y-%m-%d").date() + timedelta(days=vu.rng.randrange(1, 4))).isoformat()
+    requested = vu.client.call("PUT", f"/api/rentals/{rental['rental_id']}/extend", "PUT /api/rentals/<id>/extend",
+                               as_user=vu.customer, body={"expected_return_date": new_date})
+    admin = vu.fixtures["store_admins"].get(rental["rental_store_id"])
+    if not requested or not admin:
+        return
+    if vu.rng.random() < 0.8:
+        vu.client.call("PUT", f"/api/rentals/{rental['rental_id']}/approve-extension",
+                       "PUT /api/rentals/<id>/approve-extension", as_user=admin)
+    else:
+        vu.client.call("PUT", f"/api/rentals/{rental['rental_id']}/reject-extension",
+                       "PUT /api/rentals/<id>/reject-extension", as_user=admin,
+                       body={"original_return_date": original})
+
+
+def transfer(vu):
+    """A global admin moves a free vehicle to another store, start to finish."""
+    root = vu.fixtures["root"]
+    source, destination = vu.rng.sample(list(vu.fixtures["stores"]), 2)
+    available = vu.client.call("GET", "/api/vehicles/available", "GET /api/vehicles/available", as_user=root,
+                               params={"start": _date(0), "end": _date(7), "store_id": source})
+    vehicles = (available or {}).get("data") or []
+    if not vehicles:
+        return
+    created = vu.client.call(
+        "POST", "/api/transfers", "POST /api/transfers", as_user=root,
+        body={"vehicle_id": vu.rng.choice(vehicles)["vehicle_id"], "source_store_id": source,
+              "destination_store_id": destination},
+    )
+    if not created:
+        return
+    transfer_id = created["data"]["transfer_id"]
+    if vu.client.call("PUT", f"/api/transfers/{transfer_id}/approve", "PUT /api/transfers/<id>/approve", as_user=root):
+        vu.client.call("PUT", f"/api/transfers/{transfer_id}/complete", "PUT /api/transfers/<id>/complete",
+                       as_user=root)
+
+
+WORKFLOWS = {
+    "book": book,
+    "approve": approve,
+    "return": return_rental,
+    "extend": extend,
+    "transfer": transfer,
+}
+
+
+def simulate(base_url, fixtures, users=20, duration=300, mix=None, think_time=0.5, sweep_interval=30,
+             report_interval=10, pid=None, seed=0, progress=None):
+    """
+    Run virtual users against a server and collect the results.
+
+    Args:
+        base_url: Server root, e.g. http://127.0.0.1:11451
+        fixtures: Accounts and stores from prepare_accounts()
+        users: Concurrent virtual users
+        duration: Seconds to run
+        mix: Workflow weights (defaults to DEFAULT_MIX)
+        think_time: Mean pause in seconds between a user's workflows
+        sweep_interval: Seconds between overdue sweeps (0 disables them)
+        report_interval: Seconds between progress reports and RSS samples
+        pid: Server process whose RSS (with its children) is sampled
+        seed: Random seed of the virtual users' choices
+        progress: Optional callable receiving one line per interval
+
+    Returns:
+        dict: overall and per-endpoint summaries, per-interval timeline and RSS figures
+    """
+    mix = mix or DEFAULT_MIX
+    stats = Stats()
+    accounts = Accounts()
+    stop = threading.Event()
+    started = time.monotonic()
+    deadline = started + duration
+
+    def sweep():
+        client = Client(base_url, stats, accounts)
+        while not stop.wait(sweep_interval):
+            client.call("GET", "/api/rentals", "GET /api/rentals [sweep]", as_user=fixtures["root"])
+        client.close()
+
+    vus = [VirtualUser(i, base_url, stats, accounts, fixtures, mix, think_time, seed) for i in range(users)]
+    threads = [threading.Thread(target=vu.run, args=(deadline, stop), daemon=True) for vu in vus]
+    if sweep_interval:
+        threads.append(threading.Thread(target=sweep, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    timeline, rss_samples = [], []
+    last = started
+    try:
+        while any(t.is_alive() for t in threads[:users]):
+            stop.wait(min(report_interval, max(deadline - time.monotonic(), 0.1)))
+            now = time.monotonic()
+            if now - last < report_interval and now < deadline:
+                continue
+            point = {"elapsed_seconds": round(now - started, 1), **summarize(stats.take_interval(), now - last)}
+            last = now
+            if pid:
+                point["rss_bytes"] = process_rss(pid)
+                if point["rss_bytes"] is not None:
+                    rss_samples.append((now - started, point["rss_bytes"]))
+            timeline.append(point)
+            if progress:
+                rss = f" rss {point['rss_bytes'] / 1048576:.0f}MB" if point.get("rss_bytes") else ""
+                progress(
+                    f"{point['elapsed_seconds']:>7.0f}s {point['throughput_rps'] or 0:>7.1f} req/s "
+                    f"p50 {point['p50_ms'] or 0:.0f}ms p95 {point['p95_ms'] or 0:.0f}ms p99 {point['p99_ms'] or 0:.0f}ms "
+                    f"conflicts {point['conflict_rate']:.1%} rejected {point['rejected_rate']:.1%} "
+                    f"errors {point['error_rate']:.1%}{rss}"
+                )
+            if now >= deadline:
+                break
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=30)
+
+    elapsed = time.monotonic() - started
+    result = {
+        "users": users,
+        "duration_seconds": round(elapsed, 1),
+        "mix": mix,
+        "overall": summarize(stats.total, elapsed),
+        "endpoints": {label: summarize(bucket, elapsed) for label, bucket in sorted(stats.endpoints.items())},
+        "timeline": timeline,
+    }
+    if rss_samples:
+        growth = _growth_per_hour(rss_samples)
+        result["rss"] = {
+            "start_bytes": rss_samples[0][1],
+            "peak_bytes": max(v for _, v in rss_samples),
+            "end_bytes": rss_samples[-1][1],
+            "growth_bytes_per_hour": round(growth) if growth is not None else None,
+        }
+    return result
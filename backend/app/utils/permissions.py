@@ -0,0 +1,150 @@
+from flask import abort
+from sqlalchemy import false, or_, select, true
+from backend.app import db
+from backend.app.models.models import ArchivedRental, Rental, VehicleTransfer
+
+# Rental actions and which store a store admin must manage to perform them:
+#   view / cancel              -> rental store or return store
+#   approve / review_extension -> rental store
+#   return                     -> return store
+# Regular users may view, return and cancel their own rentals only.
+# Extensions can only ever be requested by the rental owner, whatever the role.
+ADMIN_ONLY_RENTAL_ACTIONS = ("approve", "review_extension")
+
+# Transfer actions and which store a store admin must manage to perform them:
+#   view / cancel -> source store or destination store
+#   approve       -> source store
+#   complete      -> destination store
+# Transfers are never visible to regular users.
+
+
+def is_global_admin(user):
+    return user.is_admin and user.managed_store_id is None
+
+
+def is_store_admin(user):
+    return user.is_admin and user.managed_store_id is not None
+
+
+def rental_scope(user, action="view", model=Rental):
+    """
+    Build the SQL predicate restricting rentals to those `user` may act on.
+
+    Args:
+        user: The current User
+        action: One of view, approve, return, extend, review_extension, cancel
+        model: Rental, or ArchivedRental to scope the archive the same way
+
+    Returns:
+        A SQLAlchemy boolean expression usable in WHERE or SELECT clauses
+    """
+    if action == "extend":
+        return model.user_id == user.user_id
+
+    if is_global_admin(user):
+        return true()
+
+    if is_store_admin(user):
+        store_id = user.managed_store_id
+        if action in ADMIN_ONLY_RENTAL_ACTIONS:
+            return model.rental_store_id == store_id
+        if action == "return":
+            return model.return_store_id == store_id
+        return or_(
+            model.rental_store_id == store_id, model.return_store_id == store_id
+        )
+
+    if action in ADMIN_ONLY_RENTAL_ACTIONS:
+        return false()
+    return model.user_id == user.user_id
+
+
+def transfer_scope(user, action="view"):
+    """
+    Build the SQL predicate restricting transfers to those `user` may act on.
+
+    Args:
+        user: The current User
+        action: One of view, approve, complete, cancel
+
+    Returns:
+        A SQLAlchemy boolean expression usable in WHERE or SELECT clauses
+    """
+    if not user.is_admin:
+        return false()
+    if is_global_admin(user):
+        return true()
+
+    store_id = user.managed_store_id
+    if action == "approve":
+        return VehicleTransfer.source_store_id == store_id
+    if action == "complete":
+        return VehicleTransfer.destination_store_id == store_id
+    return or_(
+        VehicleTransfer.source_store_id == store_id,
+        VehicleTransfer.destination_store_id == store_id,
+    )
+
+
+def scoped_rentals(user, action="view"):
+    """Rental query pre-filtered to the rentals `user` may act on."""
+    return Rental.query.filter(rental_scope(user, action))
+
+
+def scoped_transfers(user, action="view"):
+    """VehicleTransfer query pre-filtered to the transfers `user` may act on."""
+    return VehicleTransfer.query.filter(transfer_scope(user, action))
+
+
+def _get_authorized_or_404(model, pk_column, pk, predicate):
+    row = db.session.execute(
+        select(model, predicate.label("permitted")).where(pk_column == pk)
+    ).first()
+    if row is None:
+        abort(404)
+    return row[0], bool(row[1])
+
+
+def get_rental_or_404(user, rental_id, action="view", include_archived=False):
+    """
+    Load a rental and evaluate the caller's permission in the same primary-key query.
+
+    Args:
+        include_archived: Fall back to the archive when the rental is not in the
+            hot table (read-only actions only)
+
+    Returns:
+        tuple: (rental, permitted) - aborts with 404 if the rental does not exist
+    """
+    if include_archived:
+        row = db.session.execute(
+            select(Rental, rental_scope(user, action).label("permitted")).where(
+                Rental.rental_id == rental_id
+            )
+        ).first()
+        if row is not None:
+            return row[0], bool(row[1])
+        return _get_authorized_or_404(
+            ArchivedRental,
+            ArchivedRental.rental_id,
+            rental_id,
+            rental_scope(user, action, ArchivedRental),
+        )
+    return _get_authorized_or_404(
+        Rental, Rental.rental_id, rental_id, rental_scope(user, action)
+    )
+
+
+def get_transfer_or_404(user, transfer_id, action="view"):
+    """
+    Load a transfer and evaluate the caller's permission in the same primary-key query.
+
+    Returns:
+        tuple: (transfer, permitted) - aborts with 404 if the transfer does not exist
+    """
+    return _get_authorized_or_404(
+        VehicleTransfer,
+        VehicleTransfer.transfer_id,
+        transfer_id,
+        transfer_scope(user, action),
+    )
@@ -0,0 +1,279 @@
+"""
+On-demand per-request profiling.
+
+A request is profiled when a global admin sends the X-Profile header, or at
+random with probability PROFILE_SAMPLE_RATE (optionally only for the
+endpoints in PROFILE_ENDPOINTS). A profiled request runs under cProfile, a
+sampler thread records its call stacks every PROFILE_STACK_INTERVAL seconds,
+and every SQL statement it executes is timed. The result is written to
+PROFILE_DIR, where any worker process on the host can serve it, and its id
+is returned in the X-Profile-Id response header:
+
+    <id>.json    request, SQL timeline and the slowest functions
+    <id>.prof    cProfile output, for pstats / snakeviz
+    <id>.folded  collapsed stacks, for flamegraph.pl / speedscope
+
+When no request is being profiled, the cost is one header and one config
+lookup per request and an integer check per SQL statement.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+PROFILE_ID_PATTERN = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{8}$")
+
+# Longest SQL text kept per statement in the timeline
+MAX_STATEMENT_LENGTH = 2000
+
+# Functions listed in the JSON summary, by cumulative time
+TOP_FUNCTIONS = 30
+
+# Profiled requests in flight in this process; the SQL listeners return at once when 0
+_active = 0
+_active_lock = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """Counts the call stacks of one thread, sampled at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _profile_dir():
+    return current_app.config["PROFILE_DIR"]
+
+
+def _requested_by_global_admin():
+    # Only checked when the header is present, so other requests pay nothing
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+    from backend.app import db
+    from backend.app.models.models import User
+    from backend.app.utils.permissions import is_global_admin
+
+    try:
+        verify_jwt_in_request(optional=True)
+        user_id = get_jwt_identity()
+    except Exception:
+        return False
+    user = db.session.get(User, user_id) if user_id is not None else None
+    return user is not None and is_global_admin(user)
+
+
+def _trigger():
+    """Why the current request should be profiled, or None."""
+    config = current_app.config
+    if request.headers.get(PROFILE_HEADER) and _requested_by_global_admin():
+        return "header"
+    rate = config["PROFILE_SAMPLE_RATE"]
+    if rate and random.random() < rate:
+        endpoints = config["PROFILE_ENDPOINTS"]
+        if not endpoints or request.endpoint in endpoints:
+            return "sampled"
+    return None
+
+
+def _start():
+    global _active
+    trigger = _trigger()
+    if trigger is None:
+        return
+    sampler = StackSampler(threading.get_ident(), current_app.config["PROFILE_STACK_INTERVAL"])
+    profiler = cProfile.Profile()
+    g.profile = {
+        "id": f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}",
+        "trigger": trigger,
+        "started_at": datetime.utcnow(),
+        "started": time.perf_counter(),
+        "profiler": profiler,
+        "sampler": sampler,
+        "sql": [],
+    }
+    with _active_lock:
+        _active += 1
+    sampler.start()
+    profiler.enable()
+
+
+def _stop(profile):
+    global _active
+    profile["profiler"].disable()
+    profile["sampler"].stop()
+    with _active_lock:
+        _active -= 1
+    return time.perf_counter() - profile["started"]
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+        )
+    rows.sort(key=lambda row: -row["cumulative_ms"])
+    return rows[:TOP_FUNCTIONS]
+
+
+def _save(profile, elapsed, status_code):
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, profile["id"])
+    profile["profiler"].dump_stats(base + ".prof")
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        for stack, count in profile["sampler"].stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    sql = profile["sql"]
+    summary = {
+        "profile_id": profile["id"],
+        "trigger": profile["trigger"],
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status_code": status_code,
+        "started_at": profile["started_at"].isoformat(),
+        "duration_ms": round(elapsed * 1000, 3),
+        "sql_count": len(sql),
+        "sql_ms": round(sum(s["duration_ms"] for s in sql), 3),
+        "stack_samples": sum(profile["sampler"].stacks.values()),
+        "top_functions": _top_functions(profile["profiler"]),
+        "sql_timeline": sql,
+    }
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    _prune(directory, current_app.config["PROFILE_MAX_STORED"])
+
+
+def _prune(directory, keep):
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+    for profile_id in ids[:max(len(ids) - keep, 0)]:
+        for suffix in (".json", ".prof", ".folded"):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit=100):
+    """Summaries (without timeline and functions) of the stored profiles, newest first."""
+    directory = _profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    ids = sorted((name[:-5] for name in os.listdir(directory) if name.endswith(".json")), reverse=True)
+    profiles = []
+    for profile_id in ids[:limit]:
+        profile = load_profile(profile_id)
+        if profile:
+            profile.pop("sql_timeline", None)
+            profile.pop("top_functions", None)
+            profiles.append(profile)
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    """Path of a stored profile file, or None if the id is malformed or unknown."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(_profile_dir(), profile_id + suffix)
+    return path if os.path.exists(path) else None
+
+
+def load_profile(profile_id):
+    path = profile_path(profile_id, ".json")
+    if path is None:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Pruned or still being written by another worker
+        return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _time_statement(conn, cursor, statement, parameters, context, executemany):
+    if _active and context is not None:
+        context.profile_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if not _active or not has_app_context():
+        return
+    profile = g.get("profile")
+    started = getattr(context, "profile_started", None)
+    if profile is None or started is None:
+        return
+    profile["sql"].append(
+        {
+            "offset_ms": round((started - profile["started"]) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "rows": cursor.rowcount,
+        }
+    )
+
+
+def init_profiling(app):
+    """Register the request profiling hooks on `app`."""
+
+    @app.before_request
+    def start_profile():
+        if request.headers.get(PROFILE_HEADER) or current_app.config["PROFILE_SAMPLE_RATE"]:
+            _start()
+
+    @app.after_request
+    def save_profile(response):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            elapsed = _stop(profile)
+            _save(profile, elapsed, response.status_code)
+            response.headers[PROFILE_ID_HEADER] = profile["id"]
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        # The request failed before after_request ran
+        profile = g.pop("profile", None)
+        if profile is not None:
+            _stop(profile)
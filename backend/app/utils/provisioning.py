@@ -0,0 +1,154 @@
+"""
+Bulk user provisioning.
+
+Creating users one by one costs a password hash (PBKDF2, deliberately slow)
+and a commit each. provision_users() checks all emails against the users
+table in one query, hashes the passwords on a pool of worker processes, and
+inserts the new users with one multi-row INSERT.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from backend.app import db
+from backend.app.models.models import User
+from backend.app.utils.search import search_index
+
+REQUIRED_FIELDS = ("name", "email", "password", "address", "phone_number")
+
+# Below this many passwords, starting worker processes costs more than it saves
+MIN_PARALLEL_HASHES = 8
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash passwords the same way as User.set_password, spread over worker processes.
+
+    Args:
+        passwords: Plain-text passwords
+        workers: Worker processes (defaults to the number of CPUs; 1 hashes in-process)
+
+    Returns:
+        list: Password hashes, in input order
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < MIN_PARALLEL_HASHES:
+        return [generate_password_hash(p) for p in passwords]
+    workers = min(workers, len(passwords))
+    # Spawned rather than forked: the caller may be a threaded server process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        chunksize = max(len(passwords) // (workers * 4), 1)
+        return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def _validate(record):
+    if not isinstance(record, dict):
+        return "Each user must be an object"
+    missing = [k for k in REQUIRED_FIELDS if not record.get(k)]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    if not all(isinstance(record[k], str) for k in REQUIRED_FIELDS):
+        return f"Fields must be strings: {', '.join(REQUIRED_FIELDS)}"
+    return None
+
+
+def _existing_emails(emails):
+    if not emails:
+        return set()
+    return set(db.session.scalars(select(User.email).where(User.email.in_(emails))))
+
+
+def provision_users(records, workers=None):
+    """
+    Create many regular users at once and commit them.
+
+    Rows that are invalid, repeat an email of an earlier row, or use an email
+    that is already registered are skipped and reported; the rest are created.
+
+    Args:
+        records: Dicts with name, email, password, address and phone_number
+        workers: Password hashing processes (defaults to the number of CPUs)
+
+    Returns:
+        dict: results (one per record, in input order, with the new user_id on
+            success), created, failed, elapsed_seconds and users_per_second
+    """
+    started = time.perf_counter()
+    results = [None] * len(records)
+    candidates = {}
+    for row, record in enumerate(records):
+        error = _validate(record)
+        email = record.get("email") if isinstance(record, dict) else None
+        if error:
+            results[row] = {"row": row, "email": email, "code": 400, "msg": error}
+        elif email in candidates:
+            results[row] = {"row": row, "email": email, "code": 409, "msg": "Duplicate email in request"}
+        else:
+            candidates[email] = row
+
+    # One query against the unique email index for the whole batch
+    taken = _existing_emails(list(candidates))
+    to_create = [(email, row) for email, row in candidates.items() if email not in taken]
+    hashes = hash_passwords([records[row]["password"] for _, row in to_create], workers)
+
+    today = datetime.utcnow().date()
+    pending = {}
+    for (email, row), password_hash in zip(to_create, hashes):
+        record = records[row]
+        pending[email] = {
+            "name": record["name"],
+            "email": email,
+            "address": record["address"],
+            "phone_number": record["phone_number"],
+            "join_date": today,
+            "is_admin": False,
+            "managed_store_id": None,
+            "password_hash": password_hash,
+        }
+
+    created = {}
+    while pending:
+        try:
+            inserted = db.session.execute(
+                insert(User).returning(User.user_id, User.email), list(pending.values())
+            ).all()
+            db.session.commit()
+        except IntegrityError:
+            # Someone registered one of the emails since the check; drop those and retry
+            db.session.rollback()
+            raced = _existing_emails(list(pending))
+            if not raced:
+                raise
+            for email in raced:
+                pending.pop(email, None)
+            continue
+        created = {email: user_id for user_id, email in inserted}
+        break
+    if created:
+        search_index.invalidate()
+
+    for email, row in candidates.items():
+        if email in created:
+            results[row] = {
+                "row": row,
+                "email": email,
+                "code": 200,
+                "msg": "User created",
+                "user_id": created[email],
+            }
+        else:
+            results[row] = {"row": row, "email": email, "code": 409, "msg": "Email already registered"}
+
+    elapsed = time.perf_counter() - started
+    return {
+        "results": results,
+        "created": len(created),
+        "failed": len(results) - len(created),
+        "elapsed_seconds": round(elapsed, 3),
+        "users_per_second": round(len(created) / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,579 @@
+"""
+Per-route query count and query plan audit.
+
+`flask query-audit` seeds a scratch database, calls every API route once
+through the test client, and records each SQL statement the route runs
+together with its EXPLAIN plan. A route fails the audit when it runs more
+statements than its budget in AUDIT_CASES (unless KNOWN_OVER_BUDGET lists it
+as a known offender), or when one of its plans scans a
+large table sequentially and the stored baseline did not already accept
+that scan. Differences from the baseline (query_baseline.json, one section
+per database dialect) are printed as a unified diff; --update-baseline
+accepts the current results.
+"""
+import difflib
+import json
+import os
+import random
+import re
+import tempfile
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import event, func, select
+from werkzeug.security import generate_password_hash
+from backend.app import db
+from backend.app.models.models import (
+    ArchivedRental,
+    Rental,
+    Store,
+    User,
+    Vehicle,
+    VehicleTransfer,
+    VehicleType,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "query_baseline.json")
+
+# Tables with at least this many seeded rows must not be scanned sequentially
+LARGE_TABLE_ROWS = 500
+
+# Seeded rows per unit of --scale
+SEED_SIZES = {
+    "stores": 20,
+    "vehicle_types": 10,
+    "vehicles_per_store": 30,
+    "users": 1000,
+    "rentals": 5000,
+    "archived_rentals": 2000,
+    "transfers": 500,
+}
+
+# Queries that render the relationships in to_dict() when each is eager-loaded
+# (one per relationship path, whatever the number of rows)
+VEHICLE_RELATION_LOADS = 2  # type, store
+TRANSFER_RELATION_LOADS = 6  # vehicle with its type and store, source and destination stores, approver
+RENTAL_RELATION_LOADS = 7  # user, vehicle with its type and store, vehicle type, rental and return stores
+
+# (method, path, caller, JSON body, query budget), run in this order. Paths
+# and bodies refer to seeded fixtures by name; writes come after the reads
+# that depend on the fixtures they change. Budgets are the bounds a route
+# should meet, not its current count: routes on one entity need a fixed
+# handful of statements, and list routes one statement per table they read,
+# never one per row.
+AUDIT_CASES = [
+    ("GET", "/api/health", None, None, 0),
+    ("POST", "/api/users/login", None, {"email": "alice@audit.test", "password": "audit"}, 3),
+    ("GET", "/api/users/profile", "user", None, 1),
+    ("GET", "/api/users", "super", None, 2),
+    ("GET", "/api/users/{carol}", "super", None, 2),
+    ("GET", "/api/stores", None, None, 1),
+    ("GET", "/api/stores/{store_1}", None, None, 1),
+    ("GET", "/api/stores/{store_1}/managers", "super", None, 3),
+    ("GET", "/api/stores/nearby?lat=39.9&lon=116.4&k=5", None, None, 2),
+    ("GET", "/api/stores/nearby?lat=39.9&lon=116.4&k=5&type_id={type_1}", None, None, 2),
+    ("GET", "/api/vehicles", "super", None, 2 + VEHICLE_RELATION_LOADS),
+    ("GET", "/api/vehicles/{vehicle_free}", "super", None, 4),
+    ("GET", "/api/vehicles/{vehicle_free}/events", "super", None, 3),
+    ("GET", "/api/vehicles/available?start={today}&end={in_3_days}&store_id={store_1}", "super", None, 2 + VEHICLE_RELATION_LOADS),
+    ("GET", "/api/vehicles/types", "super", None, 1),
+    ("GET", "/api/vehicles/types/{type_1}", "super", None, 1),
+    ("GET", "/api/views/vehicle-instances?page=1&page_size=20", "super", None, 5),
+    ("GET", "/api/rentals", "user", None, 4 + RENTAL_RELATION_LOADS),
+    ("GET", "/api/rentals", "store_admin", None, 4 + RENTAL_RELATION_LOADS),
+    # Current page of each table, plus the relationships of both row classes
+    ("GET", "/api/rentals/history?page=1&page_size=20", "super", None, 5 + 2 * RENTAL_RELATION_LOADS),
+    ("GET", "/api/rentals/{rental_active_return}", "user", None, 6),
+    ("GET", "/api/rentals/{rental_active_return}/events", "user", None, 3),
+    ("GET", "/api/transfers", "store_admin", None, 2 + TRANSFER_RELATION_LOADS),
+    ("GET", "/api/transfers/{transfer_approve}", "super", None, 6),
+    ("GET", "/api/search?q=alice", "super", None, 5),
+    ("GET", "/api/reports/revenue", "super", None, 2),
+    ("GET", "/api/reports/utilization?start={today}&end={in_9_days}", "super", None, 4),
+    ("GET", "/api/reports/rental-trend", "super", None, 2),
+    ("GET", "/api/jobs/stats", "super", None, 5),
+    ("GET", "/api/profiles", "super", None, 1),
+    ("GET", "/api/profiles/{profile_id}", "super", None, 1),
+    ("GET", "/api/profiles/{profile_id}/pstats", "super", None, 1),
+    ("POST", "/api/rentals", "user", {
+        "rental_store_id": "{store_1}", "return_store_id": "{store_1}", "vehicle_type_id": "{type_1}",
+        "rental_date": "{in_3_days}", "expected_return_date": "{in_5_days}",
+    }, 10),
+    ("PUT", "/api/rentals/{rental_pending_approve}/approve", "store_admin", {"vehicle_id": "{vehicle_free}"}, 11),
+    ("PUT", "/api/rentals/{rental_active_extend}/extend", "user", {"expected_return_date": "{in_9_days}"}, 11),
+    ("PUT", "/api/rentals/{rental_ext_approve}/approve-extension", "store_admin", None, 10),
+    ("PUT", "/api/rentals/{rental_ext_reject}/reject-extension", "store_admin", {"original_return_date": "{in_3_days}"}, 10),
+    ("PUT", "/api/rentals/{rental_active_return}/return", "user", None, 12),
+    ("PUT", "/api/rentals/{rental_pending_cancel}/cancel", "user", None, 9),
+    ("PUT", "/api/rentals/bulk/return", "super", {"rental_ids": ["{rental_bulk_return_1}", "{rental_bulk_return_2}"]}, 8),
+    ("PUT", "/api/rentals/bulk/cancel", "user", {"rental_ids": ["{rental_bulk_cancel_1}", "{rental_bulk_cancel_2}"]}, 5),
+    ("PUT", "/api/rentals/bulk/approve-extension", "super", {"rental_ids": ["{rental_bulk_ext}"]}, 4),
+    ("PUT", "/api/rentals/bulk/reject-extension", "super", {
+        "items": [{"rental_id": "{rental_bulk_reject}", "original_return_date": "{in_3_days}"}],
+    }, 4),
+    ("POST", "/api/transfers", "super", {
+        "vehicle_id": "{vehicle_transfer}", "source_store_id": "{store_1}", "destination_store_id": "{store_2}",
+    }, 13),
+    ("PUT", "/api/transfers/{transfer_approve}/approve", "store_admin", None, 10),
+    ("PUT", "/api/transfers/{transfer_complete}/complete", "super", None, 11),
+    ("PUT", "/api/transfers/{transfer_cancel}/cancel", "super", None, 9),
+    ("POST", "/api/stores", "super", {
+        "store_name": "Audit Store", "address": "1 Audit Rd", "phone_number": "100", "latitude": 30.0, "longitude": 120.0,
+    }, 3),
+    ("PUT", "/api/stores/{store_2}", "super", {"phone_number": "200"}, 4),
+    ("DELETE", "/api/stores/{store_empty}", "super", None, 10),
+    ("POST", "/api/vehicles/types", "super", {"brand": "Audit", "model": "A1", "daily_rent_price": 10}, 3),
+    ("PUT", "/api/vehicles/types/{type_1}", "super", {"daily_rent_price": 99}, 4),
+    ("DELETE", "/api/vehicles/types/{type_empty}", "super", None, 5),
+    ("POST", "/api/vehicles", "super", {"type_id": "{type_1}", "store_id": "{store_1}", "manufacture_date": "2024-01-01"}, 7),
+    ("PUT", "/api/vehicles/{vehicle_free}", "super", {"manufacture_date": "2024-02-01"}, 6),
+    ("DELETE", "/api/vehicles/{vehicle_delete}", "super", None, 6),
+    ("POST", "/api/users/register", None, {
+        "name": "Newcomer", "email": "newcomer@audit.test", "password": "audit", "address": "x", "phone_number": "1",
+    }, 5),
+    ("POST", "/api/users/bulk", "super", {"users": [
+        {"name": f"Bulk {i}", "email": f"bulk{i}@audit.test", "password": "audit", "address": "x", "phone_number": "1"}
+        for i in range(3)
+    ]}, 3),
+    ("PUT", "/api/users/{carol}/permissions", "super", {"is_admin": True, "managed_store_id": "{store_2}"}, 8),
+    ("POST", "/api/users/{dave}/revoke-tokens", "super", None, 4),
+    ("POST", "/api/users/refresh", "user_refresh", None, 1),
+    ("POST", "/api/users/logout", "logout", None, 1),
+    ("PUT", "/api/users/profile", "bob", {"password": "changed"}, 5),
+]
+
+# Routes that exceed their budget today, by case name, with the cause. They are
+# reported but do not fail the audit. Once one is back within budget the
+# audit fails until its entry is removed, so the fix is locked in.
+KNOWN_OVER_BUDGET = {
+    "GET /api/vehicles [super]": "Vehicle.to_dict() loads the type and store of each vehicle row by row",
+    "GET /api/vehicles/available?start={today}&end={in_3_days}&store_id={store_1} [super]":
+        "Vehicle.to_dict() loads the type and store of each vehicle row by row",
+    "GET /api/rentals [user]": "Rental.to_dict() loads the user, vehicle, type and stores of each rental row by row",
+    "GET /api/rentals [store_admin]":
+        "Rental.to_dict() loads the user, vehicle, type and stores of each rental row by row",
+    "GET /api/rentals/history?page=1&page_size=20 [super]":
+        "Rental.to_dict() and ArchivedRental.to_dict() load the relationships of each row one by one",
+    "GET /api/transfers [store_admin]":
+        "VehicleTransfer.to_dict() loads the vehicle, stores and approver of each transfer row by row",
+}
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%s|\$\d+|:\w+)\s*,)+\s*(?:\?|%s|\$\d+|:\w+)\s*\)")
+_SELECT_LIST = re.compile(r"^SELECT (?:DISTINCT )?.+? FROM ", re.S)
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+def seed(scale=1, rng=None):
+    """
+    Fill an empty schema with deterministic audit data.
+
+    Returns:
+        dict: Ids of the named fixtures used by AUDIT_CASES
+    """
+    rng = rng or random.Random(0)
+    today = datetime.utcnow().date()
+    sizes = {k: v * scale for k, v in SEED_SIZES.items()}
+    ids = {}
+
+    stores = [
+        Store(
+            store_name=f"Store {i}",
+            address=f"{i} Audit Street",
+            phone_number=str(1000 + i),
+            latitude=30 + rng.uniform(-10, 10),
+            longitude=115 + rng.uniform(-10, 10),
+        )
+        for i in range(sizes["stores"])
+    ]
+    store_empty = Store(store_name="Empty", address="Nowhere", phone_number="0")
+    types = [
+        VehicleType(brand=f"Brand {i}", model=f"Model {i}", daily_rent_price=40 + i)
+        for i in range(sizes["vehicle_types"])
+    ]
+    type_empty = VehicleType(brand="Unused", model="Unused", daily_rent_price=1)
+    db.session.add_all(stores + types + [store_empty, type_empty])
+    db.session.flush()
+    ids.update(
+        store_1=stores[0].store_id,
+        store_2=stores[1].store_id,
+        store_empty=store_empty.store_id,
+        type_1=types[0].type_id,
+        type_empty=type_empty.type_id,
+    )
+
+    vehicles = [
+        {"type_id": rng.choice(types).type_id, "store_id": store.store_id, "manufacture_date": today - timedelta(days=700)}
+        for store in stores
+        for _ in range(sizes["vehicles_per_store"])
+    ]
+    db.session.execute(Vehicle.__table__.insert(), vehicles)
+    vehicle_ids = db.session.scalars(select(Vehicle.vehicle_id).order_by(Vehicle.vehicle_id)).all()
+    store_1_vehicles = db.session.scalars(
+        select(Vehicle.vehicle_id).where(Vehicle.store_id == ids["store_1"]).order_by(Vehicle.vehicle_id)
+    ).all()
+    # Store 1 vehicles reserved for fixtures; historic rentals use the others
+    fixture_vehicles = iter(store_1_vehicles)
+    for name in ("vehicle_free", "vehicle_delete", "vehicle_transfer", "vehicle_transfer_approve",
+                 "vehicle_transfer_complete", "vehicle_transfer_cancel"):
+        ids[name] = next(fixture_vehicles)
+    db.session.execute(
+        Vehicle.__table__.update()
+        .where(Vehicle.vehicle_id.in_([ids["vehicle_free"], ids["vehicle_transfer"]]))
+        .values(type_id=ids["type_1"])
+    )
+    historic_vehicles = [v for v in vehicle_ids if v not in set(store_1_vehicles)]
+
+    password_hash = generate_password_hash("audit")
+    users = [
+        {
+            "name": f"Customer {i}",
+            "email": f"customer{i}@audit.test",
+            "address": f"{i} Customer Road",
+            "phone_number": str(5550000 + i),
+            "join_date": today - timedelta(days=rng.randrange(1, 1000)),
+            "is_admin": False,
+            "password_hash": password_hash,
+        }
+        for i in range(sizes["users"])
+    ]
+    db.session.execute(User.__table__.insert(), users)
+    customer_ids = db.session.scalars(select(User.user_id).where(User.email.like("customer%"))).all()
+
+    def person(key, name, is_admin=False, store_id=None):
+        user = User(
+            name=name,
+            email=f"{name.lower()}@audit.test",
+            address="Audit",
+            phone_number="123",
+            join_date=today,
+            is_admin=is_admin,
+            managed_store_id=store_id,
+            password_hash=password_hash,
+        )
+        db.session.add(user)
+        db.session.flush()
+        ids[key] = user.user_id
+
+    person("super", "Root", is_admin=True)
+    person("store_admin", "Manager", is_admin=True, store_id=ids["store_1"])
+    for key in ("alice", "bob", "carol", "dave"):
+        person(key, key.capitalize())
+
+    rentals = []
+    for _ in range(sizes["rentals"]):
+        start = today - timedelta(days=rng.randrange(30, 400))
+        vehicle_id = rng.choice(historic_vehicles)
+        rentals.append(
+            {
+                "rental_date": start,
+                "rental_store_id": rng.choice(stores).store_id,
+                "user_id": rng.choice(customer_ids),
+                "vehicle_id": vehicle_id,
+                "vehicle_type_id": None,
+                "expected_return_date": start + timedelta(days=rng.randrange(1, 8)),
+                "return_store_id": rng.choice(stores).store_id,
+                "rental_status": rng.choice(("returned",) * 9 + ("cancelled",)),
+                "is_overdue": False,
+            }
+        )
+    db.session.execute(Rental.__table__.insert(), rentals)
+    db.session.execute(
+        ArchivedRental.__table__.insert(),
+        [
+            {**rental, "rental_id": 10 ** 7 + i, "rental_date": rental["rental_date"] - timedelta(days=400),
+             "expected_return_date": rental["expected_return_date"] - timedelta(days=400),
+             "archived_at": datetime.utcnow()}
+            for i, rental in enumerate(rentals[:sizes["archived_rentals"]])
+        ],
+    )
+
+    # Fixture rentals of alice at store 1, each on its own store-1 vehicle
+    active_vehicles = iter(store_1_vehicles[6:])
+
+    def rental(key, status, return_store="store_1", with_vehicle=True):
+        r = Rental(
+            rental_date=today - timedelta(days=2) if with_vehicle else today,
+            rental_store_id=ids["store_1"],
+            user_id=ids["alice"],
+            vehicle_id=next(active_vehicles) if with_vehicle else None,
+            vehicle_type_id=ids["type_1"],
+            expected_return_date=today + timedelta(days=3),
+            return_store_id=ids[return_store],
+            rental_status=status,
+        )
+        db.session.add(r)
+        db.session.flush()
+        ids[key] = r.rental_id
+
+    for key in ("rental_pending_approve", "rental_pending_cancel", "rental_bulk_cancel_1", "rental_bulk_cancel_2"):
+        rental(key, "pending", with_vehicle=False)
+    for key in ("rental_active_return", "rental_active_extend"):
+        rental(key, "active")
+    for key in ("rental_bulk_return_1", "rental_bulk_return_2"):
+        rental(key, "active", return_store="store_2")
+    for key in ("rental_ext_approve", "rental_ext_reject", "rental_bulk_ext", "rental_bulk_reject"):
+        rental(key, "extension_requested")
+
+    db.session.execute(
+        VehicleTransfer.__table__.insert(),
+        [
+            {
+                "vehicle_id": rng.choice(historic_vehicles),
+                "source_store_id": stores[i % len(stores)].store_id,
+                "destination_store_id": stores[(i + 1) % len(stores)].store_id,
+                "transfer_date": today - timedelta(days=rng.randrange(30, 400)),
+                "transfer_status": "completed",
+                "approved_by": ids["super"],
+                "completed_date": today - timedelta(days=20),
+            }
+            for i in range(sizes["transfers"])
+        ],
+    )
+    for key, status in (("transfer_approve", "pending"), ("transfer_complete", "approved"), ("transfer_cancel", "pending")):
+        transfer = VehicleTransfer(
+            vehicle_id=ids[f"vehicle_{key}"],
+            source_store_id=ids["store_1"],
+            destination_store_id=ids["store_2"],
+            transfer_date=today,
+            transfer_status=status,
+        )
+        db.session.add(transfer)
+        db.session.flush()
+        ids[key] = transfer.transfer_id
+
+    db.session.commit()
+    for days in (3, 5, 9):
+        ids[f"in_{days}_days"] = (today + timedelta(days=days)).isoformat()
+    ids["today"] = today.isoformat()
+    return ids
+
+
+def _fill(value, ids):
+    """Substitute fixture names in a path or JSON body; a lone "{name}" becomes the raw id."""
+    if isinstance(value, str):
+        match = re.fullmatch(r"\{(\w+)\}", value)
+        if match:
+            return ids[match.group(1)]
+        return value.format(**ids)
+    if isinstance(value, list):
+        return [_fill(v, ids) for v in value]
+    if isinstance(value, dict):
+        return {k: _fill(v, ids) for k, v in value.items()}
+    return value
+
+
+def shape(statement):
+    """Statement text with the select list and expanded IN lists folded, for stable diffs."""
+    statement = " ".join(statement.split())
+    statement = _IN_LIST.sub("(...)", statement)
+    return _SELECT_LIST.sub("SELECT ... FROM ", statement, count=1)
+
+
+def explain(conn, statement, parameters):
+    """
+    Plan of one statement.
+
+    Returns:
+        tuple: (plan lines, names of the tables scanned sequentially)
+    """
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        lines, scans = [], []
+
+        def walk(node, depth):
+            label = node["Node Type"]
+            if "Relation Name" in node:
+                label += f" on {node['Relation Name']}"
+            if "Index Name" in node:
+                label += f" using {node['Index Name']}"
+            lines.append("  " * depth + label)
+            if node["Node Type"] == "Seq Scan":
+                scans.append(node["Relation Name"])
+            for child in node.get("Plans", ()):
+                walk(child, depth + 1)
+
+        walk(plan[0]["Plan"], 0)
+        return lines, scans
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        lines = [row[3] for row in rows]
+        scans = [m.group(1) for m in map(_SQLITE_SCAN.match, lines) if m]
+        return lines, scans
+    return [], []
+
+
+class QueryRecorder:
+    """Collects the statements executed on an engine while recording."""
+
+    def __init__(self):
+        self.statements = []
+        self.recording = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.recording:
+            return
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        # Savepoints are transaction control, not queries
+        if keyword in ("SAVEPOINT", "RELEASE", "ROLLBACK"):
+            return
+        self.statements.append((statement, parameters, executemany))
+
+
+def _case_name(method, path, caller):
+    return f"{method} {path} [{caller or 'anonymous'}]"
+
+
+def _render(result):
+    lines = [f"queries: {result['queries']}"]
+    for statement in result["statements"]:
+        repeats = f" (x{statement['count']})" if statement["count"] > 1 else ""
+        lines.append(f"sql{repeats}: {statement['sql']}")
+        lines.extend(f"    {line}" for line in statement["plan"])
+    return lines
+
+
+def run_audit(app, scale=1, baseline=None):
+    """
+    Seed the (scratch) database, run AUDIT_CASES and compare them with `baseline`.
+
+    Args:
+        app: The Flask application; its database is dropped and recreated
+        scale: Multiplier of SEED_SIZES
+        baseline: Results of an earlier run for the same dialect, by case name
+
+    Returns:
+        tuple: (results by case name, failure messages, unified diff lines)
+    """
+    from backend.app.utils.profiling import PROFILE_HEADER, PROFILE_ID_HEADER
+    from backend.app.utils.revocation import revocation_cache
+    from backend.app.utils.search import search_index
+
+    # Deterministic counts: no rate limiting, no periodic cache refreshes
+    app.config.update(
+        RATELIMIT_ENABLED=False,
+        REVOCATION_SYNC_INTERVAL=10 ** 9,
+        SEARCH_INDEX_TTL=10 ** 9,
+        STORE_INDEX_TTL=10 ** 9,
+    )
+    baseline = baseline or {}
+    db.drop_all()
+    db.create_all()
+    ids = seed(scale)
+
+    large_tables = set()
+    for table in db.metadata.sorted_tables:
+        if db.session.scalar(select(func.count()).select_from(table)) >= LARGE_TABLE_ROWS:
+            large_tables.add(table.name)
+
+    tokens = {
+        role: create_access_token(identity=ids[key])
+        for role, key in (("super", "super"), ("store_admin", "store_admin"), ("user", "alice"),
+                          ("logout", "alice"), ("bob", "bob"))
+    }
+    tokens["user_refresh"] = create_refresh_token(identity=ids["alice"])
+    revocation_cache.clear()
+    revocation_cache.sync(0)
+    search_index.invalidate()
+    db.session.remove()
+
+    client = app.test_client()
+    # One stored profile for the profile endpoints to serve
+    app.config["PROFILE_DIR"] = tempfile.mkdtemp(prefix="query-audit-")
+    response = client.get("/api/health", headers={"Authorization": f"Bearer {tokens['super']}", PROFILE_HEADER: "1"})
+    ids["profile_id"] = response.headers[PROFILE_ID_HEADER]
+
+    recorder = QueryRecorder()
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", recorder)
+    results, failures, diff = {}, [], []
+    try:
+        for method, path, caller, body, budget in AUDIT_CASES:
+            name = _case_name(method, path, caller)
+            headers = {"Authorization": f"Bearer {tokens[caller]}"} if caller else {}
+            recorder.statements = []
+            recorder.recording = True
+            try:
+                response = client.open(_fill(path, ids), method=method, json=_fill(body, ids), headers=headers)
+            finally:
+                recorder.recording = False
+            payload = response.get_json(silent=True) or {}
+            if response.status_code != 200 or payload.get("code", 200) != 200:
+                failures.append(f"{name}: unexpected response {response.status_code} {payload}")
+
+            # Repeats of a statement (N+1 loads) are folded into one entry with a count
+            statements, scans = {}, set()
+            with engine.connect() as conn:
+                for statement, parameters, executemany in recorder.statements:
+                    sql = shape(statement)
+                    if sql in statements:
+                        statements[sql]["count"] += 1
+                        continue
+                    plan = []
+                    keyword = statement.lstrip().split(None, 1)[0].upper()
+                    if not executemany and keyword in ("SELECT", "WITH", "UPDATE", "DELETE"):
+                        plan, scanned = explain(conn, statement, parameters)
+                        scans.update(t for t in scanned if t in large_tables)
+                    statements[sql] = {"sql": sql, "plan": plan, "count": 1}
+            result = {
+                "queries": len(recorder.statements),
+                "budget": budget,
+                "seq_scans": sorted(scans),
+                "statements": list(statements.values()),
+            }
+            results[name] = result
+
+            known_issue = KNOWN_OVER_BUDGET.get(name)
+            if result["queries"] > budget:
+                if known_issue:
+                    result["known_issue"] = known_issue
+                else:
+                    failures.append(f"{name}: {result['queries']} queries, budget {budget}")
+            elif known_issue:
+                failures.append(f"{name}: within budget now; remove it from KNOWN_OVER_BUDGET")
+            accepted = set(baseline.get(name, {}).get("seq_scans", ()))
+            new_scans = sorted(scans - accepted)
+            if new_scans:
+                failures.append(f"{name}: sequential scan of large table(s) {', '.join(new_scans)}")
+            if name in baseline:
+                diff.extend(
+                    difflib.unified_diff(
+                        _render(baseline[name]), _render(result), f"baseline {name}", f"current {name}", lineterm=""
+                    )
+                )
+    finally:
+        event.remove(engine, "before_cursor_execute", recorder)
+
+    for name in KNOWN_OVER_BUDGET.keys() - results.keys():
+        failures.append(f"{name}: listed in KNOWN_OVER_BUDGET but not in AUDIT_CASES")
+
+    adapter = app.url_map.bind("localhost")
+    covered = {
+        adapter.match(_fill(path, ids).split("?")[0], method=method)[0]
+        for method, path, _, _, _ in AUDIT_CASES
+    }
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith("/api") and rule.endpoint not in covered:
+            failures.append(f"{rule.rule}: not covered by AUDIT_CASES")
+    return results, failures, diff
+
+
+def load_baseline(dialect, path=BASELINE_PATH):
+    """Stored results for `dialect`, by case name ({} if none)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get(dialect, {})
+
+
+def save_baseline(dialect, results, path=BASELINE_PATH):
+    """Store `results` as the baseline for `dialect`, keeping other dialects."""
+    stored = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+    stored[dialect] = results
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stored, f, indent=2, sort_keys=True)
+        f.write("\n")
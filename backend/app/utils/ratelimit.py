@@ -0,0 +1,218 @@
+"""
+Rate limiting and load shedding.
+
+Every API request is checked before its handler runs, so rejected requests
+never reach the database:
+
+1. Load shedding: once MAX_IN_FLIGHT_REQUESTS requests are being handled by
+   this process, further requests get an immediate 503.
+2. Rate limiting: a token bucket per client and budget. The client is the JWT
+   identity when a valid token is sent, otherwise the remote address. Budgets
+   come from RATE_LIMITS, looked up by endpoint ("users.login"), then blueprint
+   ("rentals"), then "default".
+
+Buckets live in process memory by default (RATELIMIT_BACKEND = "memory"), so
+each worker enforces its own budget. RATELIMIT_BACKEND = "database" keeps them
+in the rate_limit_buckets table, shared by every worker and host.
+"""
+import re
+import threading
+import time
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from backend.app import db
+from backend.app.models.models import RateLimitBucket
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+_LIMIT_RE = re.compile(r"^\s*(\d+)\s*/\s*(second|minute|hour|day)\s*$")
+
+# Requests that are never limited
+EXEMPT_PATHS = ("/api/health",)
+
+
+def parse_limit(limit):
+    """
+    Parse a budget such as "120/minute".
+
+    Returns:
+        tuple: (capacity, refill rate in tokens per second)
+    """
+    match = _LIMIT_RE.match(limit)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {limit!r}")
+    count, period = int(match.group(1)), match.group(2)
+    return count, count / PERIODS[period]
+
+
+def _refill(tokens, updated_at, capacity, rate, now):
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory."""
+
+    def __init__(self, max_buckets=100000):
+        self.max_buckets = max_buckets
+        # key -> (tokens, updated_at, time the bucket is full again)
+        self._buckets = {}
+        self._prune_above = max_buckets
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        """
+        Take one token from the bucket.
+
+        Returns:
+            float: 0 if the request may proceed, else seconds until a token is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = _refill(tokens, updated_at, capacity, rate, now)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self._prune_above:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key, (_, _, full_at) in list(self._buckets.items()):
+            if full_at <= now:
+                del self._buckets[key]
+        # Scan again only once the live buckets have doubled, so pruning stays
+        # amortized O(1) per request even when most buckets are still in use
+        self._prune_above = max(self.max_buckets, 2 * len(self._buckets))
+
+
+class DatabaseBucketStore:
+    """Token buckets in the rate_limit_buckets table, shared by all workers."""
+
+    def consume(self, key, capacity, rate):
+        now = time.time()
+        table = RateLimitBucket.__table__
+        # Its own short transaction, independent of the request's session
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.tokens, table.c.updated_at)
+                .where(table.c.bucket_key == key)
+                .with_for_update()
+            ).first()
+            if row is None:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(
+                            table.insert().values(bucket_key=key, tokens=capacity - 1, updated_at=now)
+                        )
+                    return 0.0
+                except IntegrityError:
+                    # Another worker created the bucket first
+                    row = conn.execute(
+                        select(table.c.tokens, table.c.updated_at)
+                        .where(table.c.bucket_key == key)
+                        .with_for_update()
+                    ).first()
+
+            tokens = _refill(row.tokens, row.updated_at, capacity, rate, now)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                table.update().where(table.c.bucket_key == key).values(tokens=tokens, updated_at=now)
+            )
+        return wait
+
+
+class InFlightCounter:
+    """Number of requests currently being handled by this process."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self, limit):
+        with self._lock:
+            if limit and self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.count -= 1
+
+
+in_flight = InFlightCounter()
+memory_store = MemoryBucketStore()
+database_store = DatabaseBucketStore()
+
+
+def _client_key():
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except (JWTExtendedException, PyJWTError):
+        # Invalid or expired tokens are keyed by address; the handler rejects them
+        identity = None
+    if identity is not None:
+        return f"user:{identity}"
+    return f"ip:{request.remote_addr}"
+
+
+def _budget(limits):
+    """The (name, limit) pair that applies to the current request."""
+    endpoint = request.endpoint or ""
+    blueprint = request.blueprint or ""
+    for name in (endpoint, blueprint, "default"):
+        if name and name in limits:
+            return name, limits[name]
+    return None, None
+
+
+def _reject(status, msg, retry_after):
+    response = jsonify({"code": status, "msg": msg})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(int(retry_after + 0.999), 1))
+    return response
+
+
+def init_rate_limiting(app):
+    """Register the load shedding and rate limiting hooks on `app`."""
+
+    @app.before_request
+    def shed_and_limit():
+        if request.method == "OPTIONS" or request.path in EXEMPT_PATHS:
+            return None
+        config = current_app.config
+
+        if not in_flight.try_enter(config["MAX_IN_FLIGHT_REQUESTS"]):
+            return _reject(503, "Server is busy, please retry shortly", 1)
+        g.counted_in_flight = True
+
+        if not config["RATELIMIT_ENABLED"]:
+            return None
+        name, limit = _budget(config["RATE_LIMITS"])
+        if limit is None:
+            return None
+        capacity, rate = parse_limit(limit)
+        store = database_store if config["RATELIMIT_BACKEND"] == "database" else memory_store
+        wait = store.consume(f"{name}:{_client_key()}", capacity, rate)
+        if wait > 0:
+            return _reject(429, "Too many requests, please slow down", wait)
+        return None
+
+    @app.teardown_request
+    def leave_in_flight(exc):
+        if g.pop("counted_in_flight", False):
+            in_flight.leave()
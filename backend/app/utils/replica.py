@@ -0,0 +1,215 @@
+"""
+Read replica routing.
+
+When a `replica` bind is configured (REPLICA_DATABASE_URL), handlers marked
+with @read_replica run their SELECTs against the replica. Everything else,
+and every write, uses the primary. A request falls back to the primary when:
+
+- it has already written something (read-after-write within the request)
+- the caller wrote something, or logged in, in the last
+  REPLICA_READ_AFTER_WRITE_SECONDS (read-your-writes across requests)
+- the replica lags more than REPLICA_MAX_LAG_SECONDS behind, or cannot be
+  reached
+
+Reads that decide a write (e.g. the overdue sweep of GET /api/rentals) run
+inside `on_primary()`, so they never act on rows the replica has not caught
+up with.
+
+Without a replica bind every query goes to the primary as before.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = "replica"
+
+# Seconds a measured replica lag is reused before probing again
+LAG_CHECK_INTERVAL = 1.0
+
+
+class RoutingSession(Session):
+    """Session that sends reads of @read_replica requests to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+            and REPLICA_BIND in self._db.engines
+            and use_replica()
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _remember_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _remember_bulk_write(orm_execute_state):
+    # Set-based INSERT / UPDATE / DELETE statements never flush
+    if not orm_execute_state.is_select and has_request_context():
+        g.db_wrote = True
+
+
+class RecentWriters:
+    """Identities that wrote recently, in this process, so their reads stay on the primary."""
+
+    def __init__(self):
+        # identity -> time of its last write, oldest first
+        self._writes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, identity, seconds):
+        """Remember a write by `identity`, and forget writes older than `seconds`."""
+        now = time.monotonic()
+        with self._lock:
+            self._writes[identity] = now
+            self._writes.move_to_end(identity)
+            # Writers that never read again are dropped here, oldest first
+            while self._writes:
+                _, written_at = next(iter(self._writes.items()))
+                if now - written_at < seconds:
+                    break
+                self._writes.popitem(last=False)
+
+    def wrote_within(self, identity, seconds):
+        with self._lock:
+            written_at = self._writes.get(identity)
+            if written_at is None:
+                return False
+            if time.monotonic() - written_at >= seconds:
+                del self._writes[identity]
+                return False
+            return True
+
+
+recent_writers = RecentWriters()
+
+_lag = {"checked_at": None, "seconds": None}
+_lag_lock = threading.Lock()
+
+
+def replica_lag(engine):
+    """
+    Replication lag of the replica in seconds, probed at most once per LAG_CHECK_INTERVAL.
+
+    Only PostgreSQL standbys report their lag; other databases are assumed to be
+    current. Returns None if the replica cannot be reached.
+    """
+    with _lag_lock:
+        checked_at = _lag["checked_at"]
+        if checked_at is not None and time.monotonic() - checked_at < LAG_CHECK_INTERVAL:
+            return _lag["seconds"]
+
+    seconds = 0.0
+    try:
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as conn:
+                # NULL on a primary or a standby that has replayed nothing yet
+                seconds = conn.execute(
+                    text(
+                        "SELECT CASE WHEN pg_is_in_recovery() THEN "
+                        "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                        "ELSE 0 END"
+                    )
+                ).scalar()
+                seconds = float(seconds or 0)
+    except Exception:
+        seconds = None
+
+    with _lag_lock:
+        _lag["checked_at"] = time.monotonic()
+        _lag["seconds"] = seconds
+    return seconds
+
+
+def _current_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def use_replica():
+    """Whether reads in the current request should go to the replica."""
+    if (
+        not has_request_context()
+        or not g.get("read_replica")
+        or g.get("db_wrote")
+        or g.get("on_primary")
+    ):
+        return False
+    decided = g.get("replica_decision")
+    if decided is not None:
+        return decided
+
+    config = current_app.config
+    window = config["REPLICA_READ_AFTER_WRITE_SECONDS"]
+    decision = True
+    identity = _current_identity()
+    if identity is not None:
+        issued_at = get_jwt().get("iat")
+        if recent_writers.wrote_within(identity, window):
+            decision = False
+        elif issued_at is not None and time.time() - issued_at < window:
+            # A user who just logged in (or registered) may not be on the replica yet
+            decision = False
+    if decision:
+        from backend.app import db
+
+        lag = replica_lag(db.engines[REPLICA_BIND])
+        decision = lag is not None and lag <= config["REPLICA_MAX_LAG_SECONDS"]
+
+    # Decide once per request so all of its reads see the same database
+    g.replica_decision = decision
+    return decision
+
+
+@contextmanager
+def on_primary():
+    """Run the block's reads on the primary, e.g. the reads that decide what it writes."""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get("on_primary", False)
+    g.on_primary = True
+    try:
+        yield
+    finally:
+        g.on_primary = previous
+
+
+def read_replica(f):
+    """Let a read-only handler run its queries against the replica, if one is configured."""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_replica = True
+        return f(*args, **kwargs)
+
+    # Read-only handlers are also served on the asyncio read path (async_reads.py)
+    decorated_function.read_only = True
+    return decorated_function
+
+
+def init_replica_routing(app):
+    """Remember which callers wrote, so their next reads stay on the primary."""
+
+    @app.after_request
+    def remember_writer(response):
+        if g.get("db_wrote"):
+            identity = _current_identity()
+            if identity is not None:
+                recent_writers.record(identity, current_app.config["REPLICA_READ_AFTER_WRITE_SECONDS"])
+        return response
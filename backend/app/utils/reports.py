@@ -0,0 +1,149 @@
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, select
+from backend.app import db
+from backend.app.models.models import Vehicle, VehicleType
+from backend.app.utils.archive import rental_history
+from backend.app.utils.sharding import gather
+from backend.app.utils.sql_functions import date_period, days_between
+
+# Rentals that generate revenue; pending and cancelled rentals never do
+BILLABLE_STATUSES = ("active", "extension_requested", "returned")
+# Rentals that are still out and can accrue overdue surcharges
+OUTSTANDING_STATUSES = ("active", "extension_requested")
+
+REPORT_DIMENSIONS = ("store", "type", "period")
+REPORT_MEASURES = ("rentals", "rental_days", "base_amount", "overdue_days", "surcharge")
+
+
+def _merged_rows(parts, keys):
+    """The report rows of each shard, with the groups found in several shards added up."""
+    if len(parts) == 1:
+        return parts[0]
+    merged = {}
+    for part in parts:
+        for row in part:
+            sums = merged.setdefault(tuple(row[key] for key in keys), dict.fromkeys(REPORT_MEASURES, 0))
+            for measure in REPORT_MEASURES:
+                sums[measure] += row[measure] or 0
+    return [{**dict(zip(keys, group)), **merged[group]} for group in sorted(merged)]
+
+
+def revenue_report(
+    start_date=None,
+    end_date=None,
+    group_by=("store", "period"),
+    period="month",
+    store_id=None,
+    surcharge_rate=0.5,
+    today=None,
+):
+    """
+    Aggregate rental revenue in a single GROUP BY query.
+
+    Rental days run from rental_date to expected_return_date (at least one day)
+    and are billed at the vehicle type's daily price. Rentals still out past
+    their expected return date add a surcharge of `surcharge_rate` times the
+    daily price for each overdue day. Returned rentals carry no surcharge,
+    since the actual return date is not recorded.
+
+    Args:
+        start_date: Only include rentals starting on or after this date
+        end_date: Only include rentals starting on or before this date
+        group_by: Any combination of "store", "type" and "period"
+        period: Bucket size for the "period" dimension: day, month or year
+        store_id: Restrict the report to rentals from this store
+        surcharge_rate: Overdue surcharge as a fraction of the daily price
+        today: Reference date for overdue days (defaults to the current UTC date)
+
+    Returns:
+        dict: {"rows": [...], "totals": {...}}
+    """
+    unknown = set(group_by) - set(REPORT_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unsupported group_by: {', '.join(sorted(unknown))}")
+
+    today = today or datetime.utcnow().date()
+    # Reports cover archived rentals as well as the hot table
+    history = rental_history()
+    rentals = history.c
+
+    span = days_between(rentals.rental_date, rentals.expected_return_date)
+    rental_days = case((span < 1, 1), else_=span)
+    overdue_days = case(
+        (
+            and_(
+                rentals.rental_status.in_(OUTSTANDING_STATUSES),
+                rentals.expected_return_date < today,
+            ),
+            days_between(rentals.expected_return_date, literal(today)),
+        ),
+        else_=0,
+    )
+    price = VehicleType.daily_rent_price
+
+    dimensions = []
+    if "store" in group_by:
+        dimensions.append(rentals.rental_store_id.label("store_id"))
+    if "type" in group_by:
+        dimensions.append(VehicleType.type_id.label("type_id"))
+    if "period" in group_by:
+        dimensions.append(date_period(rentals.rental_date, period).label("period"))
+
+    query = (
+        select(
+            *dimensions,
+            func.count(rentals.rental_id).label("rentals"),
+            func.sum(rental_days).label("rental_days"),
+            func.sum(rental_days * price).label("base_amount"),
+            func.sum(overdue_days).label("overdue_days"),
+            func.sum(overdue_days * price * surcharge_rate).label("surcharge"),
+        )
+        .select_from(history)
+        .outerjoin(Vehicle, Vehicle.vehicle_id == rentals.vehicle_id)
+        .join(
+            VehicleType,
+            VehicleType.type_id == func.coalesce(Vehicle.type_id, rentals.vehicle_type_id),
+        )
+        .where(rentals.rental_status.in_(BILLABLE_STATUSES))
+    )
+    if start_date is not None:
+        query = query.where(rentals.rental_date >= start_date)
+    if end_date is not None:
+        query = query.where(rentals.rental_date <= end_date)
+    if store_id is not None:
+        query = query.where(rentals.rental_store_id == store_id)
+    if dimensions:
+        query = query.group_by(*dimensions).order_by(*dimensions)
+
+    rows = []
+    totals = {
+        "rentals": 0,
+        "rental_days": 0,
+        "base_amount": 0.0,
+        "overdue_days": 0,
+        "surcharge": 0.0,
+        "total_amount": 0.0,
+    }
+    parts = gather(lambda: db.session.execute(query).mappings().all())
+    for row in _merged_rows(parts, [dimension.key for dimension in dimensions]):
+        if not row["rentals"]:
+            continue
+        item = {key: row[key] for key in ("store_id", "type_id", "period") if key in row}
+        item.update(
+            {
+                "rentals": row["rentals"],
+                "rental_days": int(row["rental_days"] or 0),
+                "base_amount": round(float(row["base_amount"] or 0), 2),
+                "overdue_days": int(row["overdue_days"] or 0),
+                "surcharge": round(float(row["surcharge"] or 0), 2),
+            }
+        )
+        item["total_amount"] = round(item["base_amount"] + item["surcharge"], 2)
+        rows.append(item)
+        for key in totals:
+            totals[key] += item[key]
+
+    for key in ("base_amount", "surcharge", "total_amount"):
+        totals[key] = round(totals[key], 2)
+
+    return {"rows": rows, "totals": totals}
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, or_, select
+from backend.app import db
+from backend.app.models.models import Rental, Vehicle
+from backend.app.utils.sharding import owned_vehicles
+
+# Rentals that hold their assigned vehicle for their whole period
+HOLDING_STATUSES = ("active", "extension_requested")
+
+# SQLSTATE of an exclusion constraint violation, raised by rentals_vehicle_period_excl
+EXCLUSION_VIOLATION = "23P01"
+
+
+def period_end(start_date, end_date):
+    """
+    Exclusive end of a rental's occupied period [start_date, end).
+
+    A rental occupies its vehicle from the rental date up to (not including)
+    the expected return date, so back-to-back bookings may share a handover
+    day. Same-day rentals still occupy one full day.
+    """
+    return max(end_date, start_date + timedelta(days=1))
+
+
+def overlap_condition(start_date, end_date, today=None):
+    """
+    SQL predicate: the rental's occupied period overlaps [start_date, end_date).
+
+    Uses the (vehicle_id, rental_date, expected_return_date) index. A rental
+    still out past its expected return date keeps its vehicle until it is
+    returned, so it overlaps every window after its start.
+    """
+    today = today or datetime.utcnow().date()
+    # The occupied period [rental_date, max(expected_return_date, rental_date + 1))
+    # ends after start_date iff expected_return_date > start_date or the rental
+    # itself starts on or after start_date
+    return and_(
+        Rental.rental_status.in_(HOLDING_STATUSES),
+        Rental.rental_date < end_date,
+        or_(
+            Rental.expected_return_date > start_date,
+            Rental.rental_date >= start_date,
+            Rental.expected_return_date < today,
+        ),
+    )
+
+
+def find_conflict(vehicle_id, start_date, end_date, exclude_rental_id=None, today=None):
+    """
+    Find a rental holding `vehicle_id` during [start_date, end_date).
+
+    Args:
+        vehicle_id: The vehicle to check
+        start_date: First occupied day
+        end_date: Exclusive end of the occupied period
+        exclude_rental_id: Ignore this rental (e.g. the one being extended)
+
+    Returns:
+        Rental or None: The first conflicting rental, if any
+    """
+    query = Rental.query.filter(
+        Rental.vehicle_id == vehicle_id, overlap_condition(start_date, end_date, today)
+    )
+    if exclude_rental_id is not None:
+        query = query.filter(Rental.rental_id != exclude_rental_id)
+    return query.order_by(Rental.rental_date).first()
+
+
+def is_reservation_conflict(error):
+    """
+    Whether a DBAPIError is a violation of the rentals exclusion constraint.
+
+    pg8000 raises every server error except unique violations as
+    ProgrammingError, so the SQLSTATE is read from the error fields (pg8000)
+    or the error attributes (psycopg) instead of the exception class.
+    """
+    orig = error.orig
+    fields = orig.args[0] if orig.args and isinstance(orig.args[0], dict) else {}
+    sqlstate = fields.get("C") or getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return sqlstate == EXCLUSION_VIOLATION
+
+
+def available_vehicles(start_date, end_date, store_id=None, type_id=None, today=None):
+    """
+    Vehicles with no holding rental overlapping [start_date, end_date).
+
+    Returns:
+        list: Vehicle objects ordered by vehicle_id
+    """
+    busy = exists().where(
+        Rental.vehicle_id == Vehicle.vehicle_id,
+        overlap_condition(start_date, end_date, today),
+    )
+    query = owned_vehicles(select(Vehicle).where(~busy))
+    if store_id is not None:
+        query = query.where(Vehicle.store_id == store_id)
+    if type_id is not None:
+        query = query.where(Vehicle.type_id == type_id)
+    return db.session.scalars(query.order_by(Vehicle.vehicle_id)).all()
+
+
+def stores_with_available_vehicles(start_date, end_date, type_id=None, today=None):
+    """
+    Stores holding at least one vehicle with no holding rental overlapping [start_date, end_date).
+
+    Returns:
+        set: Store ids
+    """
+    busy = exists().where(
+        Rental.vehicle_id == Vehicle.vehicle_id,
+        overlap_condition(start_date, end_date, today),
+    )
+    query = owned_vehicles(select(Vehicle.store_id).where(~busy).distinct())
+    if type_id is not None:
+        query = query.where(Vehicle.type_id == type_id)
+    return set(db.session.scalars(query))
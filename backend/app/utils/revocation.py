@@ -0,0 +1,215 @@
+"""
+Access and refresh token revocation.
+
+A token is revoked when its jti is on the denylist, or when it carries a lower
+"ver" claim than its user's current token version; bumping the version
+revokes every token the user holds. The version is kept on the users row and
+only ever grows, so tokens issued after a bump are not mistaken for older ones
+once that bump's revocation row expires. Revocations live in the token_revocations
+table, shared by all workers and hosts, and are mirrored in an in-process
+cache that every authenticated request checks. The cache pulls new
+revocations at most every REVOCATION_SYNC_INTERVAL seconds, so checking a
+token costs no database round trip. Revocations made by a process apply to it
+as soon as they commit; other processes see them within the sync interval.
+Cache entries are dropped once every token they affect has expired.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+from backend.app import db
+from backend.app.models.models import TokenRevocation, User
+
+VERSION_CLAIM = "ver"
+
+# Each sync re-reads revocations created this many seconds before the previous
+# one, so rows whose transaction committed late are not missed
+SYNC_OVERLAP = 10
+
+
+class RevocationCache:
+    """In-process mirror of the unexpired rows of token_revocations."""
+
+    def __init__(self):
+        self._jtis = {}  # jti -> expires_at
+        self._versions = {}  # user_id -> (token version, expires_at)
+        self._synced_at = None
+        self._high_water = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def apply(self, rows):
+        """Add (jti, user_id, token_version, expires_at) revocations to the cache."""
+        with self._lock:
+            for jti, user_id, token_version, expires_at in rows:
+                if jti is not None:
+                    self._jtis[jti] = max(expires_at, self._jtis.get(jti, expires_at))
+                if token_version is not None:
+                    # Keyed by the integer id; token subjects carry it as a string
+                    user_id = int(user_id)
+                    current = self._versions.get(user_id)
+                    if current is None or token_version >= current[0]:
+                        self._versions[user_id] = (token_version, expires_at)
+
+    def sync(self, interval):
+        """Pull revocations created since the last sync, if `interval` seconds have passed."""
+        synced_at = self._synced_at
+        if synced_at is not None and time.monotonic() - synced_at < interval:
+            return
+        # Only one thread syncs; the others keep using the current entries,
+        # except before the first sync, when there are none to use
+        if not self._sync_lock.acquire(blocking=synced_at is None):
+            return
+        try:
+            if self._synced_at is not synced_at:
+                return
+            started = datetime.utcnow()
+            table = TokenRevocation.__table__
+            query = select(
+                table.c.jti, table.c.user_id, table.c.token_version, table.c.expires_at
+            ).where(table.c.expires_at > started)
+            if self._high_water is not None:
+                query = query.where(
+                    table.c.created_at >= self._high_water - timedelta(seconds=SYNC_OVERLAP)
+                )
+            # Its own connection, independent of the request's session
+            with db.engine.connect() as conn:
+                rows = conn.execute(query).all()
+            self.apply(rows)
+            self._prune(started)
+            self._high_water = started
+            self._synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def _prune(self, now):
+        with self._lock:
+            for jti, expires_at in list(self._jtis.items()):
+                if expires_at <= now:
+                    del self._jtis[jti]
+            for user_id, (_, expires_at) in list(self._versions.items()):
+                if expires_at <= now:
+                    del self._versions[user_id]
+
+    def is_revoked(self, user_id, jti, token_version):
+        with self._lock:
+            if jti in self._jtis:
+                return True
+            current = self._versions.get(int(user_id))
+            return current is not None and token_version < current[0]
+
+    def clear(self):
+        """Forget everything; the next check re-reads all revocations."""
+        with self._sync_lock, self._lock:
+            self._jtis.clear()
+            self._versions.clear()
+            self._synced_at = None
+            self._high_water = None
+
+
+revocation_cache = RevocationCache()
+
+
+def _longest_token_lifetime():
+    config = current_app.config
+    return max(config["JWT_ACCESS_TOKEN_EXPIRES"], config["JWT_REFRESH_TOKEN_EXPIRES"])
+
+
+def current_token_version(user_id):
+    """The version new tokens of `user_id` are issued with (read from the database)."""
+    return db.session.scalar(select(User.token_version).where(User.user_id == user_id)) or 0
+
+
+def _stage(revocation):
+    db.session.add(revocation)
+    db.session.info.setdefault("pending_revocations", []).append(
+        (revocation.jti, revocation.user_id, revocation.token_version, revocation.expires_at)
+    )
+
+
+def revoke_token(jwt_payload):
+    """
+    Revoke a single access or refresh token, in the caller's transaction.
+
+    Args:
+        jwt_payload: The decoded token, e.g. from get_jwt()
+    """
+    _stage(
+        TokenRevocation(
+            jti=jwt_payload["jti"],
+            user_id=jwt_payload["sub"],
+            expires_at=datetime.utcfromtimestamp(jwt_payload["exp"]),
+            created_at=datetime.utcnow(),
+        )
+    )
+
+
+def revoke_user_tokens(user_id):
+    """
+    Revoke every token issued to `user_id` so far, in the caller's transaction.
+
+    Returns:
+        int: The user's new token version
+    """
+    users = User.__table__
+    # One atomic increment, so concurrent revocations never hand out the same version
+    version = db.session.execute(
+        update(users)
+        .where(users.c.user_id == user_id)
+        .values(token_version=users.c.token_version + 1)
+        .returning(users.c.token_version)
+    ).scalar_one()
+    now = datetime.utcnow()
+    _stage(
+        TokenRevocation(
+            user_id=user_id,
+            token_version=version,
+            # Tokens issued before now expire by then at the latest
+            expires_at=now + _longest_token_lifetime(),
+            created_at=now,
+        )
+    )
+    return version
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_revocations(session):
+    pending = session.info.pop("pending_revocations", None)
+    if pending:
+        revocation_cache.apply(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revocations(session):
+    session.info.pop("pending_revocations", None)
+
+
+def purge_expired_revocations():
+    """
+    Delete revocations whose tokens have all expired.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    result = db.session.execute(
+        delete(TokenRevocation).where(TokenRevocation.expires_at <= datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def init_token_revocation(jwt):
+    """Stamp new tokens with their user's token version and reject revoked tokens."""
+
+    @jwt.additional_claims_loader
+    def add_token_version(identity):
+        return {VERSION_CLAIM: current_token_version(identity)}
+
+    @jwt.token_in_blocklist_loader
+    def is_token_revoked(jwt_header, jwt_payload):
+        revocation_cache.sync(current_app.config["REVOCATION_SYNC_INTERVAL"])
+        return revocation_cache.is_revoked(
+            jwt_payload["sub"], jwt_payload["jti"], jwt_payload.get(VERSION_CLAIM, 0)
+        )
@@ -0,0 +1,303 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, delete, func, select
+from backend.app import db
+from backend.app.models.models import Rental, RentalDailyRollup, Vehicle
+from backend.app.utils.archive import rental_history
+from backend.app.utils.sharding import gather
+
+FLOW_COUNTERS = ("new_rentals", "returns", "cancellations")
+GAUGES = ("active_count", "overdue_count")
+ROLLUP_COUNTERS = FLOW_COUNTERS + GAUGES
+
+OUTSTANDING_STATUSES = ("active", "extension_requested")
+
+# Which counter each rental transition bumps, and which store it is booked against
+TRANSITION_COUNTERS = {
+    "created": ("new_rentals", "rental_store_id"),
+    "returned": ("returns", "return_store_id"),
+    "cancelled": ("cancellations", "rental_store_id"),
+}
+
+KEY_COLUMNS = ("day", "store_id", "vehicle_type_id")
+
+
+def _insert_for_dialect():
+    """Return the dialect's INSERT construct if it supports ON CONFLICT upserts."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def _upsert(values, increment):
+    """
+    Insert a rollup row or update the existing one for the same key.
+
+    Args:
+        values: Column values including the day / store_id / vehicle_type_id key
+        increment: Add the counters to the existing row instead of overwriting them
+    """
+    counters = {k: v for k, v in values.items() if k not in KEY_COLUMNS}
+    row_values = {**{k: 0 for k in ROLLUP_COUNTERS}, **values}
+    insert = _insert_for_dialect()
+    if insert is not None:
+        table = RentalDailyRollup.__table__
+        stmt = insert(table).values(**row_values)
+        if increment:
+            updates = {k: table.c[k] + stmt.excluded[k] for k in counters}
+        else:
+            updates = {k: stmt.excluded[k] for k in counters}
+        db.session.execute(stmt.on_conflict_do_update(index_elements=KEY_COLUMNS, set_=updates))
+        return
+
+    row = RentalDailyRollup.query.filter_by(
+        **{k: values[k] for k in KEY_COLUMNS}
+    ).with_for_update().first()
+    if row is None:
+        row = RentalDailyRollup(**row_values)
+        db.session.add(row)
+        return
+    for key, value in counters.items():
+        setattr(row, key, getattr(row, key) + value if increment else value)
+
+
+def _rental_type_id(rental):
+    if rental.vehicle_type_id is not None:
+        return rental.vehicle_type_id
+    return rental.vehicle.type_id if rental.vehicle else None
+
+
+def record_rental_transition(rental, transition, day=None):
+    """
+    Bump today's rollup counter for a rental transition, in the caller's transaction.
+
+    Args:
+        rental: The rental that changed
+        transition: One of created, returned, cancelled
+        day: Day to book the transition on (defaults to the current UTC date)
+    """
+    counter, store_column = TRANSITION_COUNTERS[transition]
+    type_id = _rental_type_id(rental)
+    if type_id is None:
+        return
+    _upsert(
+        {
+            "day": day or datetime.utcnow().date(),
+            "store_id": getattr(rental, store_column),
+            "vehicle_type_id": type_id,
+            counter: 1,
+        },
+        increment=True,
+    )
+
+
+def record_rental_transitions(rentals, transition, day=None):
+    """
+    Bump rollup counters for many rentals making the same transition, one upsert per key.
+
+    Args:
+        rentals: Objects or rows carrying the store columns and the rental's
+            effective vehicle_type_id
+        transition: One of created, returned, cancelled
+        day: Day to book the transitions on (defaults to the current UTC date)
+    """
+    counter, store_column = TRANSITION_COUNTERS[transition]
+    day = day or datetime.utcnow().date()
+    counts = defaultdict(int)
+    for rental in rentals:
+        if rental.vehicle_type_id is not None:
+            counts[(getattr(rental, store_column), rental.vehicle_type_id)] += 1
+    for (store_id, type_id), count in counts.items():
+        _upsert(
+            {"day": day, "store_id": store_id, "vehicle_type_id": type_id, counter: count},
+            increment=True,
+        )
+
+
+def snapshot_gauges(day=None):
+    """
+    Store the current active / overdue rental counts as the gauges for `day`.
+
+    This is the catch-up job: run it at least daily (e.g. from cron via
+    `flask rollup-rentals`) so every day gets a snapshot.
+
+    Returns:
+        int: Number of (store, vehicle type) rows written
+    """
+    day = day or datetime.utcnow().date()
+    type_id = func.coalesce(Rental.vehicle_type_id, Vehicle.type_id)
+    counts = db.session.execute(
+        select(
+            Rental.rental_store_id,
+            type_id,
+            func.count(),
+            func.sum(case((Rental.expected_return_date < day, 1), else_=0)),
+        )
+        .outerjoin(Vehicle, Vehicle.vehicle_id == Rental.vehicle_id)
+        .where(Rental.rental_status.in_(OUTSTANDING_STATUSES), type_id.isnot(None))
+        .group_by(Rental.rental_store_id, type_id)
+    ).all()
+
+    # Reset gauges first so stores with no outstanding rentals drop to zero
+    RentalDailyRollup.query.filter_by(day=day).update(
+        {"active_count": 0, "overdue_count": 0}, synchronize_session=False
+    )
+    for store_id, vehicle_type_id, active, overdue in counts:
+        _upsert(
+            {
+                "day": day,
+                "store_id": store_id,
+                "vehicle_type_id": vehicle_type_id,
+                "active_count": active,
+                "overdue_count": int(overdue or 0),
+            },
+            increment=False,
+        )
+    db.session.commit()
+    return len(counts)
+
+
+def backfill_rollups(start_date, end_date, today=None):
+    """
+    Rebuild the rollups for [start_date, end_date] from the rental history.
+
+    History is reconstructed from what the rentals table records: returns are
+    booked on the expected return date and cancellations on the rental date,
+    and only rentals that are still outstanding count towards past overdue
+    gauges. Run it once to seed history after deploying the rollups. Today's
+    row is maintained incrementally and is never rebuilt.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    today = today or datetime.utcnow().date()
+    end_date = min(end_date, today - timedelta(days=1))
+    if end_date < start_date:
+        return 0
+    ndays = (end_date - start_date).days + 1
+
+    # Archived rentals are part of the history being rebuilt
+    history = rental_history()
+    type_id = func.coalesce(history.c.vehicle_type_id, Vehicle.type_id)
+    rentals = db.session.execute(
+        select(
+            history.c.rental_date,
+            history.c.expected_return_date,
+            history.c.rental_store_id,
+            history.c.return_store_id,
+            history.c.rental_status,
+            type_id,
+        )
+        .outerjoin(Vehicle, Vehicle.vehicle_id == history.c.vehicle_id)
+        .where(
+            type_id.isnot(None),
+            history.c.rental_date <= end_date,
+            # Anything that ended before the window contributes nothing
+            ~and_(
+                history.c.rental_status.notin_(OUTSTANDING_STATUSES),
+                history.c.expected_return_date < start_date,
+                history.c.rental_date < start_date,
+            ),
+        )
+    ).all()
+
+    # One counter array per (store, type) for flows, and difference arrays
+    # for the active / overdue gauges, so each rental costs O(1)
+    counters = defaultdict(lambda: {k: [0] * (ndays + 1) for k in ROLLUP_COUNTERS})
+
+    def index(day):
+        return (day - start_date).days
+
+    def bump(key, counter, day):
+        i = index(day)
+        if 0 <= i < ndays:
+            counters[key][counter][i] += 1
+
+    def span(key, gauge, first_day, last_day):
+        lo, hi = max(index(first_day), 0), min(index(last_day), ndays - 1)
+        if lo <= hi:
+            counters[key][gauge][lo] += 1
+            counters[key][gauge][hi + 1] -= 1
+
+    for rental_date, expected, rental_store_id, return_store_id, status, vehicle_type_id in rentals:
+        key = (rental_store_id, vehicle_type_id)
+        bump(key, "new_rentals", rental_date)
+        if status == "cancelled":
+            bump(key, "cancellations", rental_date)
+        elif status == "returned":
+            bump((return_store_id, vehicle_type_id), "returns", expected)
+            span(key, "active_count", rental_date, expected - timedelta(days=1))
+        elif status in OUTSTANDING_STATUSES:
+            span(key, "active_count", rental_date, today)
+            span(key, "overdue_count", expected + timedelta(days=1), today)
+
+    db.session.execute(
+        delete(RentalDailyRollup).where(
+            RentalDailyRollup.day >= start_date, RentalDailyRollup.day <= end_date
+        )
+    )
+    rows = []
+    for (store_id, vehicle_type_id), arrays in counters.items():
+        for gauge in GAUGES:
+            running = 0
+            for i in range(ndays):
+                running += arrays[gauge][i]
+                arrays[gauge][i] = running
+        for i in range(ndays):
+            values = {k: arrays[k][i] for k in ROLLUP_COUNTERS}
+            if any(values.values()):
+                rows.append(
+                    {
+                        "day": start_date + timedelta(days=i),
+                        "store_id": store_id,
+                        "vehicle_type_id": vehicle_type_id,
+                        **values,
+                    }
+                )
+    if rows:
+        db.session.execute(RentalDailyRollup.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def rental_trend(start_date, end_date, store_id=None, vehicle_type_id=None):
+    """
+    Daily totals for [start_date, end_date] read from the rollup table.
+
+    Days without activity are filled with zeros.
+
+    Returns:
+        list: One dict per day with the rollup counters
+    """
+    query = select(
+        RentalDailyRollup.day,
+        *[func.sum(getattr(RentalDailyRollup, k)).label(k) for k in ROLLUP_COUNTERS],
+    ).where(RentalDailyRollup.day >= start_date, RentalDailyRollup.day <= end_date)
+    if store_id is not None:
+        query = query.where(RentalDailyRollup.store_id == store_id)
+    if vehicle_type_id is not None:
+        query = query.where(RentalDailyRollup.vehicle_type_id == vehicle_type_id)
+    totals = {}
+    for part in gather(lambda: db.session.execute(query.group_by(RentalDailyRollup.day)).all()):
+        for row in part:
+            counters = totals.setdefault(row.day, dict.fromkeys(ROLLUP_COUNTERS, 0))
+            for k in ROLLUP_COUNTERS:
+                counters[k] += int(getattr(row, k) or 0)
+
+    trend = []
+    day = start_date
+    while day <= end_date:
+        row = totals.get(day)
+        trend.append(
+            {
+                "day": day.strftime("%Y-%m-%d"),
+                **(row or dict.fromkeys(ROLLUP_COUNTERS, 0)),
+            }
+        )
+        day += timedelta(days=1)
+    return trend
@@ -0,0 +1,263 @@
+import threading
+import time
+from itertools import chain
+from sqlalchemy import event, false, func, or_, select, true
+from sqlalchemy.orm import Session
+from backend.app import db
+from backend.app.models.models import ArchivedRental, Rental, Store, User, VehicleType
+from backend.app.utils.permissions import is_global_admin, rental_scope
+from backend.app.utils.sharding import RENTAL_TABLES, locate, select_shard, sharding_enabled
+
+SEARCH_KINDS = ("user", "store", "vehicle_type", "rental")
+
+# Text kinds and the columns they are matched on; rentals are matched by id
+SEARCH_FIELDS = {
+    "user": (User, User.user_id, (User.name, User.email, User.phone_number)),
+    "store": (Store, Store.store_id, (Store.store_name, Store.address)),
+    "vehicle_type": (VehicleType, VehicleType.type_id, (VehicleType.brand, VehicleType.model)),
+}
+
+# Shorter queries only match rental ids
+MIN_TEXT_QUERY_LENGTH = 2
+
+
+def text_scope(user, kind):
+    """
+    SQL predicate restricting a text kind to the rows `user` may see.
+
+    Global admins see every user, store admins regular users only, and regular
+    users no users at all. Stores and vehicle types are public.
+    """
+    if kind != "user":
+        return true()
+    if is_global_admin(user):
+        return true()
+    if user.is_admin:
+        return User.is_admin.is_(False)
+    return false()
+
+
+class SearchIndex:
+    """
+    In-process inverted trigram index over the searchable text columns.
+
+    Used when the database has no trigram support (e.g. SQLite). The index is
+    rebuilt lazily on the next search after any indexed row is written in this
+    process, and at least every `ttl` seconds to pick up writes from other
+    processes.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._docs = {}
+        self._postings = {}
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def prime(self, ttl=None):
+        """Build the index now rather than on the first search."""
+        with self._lock:
+            self._ensure_built(ttl)
+
+    def _ensure_built(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        if self._built_at is not None and time.monotonic() - self._built_at < ttl:
+            return
+        docs = {}
+        postings = {}
+        for kind, (model, pk, columns) in SEARCH_FIELDS.items():
+            extra = (User.is_admin,) if model is User else ()
+            for row in db.session.execute(select(pk, *columns, *extra)):
+                values = tuple(value or "" for value in row[1:1 + len(columns)])
+                key = (kind, row[0])
+                lowered = tuple(value.lower() for value in values)
+                docs[key] = (lowered, bool(row[-1]) if extra else False)
+                # Every 3-character substring, so any query substring can be looked up
+                grams = {v[i:i + 3] for v in lowered for i in range(len(v) - 2)}
+                for gram in grams:
+                    postings.setdefault(gram, set()).add(key)
+        self._docs, self._postings = docs, postings
+        self._built_at = time.monotonic()
+
+    def search(self, query, kinds, user, ttl=None):
+        """
+        Rank the documents of `kinds` containing `query` as a substring of any field.
+
+        Returns:
+            list: (score, kind, id) tuples, best match first
+        """
+        needle = query.lower()
+        with self._lock:
+            self._ensure_built(ttl)
+            grams = [needle[i:i + 3] for i in range(len(needle) - 2)]
+            if grams:
+                # Rarest posting list first keeps the intersection small
+                lists = sorted((self._postings.get(g, set()) for g in grams), key=len)
+                candidates = set(lists[0]).intersection(*lists[1:])
+            else:
+                candidates = set(self._docs)
+            docs = {key: self._docs[key] for key in candidates}
+
+        see_admins = is_global_admin(user)
+        see_users = user.is_admin
+        results = []
+        for (kind, pk), (values, is_admin) in docs.items():
+            if kind not in kinds:
+                continue
+            if kind == "user" and (not see_users or (is_admin and not see_admins)):
+                continue
+            # Rank by how much of the best matching field the query covers; cheap
+            # enough to score every candidate and close to trigram similarity
+            score = max(
+                (len(needle) / len(value) for value in values if needle in value),
+                default=0.0,
+            )
+            if score:
+                results.append((score, kind, pk))
+        results.sort(key=lambda r: (-r[0], SEARCH_KINDS.index(r[1]), r[2]))
+        return results
+
+
+search_index = SearchIndex()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_search_index(session, flush_context):
+    indexed = tuple(model for model, _, _ in SEARCH_FIELDS.values())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, indexed):
+            search_index.invalidate()
+            return
+
+
+def _rental_matches(query, user):
+    """Rentals (hot or archived) whose id is exactly `query`, scoped to `user`."""
+    if not query.isdigit():
+        return []
+    rental_id = int(query)
+    if sharding_enabled():
+        shard = locate(RENTAL_TABLES, rental_id)
+        if shard is None:
+            return []
+        # The rest of the request, including loading the match, works in the rental's shard
+        select_shard(shard)
+    for model in (Rental, ArchivedRental):
+        found = db.session.scalar(
+            select(model.rental_id).where(
+                model.rental_id == rental_id, rental_scope(user, "view", model)
+            )
+        )
+        if found is not None:
+            return [(1.0, "rental", found)]
+    return []
+
+
+def _postgres_text_matches(query, kind, user, limit):
+    """Top `limit` matches of one kind using the trigram indexes, plus the match count."""
+    model, pk, columns = SEARCH_FIELDS[kind]
+    match = or_(*[column.icontains(query, autoescape=True) for column in columns])
+    scope = text_scope(user, kind)
+    score = func.greatest(*[func.similarity(column, query) for column in columns])
+
+    total = db.session.scalar(select(func.count()).select_from(model).where(match, scope))
+    rows = db.session.execute(
+        select(pk, score.label("score"))
+        .where(match, scope)
+        .order_by(score.desc(), pk)
+        .limit(limit)
+    ).all()
+    return [(float(row.score or 0), kind, row[0]) for row in rows], total
+
+
+def _load(kind, ids):
+    """Load the objects for one kind, keyed by primary key."""
+    if kind == "rental":
+        loaded = {r.rental_id: r for r in Rental.query.filter(Rental.rental_id.in_(ids))}
+        missing = [i for i in ids if i not in loaded]
+        if missing:
+            for rental in ArchivedRental.query.filter(ArchivedRental.rental_id.in_(missing)):
+                loaded[rental.rental_id] = rental
+        return loaded
+    model, pk, _ = SEARCH_FIELDS[kind]
+    return {getattr(obj, pk.key): obj for obj in model.query.filter(pk.in_(ids))}
+
+
+def _describe(kind, obj):
+    if kind == "user":
+        return obj.name, obj.email
+    if kind == "store":
+        return obj.store_name, obj.address
+    if kind == "vehicle_type":
+        return f"{obj.brand} {obj.model}", f"{obj.daily_rent_price:.2f} / day"
+    return f"Rental #{obj.rental_id}", obj.rental_status
+
+
+def search(query, user, kinds=SEARCH_KINDS, page=1, page_size=10, ttl=None):
+    """
+    Ranked, role-scoped search over users, stores, vehicle types and rental ids.
+
+    On PostgreSQL matching runs in SQL against pg_trgm GIN indexes and is ranked
+    by trigram similarity; other databases use the in-process `search_index`.
+    A numeric query also matches the rental with that id.
+
+    Args:
+        query: Text to look for (case-insensitive substring)
+        user: The current User, for scoping
+        kinds: Which of SEARCH_KINDS to search
+        page: 1-based page number
+        page_size: Results per page
+        ttl: Maximum age in seconds of the in-process index
+
+    Returns:
+        dict: {"items": [...], "total": int, "page": int, "page_size": int}
+    """
+    query = query.strip()
+    limit = page * page_size
+    matches = []
+    total = 0
+
+    if "rental" in kinds:
+        matches.extend(_rental_matches(query, user))
+        total += len(matches)
+
+    text_kinds = [k for k in kinds if k in SEARCH_FIELDS]
+    if len(query) >= MIN_TEXT_QUERY_LENGTH and text_kinds:
+        if db.session.get_bind().dialect.name == "postgresql":
+            for kind in text_kinds:
+                kind_matches, kind_total = _postgres_text_matches(query, kind, user, limit)
+                matches.extend(kind_matches)
+                total += kind_total
+        else:
+            text_matches = search_index.search(query, text_kinds, user, ttl)
+            matches.extend(text_matches)
+            total += len(text_matches)
+
+    matches.sort(key=lambda r: (-r[0], SEARCH_KINDS.index(r[1]), r[2]))
+    page_matches = matches[(page - 1) * page_size:limit]
+
+    by_kind = {}
+    for _, kind, pk in page_matches:
+        by_kind.setdefault(kind, []).append(pk)
+    loaded = {kind: _load(kind, ids) for kind, ids in by_kind.items()}
+
+    items = []
+    for score, kind, pk in page_matches:
+        obj = loaded[kind].get(pk)
+        if obj is None:
+            continue
+        title, subtitle = _describe(kind, obj)
+        items.append(
+            {
+                "kind": kind,
+                "id": pk,
+                "score": round(score, 4),
+                "title": title,
+                "subtitle": subtitle,
+                "data": obj.to_dict(),
+            }
+        )
+    return {"items": items, "total": total, "page": page, "page_size": page_size}
@@ -0,0 +1,98 @@
+"""
+Production server entry point.
+
+`flask serve` runs the app under Gunicorn: a master process pre-forks worker
+processes, each serving requests from a small thread pool. Send the master
+SIGHUP to replace the workers gracefully (in-flight requests finish first) and
+SIGTERM to shut down gracefully.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from backend.app import db
+
+
+def warm_up(app, connections=1):
+    """
+    Do the first-request work up front so early requests are not slow.
+
+    Opens `connections` pooled database connections and primes in-process
+    caches. Called in every worker right after it is forked.
+    """
+    with app.app_context():
+        # Forked workers must not reuse connections inherited from the master
+        db.engine.dispose(close=False)
+        configure_mappers()
+
+        opened = [db.engine.connect() for _ in range(max(connections, 1))]
+        for conn in opened:
+            conn.execute(text("SELECT 1"))
+        for conn in opened:
+            conn.close()
+
+        if db.engine.dialect.name != "postgresql":
+            from backend.app.utils.search import search_index
+
+            search_index.prime(app.config["SEARCH_INDEX_TTL"])
+        db.session.remove()
+
+
+def serve(app, host="127.0.0.1", port=11451, workers=2, threads=4, timeout=30, graceful_timeout=30):
+    """
+    Run `app` under Gunicorn with pre-forked threaded workers (blocks until shutdown).
+
+    Args:
+        app: The Flask application
+        host: Interface to bind
+        port: Port to bind
+        workers: Worker processes
+        threads: Request threads per worker
+        timeout: Seconds before a silent worker is killed and restarted
+        graceful_timeout: Seconds workers get to finish requests on reload / shutdown
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("gunicorn is required for `flask serve` (pip install gunicorn)")
+
+    # Configure mappers once in the master so forked workers inherit them
+    with app.app_context():
+        configure_mappers()
+
+    pool_size = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}).get("pool_size", 5)
+
+    def post_fork(server, worker):
+        warm_up(app, connections=min(threads, pool_size))
+
+    class FlaskApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "timeout": timeout,
+                "graceful_timeout": graceful_timeout,
+                "post_fork": post_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    FlaskApplication().run()
+
+
+def serve_async(host="127.0.0.1", port=11451, workers=2):
+    """
+    Run backend.asgi:app, the API with the asyncio read path, under Uvicorn (blocks until shutdown).
+
+    Each worker process serves the read-only list, search and report endpoints
+    on its event loop and every other request on a SERVER_THREADS thread pool.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("uvicorn is required for `flask serve-async` (pip install -r requirements-async.txt)")
+
+    uvicorn.run("backend.asgi:app", host=host, port=port, workers=workers, lifespan="on")
@@ -0,0 +1,623 @@
+"""
+Store-sharded deployment mode.
+
+When SHARD_DATABASE_URLS names shard databases, the store-scoped tables live
+in the shards instead of the primary database, so one busy region's rentals
+do not slow the others down:
+
+- a vehicle lives in the shard of its store, a rental in the shard of its
+  rental store, a transfer in the shard of its source store, and status
+  events and daily rollups next to the rows they describe
+- STORE_SHARDS maps stores to shards; unlisted stores use the first shard
+- every shard keeps a copy of stores and vehicle_types, so reports and views
+  join them locally; users, jobs and the other tables stay on the primary
+
+A request that names a rental, transfer, vehicle or store (in its URL, or the
+store of the row it creates) works in that row's shard. List, search and
+report endpoints call gather(), which runs their query on each shard in turn
+and merges the results. Completing a transfer to a store in another shard
+copies the vehicle there (move_vehicle); the source shard keeps a copy with
+the new store, so the vehicle's old rentals still show it.
+
+Each shard allocates row ids from its own block of SHARD_ID_BLOCK ids, so ids
+stay unique across shards and point to the shard that created them. Without
+SHARD_DATABASE_URLS nothing here changes how queries are routed.
+"""
+from contextlib import contextmanager
+from flask import current_app, request
+from sqlalchemy import event, func, inspect, or_, select, text
+from sqlalchemy.schema import CreateIndex, CreateTable, MetaData
+from sqlalchemy.sql.util import find_tables
+from backend.app.utils.replica import RoutingSession
+
+SHARD_BIND_PREFIX = "shard:"
+
+# Tables partitioned by store; everything else stays on the primary database
+SHARDED_TABLES = frozenset(
+    {"vehicles", "rentals", "rentals_archive", "vehicle_transfers", "status_events", "rental_daily_rollups"}
+)
+# Small tables copied into every shard so store-scoped queries can join them
+REFERENCE_TABLES = ("stores", "vehicle_types")
+
+# Tables searched when locating a row by the id in a request URL
+RENTAL_TABLES = ("rentals", "rentals_archive")
+TRANSFER_TABLES = ("vehicle_transfers",)
+VEHICLE_TABLES = ("vehicles",)
+ROW_ARGS = {
+    "rental_id": RENTAL_TABLES,
+    "transfer_id": TRANSFER_TABLES,
+    "vehicle_id": VEHICLE_TABLES,
+}
+
+# Body field holding the store whose shard gets the row an endpoint creates
+CREATE_STORE_FIELDS = {
+    "rentals.create_rental": "rental_store_id",
+    "vehicle_transfers.create_transfer": "source_store_id",
+    "vehicles.create_vehicle": "store_id",
+}
+
+# Located rentals and transfers never change shard; remember up to this many
+LOCATION_CACHE_SIZE = 65536
+_locations = {}
+
+
+class ShardNotSelected(RuntimeError):
+    """A store-scoped table was queried by a session that works in no shard."""
+
+
+def _db():
+    return current_app.extensions["sqlalchemy"]
+
+
+def sharding_enabled():
+    return bool(current_app.config["SHARD_DATABASE_URLS"])
+
+
+def shard_names():
+    """Configured shards, in order; the position of a shard decides its id block."""
+    return list(current_app.config["SHARD_DATABASE_URLS"])
+
+
+def shard_bind(name):
+    return f"{SHARD_BIND_PREFIX}{name}"
+
+
+def shard_engine(name):
+    return _db().engines[shard_bind(name)]
+
+
+def default_shard():
+    """The shard of stores missing from STORE_SHARDS (None without sharding)."""
+    names = shard_names()
+    return names[0] if names else None
+
+
+def shard_for_store(store_id):
+    """Name of the shard holding store `store_id`'s data (None without sharding)."""
+    if not sharding_enabled():
+        return None
+    return current_app.config["STORE_SHARDS"].get(store_id, default_shard())
+
+
+def home_shard(row_id):
+    """The shard whose id block contains `row_id`, or the default shard for ids outside every block."""
+    names = shard_names()
+    index = (row_id - 1) // current_app.config["SHARD_ID_BLOCK"] if row_id else 0
+    return names[index] if 0 <= index < len(names) else default_shard()
+
+
+def _table_name(mapper, clause):
+    """The first sharded table `mapper` or `clause` touches, or None."""
+    if mapper is not None:
+        table = getattr(inspect(mapper), "local_table", None)
+        if table is not None and table.name in SHARDED_TABLES:
+            return table.name
+    if clause is not None:
+        for table in find_tables(clause, include_crud=True, include_joins=True, include_aliases=True):
+            if getattr(table, "name", None) in SHARDED_TABLES:
+                return table.name
+    return None
+
+
+class ShardingSession(RoutingSession):
+    """RoutingSession that sends the store-scoped tables to the shard the session works in."""
+
+    def __init__(self, db, shard=None, **kwargs):
+        super().__init__(db, **kwargs)
+        self.shard = shard
+
+    def for_shard(self, name):
+        """A new session like this one, working in shard `name`."""
+        return self._db.session.session_factory(shard=name)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and current_app.config["SHARD_DATABASE_URLS"]:
+            table = _table_name(mapper, clause)
+            if table is not None:
+                if self.shard is None:
+                    raise ShardNotSelected(
+                        f"{table} is sharded by store, but this session works in no shard; "
+                        "use gather() or use_shard()"
+                    )
+                return self._db.engines[shard_bind(self.shard)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def current_shard():
+    """The shard the current session works in (None without sharding)."""
+    return getattr(_db().session(), "shard", None)
+
+
+def select_shard(name):
+    """Make the current session work in shard `name` for the rest of its life."""
+    if sharding_enabled() and name is not None:
+        _db().session().shard = name
+
+
+@contextmanager
+def use_shard(name):
+    """
+    Run the block with the current session working in shard `name`.
+
+    Pending changes are flushed on entry and exit, so each goes to the shard
+    it was made in. Without sharding this does nothing.
+    """
+    if not sharding_enabled():
+        yield
+        return
+    session = _db().session()
+    session.flush()
+    previous = session.shard
+    session.shard = name
+    try:
+        yield
+        session.flush()
+    finally:
+        session.shard = previous
+
+
+def gather(fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) once per shard, each time with db.session working in that shard.
+
+    Each call gets a fresh session, closed afterwards, so fn should return plain
+    values (e.g. to_dict() output) rather than ORM objects. Without sharding fn
+    runs once with the current session.
+
+    Returns:
+        list: The result of each call, in shard order
+    """
+    if not sharding_enabled():
+        return [fn(*args, **kwargs)]
+    db = _db()
+    outer = db.session()
+    results = []
+    for name in shard_names():
+        session = outer.for_shard(name)
+        db.session.registry.set(session)
+        try:
+            results.append(fn(*args, **kwargs))
+        finally:
+            session.close()
+            db.session.registry.set(outer)
+    return results
+
+
+def gather_page(fn, page, page_size, key, reverse=False):
+    """
+    One page of a listing that spans all shards.
+
+    Args:
+        fn: Called as fn(page, page_size) on each shard; returns (items, total)
+        page: 1-based page number
+        page_size: Items per page
+        key: Sort key of the listing, applied to the items
+        reverse: Whether the listing is in descending order
+
+    Returns:
+        tuple: (items, total)
+    """
+    if not sharding_enabled():
+        return fn(page, page_size)
+    # Every shard's first `page` pages together hold the merged page
+    parts = gather(fn, 1, page * page_size)
+    items = sorted((item for part_items, _ in parts for item in part_items), key=key, reverse=reverse)
+    return items[(page - 1) * page_size:page * page_size], sum(total for _, total in parts)
+
+
+def owned_vehicles(query):
+    """
+    `query` restricted to the vehicles homed in the current shard.
+
+    Drops the copies a shard keeps of vehicles transferred to another shard.
+    Unchanged without sharding.
+    """
+    from backend.app.models.models import Vehicle
+
+    shard = current_shard()
+    if shard is None:
+        return query
+    stores = current_app.config["STORE_SHARDS"]
+    if shard == default_shard():
+        elsewhere = [store_id for store_id, name in stores.items() if name != shard]
+        return query.where(or_(Vehicle.store_id.is_(None), Vehicle.store_id.not_in(elsewhere)))
+    return query.where(Vehicle.store_id.in_([store_id for store_id, name in stores.items() if name == shard]))
+
+
+def _owns(name, store_id):
+    return store_id is None or shard_for_store(store_id) == name
+
+
+def locate_many(tables, row_ids):
+    """
+    Find the shard holding each of `row_ids` in one of `tables`.
+
+    Each row's home shard is asked first; rows created before sharding was set
+    up (or moved by `flask shard-migrate`) are found by asking the others.
+    Vehicles count as being in the shard of their store.
+
+    Returns:
+        dict: row id -> shard name, for the rows found
+    """
+    db = _db()
+    located = {}
+    wanted = set(row_ids)
+    cacheable = tables != VEHICLE_TABLES
+    if cacheable:
+        for row_id in list(wanted):
+            name = _locations.get((tables, row_id))
+            if name is not None:
+                located[row_id] = name
+                wanted.discard(row_id)
+    if not wanted:
+        return located
+
+    names = shard_names()
+    hinted = {}
+    for row_id in wanted:
+        hinted.setdefault(home_shard(row_id), set()).add(row_id)
+    outer = db.session()
+    for name in sorted(names, key=lambda n: -len(hinted.get(n, ()))):
+        if not wanted:
+            break
+        session = outer.for_shard(name)
+        try:
+            for table_name in tables:
+                if not wanted:
+                    break
+                table = db.metadata.tables[table_name]
+                pk = table.primary_key.columns.values()[0]
+                if table_name == "vehicles":
+                    rows = session.execute(select(pk, table.c.store_id).where(pk.in_(wanted))).all()
+                    found = [row_id for row_id, store_id in rows if _owns(name, store_id)]
+                else:
+                    found = session.scalars(select(pk).where(pk.in_(wanted))).all()
+                for row_id in found:
+                    located[row_id] = name
+                    wanted.discard(row_id)
+                    if cacheable:
+                        if len(_locations) >= LOCATION_CACHE_SIZE:
+                            _locations.clear()
+                        _locations[(tables, row_id)] = name
+        finally:
+            session.close()
+    return located
+
+
+def locate(tables, row_id):
+    """The shard holding row `row_id` of one of `tables`, or None if there is none."""
+    return locate_many(tables, [row_id]).get(row_id)
+
+
+def group_by_shard(tables, row_ids):
+    """
+    Split `row_ids` by the shard holding them, keeping their order.
+
+    Ids found nowhere go to their home shard, where they will not be found
+    either. Without sharding every id is in the single group None.
+    """
+    if not sharding_enabled():
+        return {None: list(row_ids)}
+    located = locate_many(tables, row_ids)
+    groups = {}
+    for row_id in row_ids:
+        groups.setdefault(located.get(row_id) or home_shard(row_id), []).append(row_id)
+    return groups
+
+
+def _request_shard():
+    """The shard named by the current request's URL or creation body, or None."""
+    for arg, tables in ROW_ARGS.items():
+        row_id = (request.view_args or {}).get(arg)
+        if row_id is not None:
+            return locate(tables, row_id) or home_shard(row_id)
+    store_id = (request.view_args or {}).get("store_id")
+    field = CREATE_STORE_FIELDS.get(request.endpoint)
+    if store_id is None and field is not None:
+        store_id = (request.get_json(silent=True) or {}).get(field)
+    if isinstance(store_id, int) and not isinstance(store_id, bool):
+        return shard_for_store(store_id)
+    return None
+
+
+def move_vehicle(vehicle, store_id):
+    """
+    Put `vehicle` at store `store_id`, copying it into that store's shard first if it is another one.
+
+    The copy is committed before the caller commits the move in the current
+    shard. If the caller's commit fails, both shards claim the vehicle until the
+    move is retried (e.g. the transfer is completed again), which overwrites
+    the copy.
+    """
+    source = shard_for_store(vehicle.store_id)
+    destination = shard_for_store(store_id)
+    if source != destination:
+        mapper = inspect(vehicle).mapper
+        values = {attr.key: getattr(vehicle, attr.key) for attr in mapper.column_attrs}
+        values["store_id"] = store_id
+        with _db().session().for_shard(destination) as session:
+            session.merge(mapper.class_(**values))
+            session.commit()
+    vehicle.store_id = store_id
+
+
+def crosses_shards(store_id, other_store_id):
+    """Whether two stores' data live in different shards."""
+    return shard_for_store(store_id) != shard_for_store(other_store_id)
+
+
+# Shard schemas, reference data and data migration
+
+
+def _allocates_ids(table):
+    """Whether a shard allocates the ids of `table` itself, from its id block."""
+    pk = list(table.primary_key.columns)
+    return len(pk) == 1 and pk[0].autoincrement is not False and table.name not in REFERENCE_TABLES
+
+
+def _shard_tables(metadata):
+    """Copies of the reference and sharded tables for the shards, in dependency order."""
+    db = _db()
+    names = set(REFERENCE_TABLES) | SHARDED_TABLES
+    tables = []
+    for table in db.metadata.sorted_tables:
+        if table.name in names:
+            copy = table.to_metadata(metadata)
+            # AUTOINCREMENT lets SQLite start each shard's ids at its block
+            if _allocates_ids(copy):
+                copy.dialect_options["sqlite"]["autoincrement"] = True
+            tables.append((table, copy))
+    return tables
+
+
+def _reserve_id_block(conn, table, index, offset=0):
+    """
+    Make the next id of `table` at least the first id of shard number `index`'s block.
+
+    `offset` moves that first id further into the block, past ids already taken
+    by rows migrated from the primary.
+    """
+    if not _allocates_ids(table):
+        return
+    pk = list(table.primary_key.columns)[0]
+    floor = max(index * current_app.config["SHARD_ID_BLOCK"] + offset, conn.scalar(select(func.max(pk))) or 0)
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        seq = conn.scalar(text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+        if seq is None:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {"name": table.name, "seq": floor})
+        elif seq < floor:
+            conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :name"),
+                         {"name": table.name, "seq": floor})
+    elif dialect == "postgresql":
+        conn.execute(
+            text(
+                "SELECT setval(pg_get_serial_sequence(:name, :column), "
+                "GREATEST(:next, nextval(pg_get_serial_sequence(:name, :column))), false)"
+            ),
+            {"name": table.name, "column": pk.name, "next": floor + 1},
+        )
+
+
+def create_shard_schemas():
+    """
+    Create the shard tables (without foreign keys) and reserve each shard's id block.
+
+    Tables that already exist are left alone, so this is safe to re-run.
+
+    Returns:
+        list: Names of the shards set up
+    """
+    names = shard_names()
+    for index, name in enumerate(names):
+        metadata = MetaData()
+        with shard_engine(name).begin() as conn:
+            existing = set(inspect(conn).get_table_names())
+            for original, table in _shard_tables(metadata):
+                if table.name not in existing:
+                    # Vehicles move between shards and users stay on the primary, so shards hold no foreign keys
+                    conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+                    for index_ in table.indexes:
+                        conn.execute(CreateIndex(index_))
+                    # Dialect-specific DDL, e.g. the rentals exclusion constraint on PostgreSQL
+                    original.dispatch.after_create(table, conn, checkfirst=False, _ddl_runner=None,
+                                                   _is_metadata_operation=False)
+                _reserve_id_block(conn, table, index)
+    sync_reference_tables()
+    return names
+
+
+def sync_reference_tables():
+    """Copy stores and vehicle types from the primary database into every shard."""
+    db = _db()
+    tables = [db.metadata.tables[name] for name in REFERENCE_TABLES]
+    with db.engine.connect() as conn:
+        rows = {table.name: [dict(row) for row in conn.execute(select(table)).mappings()] for table in tables}
+    for name in shard_names():
+        with shard_engine(name).begin() as conn:
+            for table in tables:
+                conn.execute(table.delete())
+                if rows[table.name]:
+                    conn.execute(table.insert(), rows[table.name])
+
+
+@event.listens_for(ShardingSession, "after_flush")
+def _remember_reference_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None and table.name in REFERENCE_TABLES:
+            session.info["reference_tables_changed"] = True
+            return
+
+
+@event.listens_for(ShardingSession, "after_commit")
+def _sync_reference_changes(session):
+    if session.info.pop("reference_tables_changed", False) and sharding_enabled():
+        sync_reference_tables()
+
+
+@event.listens_for(ShardingSession, "after_rollback")
+def _forget_reference_changes(session):
+    session.info.pop("reference_tables_changed", None)
+
+
+def _migration_stores(tables):
+    """Per sharded table: the store whose shard gets each row, as a column expression."""
+    rentals, archive = tables["rentals"], tables["rentals_archive"]
+    transfers, events = tables["vehicle_transfers"], tables["status_events"]
+    return {
+        "vehicles": tables["vehicles"].c.store_id,
+        "rentals": rentals.c.rental_store_id,
+        "rentals_archive": archive.c.rental_store_id,
+        "vehicle_transfers": transfers.c.source_store_id,
+        "rental_daily_rollups": tables["rental_daily_rollups"].c.store_id,
+        # Events follow the rental or transfer they describe
+        "status_events": func.coalesce(
+            select(rentals.c.rental_store_id)
+            .where(events.c.entity_type == "rental", rentals.c.rental_id == events.c.entity_id)
+            .scalar_subquery(),
+            select(archive.c.rental_store_id)
+            .where(events.c.entity_type == "rental", archive.c.rental_id == events.c.entity_id)
+            .scalar_subquery(),
+            select(transfers.c.source_store_id)
+            .where(events.c.entity_type == "transfer", transfers.c.transfer_id == events.c.entity_id)
+            .scalar_subquery(),
+        ),
+    }
+
+
+def migrate_to_shards(batch_size=1000):
+    """
+    Copy the store-scoped rows of the primary database into the shards.
+
+    For moving an unsharded deployment to sharding: run `flask shard-init`
+    first. Vehicles also get a copy in every shard whose rentals or transfers
+    refer to them. The primary keeps its rows; drop them once the shards are
+    checked. Refuses to run if any shard already holds vehicles or rentals,
+    or if the primary's ids do not fit in one id block.
+
+    Migrated rows keep their primary ids, so they are not in their shard's id
+    block. Afterwards every shard's next id is moved past the primary's
+    largest id, within its block, so that new rows never reuse a migrated id
+    in any shard. On PostgreSQL, inserting explicit ids does not advance the
+    sequences that `shard-init` set.
+
+    Args:
+        batch_size: Rows inserted per statement
+
+    Returns:
+        dict: table -> {shard: rows copied}
+    """
+    db = _db()
+    tables = {name: db.metadata.tables[name] for name in SHARDED_TABLES}
+    names = shard_names()
+    for name in names:
+        with shard_engine(name).connect() as conn:
+            for table_name in ("vehicles", "rentals"):
+                if conn.scalar(select(func.count()).select_from(tables[table_name])):
+                    raise ValueError(f"Shard {name} already holds {table_name}; refusing to migrate")
+
+    # Largest id per table on the primary; archived rentals keep their rental ids
+    largest = {}
+    with db.engine.connect() as conn:
+        for table in tables.values():
+            if _allocates_ids(table):
+                largest[table.name] = conn.scalar(select(func.max(list(table.primary_key.columns)[0]))) or 0
+        archived = conn.scalar(select(func.max(tables["rentals_archive"].c.rental_id))) or 0
+    largest["rentals"] = max(largest["rentals"], archived)
+    block = current_app.config["SHARD_ID_BLOCK"]
+    too_large = sorted(name for name, value in largest.items() if value >= block)
+    if too_large:
+        raise ValueError(
+            f"Ids of {', '.join(too_large)} reach SHARD_ID_BLOCK ({block}); raise it before migrating"
+        )
+
+    stores = _migration_stores(tables)
+    copied = {}
+    for table in db.metadata.sorted_tables:
+        if table.name not in SHARDED_TABLES:
+            continue
+        counts = copied[table.name] = dict.fromkeys(names, 0)
+        batches = {name: [] for name in names}
+
+        def flush(name):
+            if batches[name]:
+                with shard_engine(name).begin() as target:
+                    target.execute(table.insert(), batches[name])
+                counts[name] += len(batches[name])
+                batches[name] = []
+
+        with db.engine.connect() as source:
+            rows = source.execution_options(yield_per=batch_size).execute(
+                select(table, stores[table.name].label("_shard_store_id"))
+            ).mappings()
+            for row in rows:
+                row = dict(row)
+                name = shard_for_store(row.pop("_shard_store_id"))
+                batches[name].append(row)
+                if len(batches[name]) >= batch_size:
+                    flush(name)
+        for name in names:
+            flush(name)
+
+    # Copies of the vehicles that a shard's rentals and transfers refer to
+    vehicles = tables["vehicles"]
+    counts = copied["vehicles"]
+    for name in names:
+        with shard_engine(name).connect() as conn:
+            referenced = set(conn.scalars(select(tables["rentals"].c.vehicle_id)))
+            referenced |= set(conn.scalars(select(tables["rentals_archive"].c.vehicle_id)))
+            referenced |= set(conn.scalars(select(tables["vehicle_transfers"].c.vehicle_id)))
+            referenced -= set(conn.scalars(select(vehicles.c.vehicle_id)))
+        referenced.discard(None)
+        missing = sorted(referenced)
+        for offset in range(0, len(missing), batch_size):
+            with db.engine.connect() as source:
+                rows = [dict(row) for row in source.execute(
+                    select(vehicles).where(vehicles.c.vehicle_id.in_(missing[offset:offset + batch_size]))
+                ).mappings()]
+            with shard_engine(name).begin() as target:
+                target.execute(vehicles.insert(), rows)
+            counts[name] += len(rows)
+
+    # New ids start past every migrated id, each shard still in its own block
+    for index, name in enumerate(names):
+        with shard_engine(name).begin() as conn:
+            for table in tables.values():
+                _reserve_id_block(conn, table, index, offset=largest.get(table.name, 0))
+    return copied
+
+
+def init_sharding(app):
+    """Make each request work in the shard of the row or store it names, if sharding is configured."""
+    shards = app.config["SHARD_DATABASE_URLS"]
+    unknown = set(app.config["STORE_SHARDS"].values()) - set(shards)
+    if unknown:
+        raise ValueError(f"STORE_SHARDS names unknown shards: {', '.join(sorted(unknown))}")
+    if not shards:
+        return
+
+    @app.before_request
+    def select_request_shard():
+        select_shard(_request_shard())
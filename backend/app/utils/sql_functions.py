@@ -0,0 +1,68 @@
+"""
+Portable SQL date helpers.
+
+Reports push their date arithmetic down into the database. PostgreSQL and
+SQLite (used for local testing) spell these operations differently, so each
+helper compiles to the right dialect.
+"""
+from sqlalchemy import Integer, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+PERIOD_FORMATS = {
+    "day": ("YYYY-MM-DD", "%Y-%m-%d"),
+    "month": ("YYYY-MM", "%Y-%m"),
+    "year": ("YYYY", "%Y"),
+}
+
+
+class days_between(FunctionElement):
+    """Whole days from the first date to the second (end - start)."""
+
+    type = Integer()
+    inherit_cache = True
+    name = "days_between"
+
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "(%s - %s)" % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+@compiles(days_between, "sqlite")
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "CAST(julianday(%s) - julianday(%s) AS INTEGER)" % (
+        compiler.process(end, **kw),
+        compiler.process(start, **kw),
+    )
+
+
+class date_period(FunctionElement):
+    """Label a date with its day / month / year bucket, e.g. '2024-05'."""
+
+    type = String()
+    # The period lives outside the SQL clauses, so it is not part of the cache key
+    inherit_cache = False
+    name = "date_period"
+
+    def __init__(self, date, period):
+        if period not in PERIOD_FORMATS:
+            raise ValueError(f"Unsupported period: {period}")
+        self.period = period
+        super().__init__(date)
+
+
+@compiles(date_period)
+def _date_period_default(element, compiler, **kw):
+    (date,) = list(element.clauses)
+    fmt = PERIOD_FORMATS[element.period][0]
+    return "to_char(%s, '%s')" % (compiler.process(date, **kw), fmt)
+
+
+@compiles(date_period, "sqlite")
+def _date_period_sqlite(element, compiler, **kw):
+    (date,) = list(element.clauses)
+    fmt = PERIOD_FORMATS[element.period][1]
+    return "strftime('%s', %s)" % (fmt, compiler.process(date, **kw))
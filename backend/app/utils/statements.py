@@ -0,0 +1,125 @@
+"""
+Prebuilt statements for the lookups that run on almost every request.
+
+Model.query.get() and Session.get() build a new SELECT on each call and
+derive its cache key before SQLAlchemy can reuse the compiled SQL. These
+statements are built once, at import, with bound parameters; their cache key
+is memoized on the statement, so a call only binds values and executes.
+Lookups by primary key first check the session's identity map, as
+Session.get() does, so a row already loaded in the request is not fetched
+again. `flask bench-lookups` compares both paths.
+"""
+from flask import abort
+from sqlalchemy import bindparam, inspect, select
+from backend.app import db
+from backend.app.models.models import Rental, Store, User, Vehicle, VehicleTransfer, VehicleType
+
+USER_BY_ID = select(User).where(User.user_id == bindparam("user_id"))
+VEHICLE_BY_ID = select(Vehicle).where(Vehicle.vehicle_id == bindparam("vehicle_id"))
+STORE_BY_ID = select(Store).where(Store.store_id == bindparam("store_id"))
+VEHICLE_TYPE_BY_ID = select(VehicleType).where(VehicleType.type_id == bindparam("type_id"))
+
+STORE_EXISTS = select(Store.store_id).where(Store.store_id == bindparam("store_id"))
+VEHICLE_TYPE_EXISTS = select(VehicleType.type_id).where(VehicleType.type_id == bindparam("type_id"))
+
+ACTIVE_RENTAL_BY_VEHICLE = (
+    select(Rental)
+    .where(Rental.vehicle_id == bindparam("vehicle_id"), Rental.rental_status == "active")
+    .limit(1)
+)
+# A rental that still holds (or is waiting for) the vehicle
+OUTSTANDING_RENTAL_BY_VEHICLE = (
+    select(Rental)
+    .where(
+        Rental.vehicle_id == bindparam("vehicle_id"),
+        Rental.rental_status.in_(("pending", "active")),
+    )
+    .limit(1)
+)
+PENDING_TRANSFER_BY_VEHICLE = (
+    select(VehicleTransfer)
+    .where(
+        VehicleTransfer.vehicle_id == bindparam("vehicle_id"),
+        VehicleTransfer.transfer_status == "pending",
+    )
+    .limit(1)
+)
+# A transfer that will still move the vehicle
+OPEN_TRANSFER_BY_VEHICLE = (
+    select(VehicleTransfer)
+    .where(
+        VehicleTransfer.vehicle_id == bindparam("vehicle_id"),
+        VehicleTransfer.transfer_status.in_(("pending", "approved")),
+    )
+    .limit(1)
+)
+
+
+def _first(statement, **params):
+    return db.session.scalars(statement, params).first()
+
+
+def _first_or_404(statement, **params):
+    obj = _first(statement, **params)
+    if obj is None:
+        abort(404)
+    return obj
+
+
+def _loaded(model, ident):
+    """The `model` row with primary key `ident` if this session already holds it, current."""
+    try:
+        key = db.session.identity_key(model, int(ident))
+    except (TypeError, ValueError):
+        return None
+    obj = db.session.identity_map.get(key)
+    # Expired rows (e.g. after a commit) and pending deletes go through the statement
+    if obj is None or obj in db.session.deleted or inspect(obj).expired_attributes:
+        return None
+    return obj
+
+
+def load_user_or_404(user_id):
+    return _loaded(User, user_id) or _first_or_404(USER_BY_ID, user_id=user_id)
+
+
+def load_vehicle(vehicle_id):
+    return _loaded(Vehicle, vehicle_id) or _first(VEHICLE_BY_ID, vehicle_id=vehicle_id)
+
+
+def load_vehicle_or_404(vehicle_id):
+    return _loaded(Vehicle, vehicle_id) or _first_or_404(VEHICLE_BY_ID, vehicle_id=vehicle_id)
+
+
+def load_store_or_404(store_id):
+    return _loaded(Store, store_id) or _first_or_404(STORE_BY_ID, store_id=store_id)
+
+
+def load_vehicle_type_or_404(type_id):
+    return _loaded(VehicleType, type_id) or _first_or_404(VEHICLE_TYPE_BY_ID, type_id=type_id)
+
+
+def store_exists(store_id):
+    return _first(STORE_EXISTS, store_id=store_id) is not None
+
+
+def vehicle_type_exists(type_id):
+    return _first(VEHICLE_TYPE_EXISTS, type_id=type_id) is not None
+
+
+def active_rental_for_vehicle(vehicle_id):
+    return _first(ACTIVE_RENTAL_BY_VEHICLE, vehicle_id=vehicle_id)
+
+
+def outstanding_rental_for_vehicle(vehicle_id):
+    """A pending or active rental of the vehicle, or None."""
+    return _first(OUTSTANDING_RENTAL_BY_VEHICLE, vehicle_id=vehicle_id)
+
+
+def pending_transfer_for_vehicle(vehicle_id):
+    return _first(PENDING_TRANSFER_BY_VEHICLE, vehicle_id=vehicle_id)
+
+
+def open_transfer_for_vehicle(vehicle_id):
+    """A pending or approved transfer of the vehicle, or None."""
+    return _first(OPEN_TRANSFER_BY_VEHICLE, vehicle_id=vehicle_id)
@@ -0,0 +1,42 @@
+"""
+Background job handlers.
+
+Handlers run in the worker (`flask worker`) inside the same transaction that
+marks their job done, and may run more than once if a worker dies mid-job, so
+each one must be idempotent.
+"""
+from datetime import datetime
+from backend.app import db
+from backend.app.models.models import Rental, VehicleTransfer
+from backend.app.utils.statements import pending_transfer_for_vehicle
+from backend.app.utils.jobs import task
+from backend.app.utils.sharding import RENTAL_TABLES, locate, sharding_enabled, use_shard
+
+
+@task("create_return_transfer")
+def create_return_transfer(rental_id):
+    """Create the transfer that brings a vehicle returned at another store back home."""
+    # With sharding, the transfer goes to the rental's shard; the job stays on the primary
+    shard = locate(RENTAL_TABLES, rental_id) if sharding_enabled() else None
+    if sharding_enabled() and shard is None:
+        return
+
+    with use_shard(shard):
+        rental = db.session.get(Rental, rental_id)
+        if rental is None or rental.vehicle_id is None:
+            return
+
+        # Check if there's already a pending transfer
+        if pending_transfer_for_vehicle(rental.vehicle_id):
+            return
+
+        db.session.add(
+            VehicleTransfer(
+                vehicle_id=rental.vehicle_id,
+                source_store_id=rental.rental_store_id,
+                destination_store_id=rental.return_store_id,
+                transfer_date=datetime.utcnow().date(),
+                transfer_status="pending",
+                notes=f"Auto-created from rental #{rental.rental_id} return",
+            )
+        )
@@ -0,0 +1,257 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select
+from backend.app import db
+from backend.app.models.models import Vehicle, VehicleTransfer
+from backend.app.utils.archive import rental_history
+from backend.app.utils.sharding import gather, owned_vehicles
+
+# Rentals that occupy a vehicle; pending rentals have no vehicle yet
+OCCUPYING_RENTAL_STATUSES = ("active", "extension_requested", "returned")
+OUTSTANDING_RENTAL_STATUSES = ("active", "extension_requested")
+OPEN_TRANSFER_STATUSES = ("pending", "approved")
+
+UTILIZATION_GROUPS = ("vehicle", "type", "store")
+
+# Event kinds for the sweep line
+RENTAL = 0
+TRANSFER = 1
+
+
+def _day(value):
+    return value.toordinal()
+
+
+def rental_intervals(start_date, end_date, today):
+    """
+    Occupied [start, end) day intervals per vehicle from rentals overlapping the window.
+
+    Archived rentals are included. Returned rentals are assumed to end on their
+    expected return date (the actual return date is not recorded); rentals
+    still out run until today if overdue.
+    """
+    rentals = rental_history().c
+    query = select(
+        rentals.vehicle_id,
+        rentals.rental_date,
+        rentals.expected_return_date,
+        rentals.rental_status,
+    ).where(
+        rentals.vehicle_id.isnot(None),
+        rentals.rental_status.in_(OCCUPYING_RENTAL_STATUSES),
+        rentals.rental_date <= end_date,
+        or_(
+            rentals.expected_return_date >= start_date,
+            rentals.rental_status.in_(OUTSTANDING_RENTAL_STATUSES),
+        ),
+    )
+    intervals = defaultdict(list)
+    for vehicle_id, rental_date, expected_return_date, status in db.session.execute(query):
+        end = expected_return_date
+        if status in OUTSTANDING_RENTAL_STATUSES and end < today:
+            end = today
+        begin = _day(rental_date)
+        intervals[vehicle_id].append((begin, max(_day(end), begin + 1)))
+    return intervals
+
+
+def transfer_intervals(start_date, end_date, today):
+    """In-transfer [start, end) day intervals per vehicle; open transfers run until today."""
+    query = select(
+        VehicleTransfer.vehicle_id,
+        VehicleTransfer.transfer_date,
+        VehicleTransfer.completed_date,
+        VehicleTransfer.transfer_status,
+    ).where(
+        VehicleTransfer.transfer_status.in_(OPEN_TRANSFER_STATUSES + ("completed",)),
+        VehicleTransfer.transfer_date <= end_date,
+        or_(
+            VehicleTransfer.completed_date >= start_date,
+            VehicleTransfer.transfer_status.in_(OPEN_TRANSFER_STATUSES),
+        ),
+    )
+    intervals = defaultdict(list)
+    for vehicle_id, transfer_date, completed_date, status in db.session.execute(query):
+        end = completed_date if status == "completed" and completed_date else today
+        begin = _day(transfer_date)
+        intervals[vehicle_id].append((begin, max(_day(end), begin + 1)))
+    return intervals
+
+
+def _merge_intervals(parts):
+    merged = defaultdict(list)
+    for intervals in parts:
+        for vehicle_id, vehicle_intervals in intervals.items():
+            merged[vehicle_id].extend(vehicle_intervals)
+    return merged
+
+
+def sweep(window_start, window_end, rentals, transfers):
+    """
+    Split the half-open window [window_start, window_end) into rented, in-transfer
+    and idle days with a sweep line over interval endpoints.
+
+    Overlapping intervals of the same kind are counted once; a day that is both
+    rented and in transfer counts as rented.
+
+    Returns:
+        tuple: (rented_days, transfer_days, idle_days)
+    """
+    events = []
+    for kind, intervals in ((RENTAL, rentals), (TRANSFER, transfers)):
+        for begin, end in intervals:
+            begin, end = max(begin, window_start), min(end, window_end)
+            if begin < end:
+                events.append((begin, 1, kind))
+                events.append((end, -1, kind))
+    events.sort()
+
+    active = [0, 0]
+    totals = [0, 0]
+    previous = window_start
+    for day, delta, kind in events:
+        if day > previous:
+            if active[RENTAL]:
+                totals[RENTAL] += day - previous
+            elif active[TRANSFER]:
+                totals[TRANSFER] += day - previous
+            previous = day
+        active[kind] += delta
+
+    window_days = window_end - window_start
+    return totals[RENTAL], totals[TRANSFER], window_days - totals[RENTAL] - totals[TRANSFER]
+
+
+def utilization_report(start_date, end_date, group_by="vehicle", store_id=None, today=None):
+    """
+    Fraction of days vehicles spent rented, in transfer or idle over [start_date, end_date].
+
+    Vehicles are attributed to their type and current store.
+
+    Args:
+        start_date: First day of the window (inclusive)
+        end_date: Last day of the window (inclusive)
+        group_by: vehicle, type or store
+        store_id: Only include vehicles currently at this store
+        today: Reference date for open rentals and transfers
+
+    Returns:
+        dict: {"window_days": int, "rows": [...]}
+    """
+    if group_by not in UTILIZATION_GROUPS:
+        raise ValueError(f"Unsupported group_by: {group_by}")
+    if end_date < start_date:
+        raise ValueError("End date must not be before start date")
+
+    today = today or datetime.utcnow().date()
+    window_start = _day(start_date)
+    window_end = _day(end_date + timedelta(days=1))
+    window_days = window_end - window_start
+
+    query = select(Vehicle.vehicle_id, Vehicle.type_id, Vehicle.store_id)
+    if store_id is not None:
+        query = query.where(Vehicle.store_id == store_id)
+
+    def shard_inputs():
+        return (
+            db.session.execute(owned_vehicles(query).order_by(Vehicle.vehicle_id)).all(),
+            rental_intervals(start_date, end_date, today),
+            transfer_intervals(start_date, end_date, today),
+        )
+
+    # A vehicle transferred between shards has rentals and transfers in each of them
+    parts = gather(shard_inputs)
+    if len(parts) == 1:
+        vehicles, rentals, transfers = parts[0]
+    else:
+        vehicles = sorted((row for part in parts for row in part[0]), key=lambda row: row[0])
+        rentals = _merge_intervals(part[1] for part in parts)
+        transfers = _merge_intervals(part[2] for part in parts)
+
+    groups = {}
+    for vehicle_id, type_id, vehicle_store_id in vehicles:
+        rented, in_transfer, idle = sweep(
+            window_start, window_end, rentals.get(vehicle_id, ()), transfers.get(vehicle_id, ())
+        )
+        key = {"vehicle": vehicle_id, "type": type_id, "store": vehicle_store_id}[group_by]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                f"{group_by}_id": key,
+                "vehicles": 0,
+                "rented_days": 0,
+                "transfer_days": 0,
+                "idle_days": 0,
+            }
+            if group_by == "vehicle":
+                group.update(type_id=type_id, store_id=vehicle_store_id)
+        group["vehicles"] += 1
+        group["rented_days"] += rented
+        group["transfer_days"] += in_transfer
+        group["idle_days"] += idle
+
+    rows = []
+    for group in groups.values():
+        vehicle_days = group["vehicles"] * window_days
+        group["rented_fraction"] = round(group["rented_days"] / vehicle_days, 4)
+        group["transfer_fraction"] = round(group["transfer_days"] / vehicle_days, 4)
+        group["idle_fraction"] = round(group["idle_days"] / vehicle_days, 4)
+        rows.append(group)
+
+    rows.sort(key=lambda row: (row[f"{group_by}_id"] is None, row[f"{group_by}_id"] or 0))
+    return {
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "window_days": window_days,
+        "group_by": group_by,
+        "rows": rows,
+    }
+
+
+class UtilizationCache:
+    """Small in-process TTL cache of utilization reports, keyed by window and grouping."""
+
+    def __init__(self, ttl=300, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop the entry closest to expiry
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+utilization_cache = UtilizationCache()
+
+
+def cached_utilization_report(start_date, end_date, group_by="vehicle", store_id=None, ttl=None):
+    """utilization_report() memoized per (window, grouping, store) for `ttl` seconds."""
+    today = datetime.utcnow().date()
+    key = (start_date, end_date, group_by, store_id, today)
+    report = utilization_cache.get(key)
+    if report is None:
+        report = utilization_report(start_date, end_date, group_by, store_id, today)
+        utilization_cache.set(key, report, ttl)
+    return report
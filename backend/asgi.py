@@ -0,0 +1,9 @@
+"""
+ASGI entry point with the asyncio read path (see app/utils/async_reads.py).
+
+    uvicorn backend.asgi:app --workers 4
+"""
+from backend.run import app as flask_app
+from backend.app.utils.async_reads import AsyncReadApp
+
+app = AsyncReadApp(flask_app)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 from dotenv import load_dotenv
@@ -12,6 +13,78 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'jwt_dev_key_for_development')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Extra charge per overdue day, as a fraction of the vehicle type's daily price
+    OVERDUE_SURCHARGE_RATE = float(os.environ.get('OVERDUE_SURCHARGE_RATE', '0.5'))
+    # Seconds a utilization report stays cached per window
+    UTILIZATION_CACHE_TTL = int(os.environ.get('UTILIZATION_CACHE_TTL', '300'))
+    # Returned / cancelled rentals older than this many days move to the archive table
+    RENTAL_ARCHIVE_AFTER_DAYS = int(os.environ.get('RENTAL_ARCHIVE_AFTER_DAYS', '180'))
+    # Maximum age in seconds of the in-process search index (used when the database has no pg_trgm)
+    SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', '60'))
+    # Maximum age in seconds of the in-process nearest-store index
+    STORE_INDEX_TTL = int(os.environ.get('STORE_INDEX_TTL', '60'))
+    # Background worker: seconds to sleep on an empty queue, and seconds after
+    # which a running job whose worker stopped responding is handed out again
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', '1.0'))
+    JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', '300'))
+    # `flask serve`: worker processes (defaults to 2 x CPUs + 1) and threads per worker
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', str(2 * (os.cpu_count() or 1) + 1)))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '4'))
+    # Optional read replica; read-only list, search and report endpoints query it when set
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    # Optional store sharding: shard databases as comma-separated name=url pairs, and
+    # the shard of each store as store_id=name pairs (unlisted stores use the first shard)
+    SHARD_DATABASE_URLS = dict(p.split('=', 1) for p in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if p)
+    STORE_SHARDS = {int(k): v for k, v in (p.split('=', 1) for p in os.environ.get('STORE_SHARDS', '').split(',') if p)}
+    SQLALCHEMY_BINDS = {**SQLALCHEMY_BINDS, **{f'shard:{name}': url for name, url in SHARD_DATABASE_URLS.items()}}
+    # Row ids per shard; shard i allocates ids above i * SHARD_ID_BLOCK
+    SHARD_ID_BLOCK = int(os.environ.get('SHARD_ID_BLOCK', '100000000'))
+    # Fall back to the primary when the replica lags more than this many seconds
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5'))
+    # Callers that wrote (or logged in) this recently read from the primary
+    REPLICA_READ_AFTER_WRITE_SECONDS = float(os.environ.get('REPLICA_READ_AFTER_WRITE_SECONDS', '5'))
+    # Seconds a response saved for an Idempotency-Key is replayed to retries
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', '86400'))
+    # Optional token-bucket rate limits per client, by endpoint, blueprint or "default"
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'false').lower() == 'true'
+    # "memory" (per worker process) or "database" (shared by all workers)
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'memory')
+    RATE_LIMITS = {
+        'default': '300/minute',
+        'users.login': '10/minute',
+        'users.register': '5/minute',
+        'rentals': '120/minute',
+        'search': '120/minute',
+        'reports': '30/minute',
+    }
+    # Requests handled at once per process before new ones are shed with a 503 (0 disables)
+    MAX_IN_FLIGHT_REQUESTS = int(os.environ.get('MAX_IN_FLIGHT_REQUESTS', '64'))
+    # Most rental ids accepted by one bulk transition request
+    BULK_MAX_RENTALS = int(os.environ.get('BULK_MAX_RENTALS', '500'))
+    # Most users accepted by one bulk provisioning request (use `flask import-users` for more)
+    BULK_MAX_USERS = int(os.environ.get('BULK_MAX_USERS', '1000'))
+    # Processes hashing passwords during bulk provisioning (defaults to the CPU count)
+    PROVISION_HASH_WORKERS = int(os.environ.get('PROVISION_HASH_WORKERS', '0')) or os.cpu_count()
+    # Seconds between syncs of each process's token revocation cache with the database
+    REVOCATION_SYNC_INTERVAL = float(os.environ.get('REVOCATION_SYNC_INTERVAL', '2'))
+    # Fraction of requests profiled at random (0 disables), optionally only these endpoints
+    # (comma-separated, e.g. "rentals.get_rentals,vehicle_transfers.get_transfers");
+    # global admins can also profile a single request with the X-Profile header
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_ENDPOINTS = [e for e in os.environ.get('PROFILE_ENDPOINTS', '').split(',') if e]
+    # Directory of stored request profiles (shared by the workers of a host) and how many are kept
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'car-rental-profiles'))
+    PROFILE_MAX_STORED = int(os.environ.get('PROFILE_MAX_STORED', '200'))
+    # Seconds between call stack samples of a profiled request
+    PROFILE_STACK_INTERVAL = float(os.environ.get('PROFILE_STACK_INTERVAL', '0.005'))
+    # Asyncio read path (`flask serve-async`): database URL of its async engine (derived
+    # from DATABASE_URL when unset, e.g. postgresql+asyncpg), connections pooled per
+    # worker, and the endpoints it serves (comma-separated; defaults to the read-only
+    # list, search and report endpoints)
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', '20'))
+    ASYNC_READ_ENDPOINTS = [e for e in os.environ.get('ASYNC_READ_ENDPOINTS', '').split(',') if e]
 
 class DevelopmentConfig(Config):
     """Development configuration."""
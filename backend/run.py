@@ -1,6 +1,7 @@
 # Fall back to relative import (for direct script execution)
 from .app import create_app, db
 import os
+import click
 
 app = create_app(os.getenv("FLASK_ENV", "development"))
 
@@ -52,6 +53,407 @@ def create_admin():
     db.session.commit()
     print("Admin user created successfully.")
 
+@app.cli.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", "batch_size", type=int, default=1000, help="Users inserted per transaction.")
+@click.option("--workers", "workers", type=int, default=None, help="Password hashing processes (defaults to PROVISION_HASH_WORKERS).")
+def import_users(path, batch_size, workers):
+    """Create regular users from a CSV (with a header row) or JSON list file."""
+    import csv
+    import json
+    import time
+    from .app.utils.provisioning import provision_users
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            records = json.load(f)
+        else:
+            records = list(csv.DictReader(f))
+    workers = workers or app.config["PROVISION_HASH_WORKERS"]
+
+    started = time.perf_counter()
+    created = failed = 0
+    for offset in range(0, len(records), batch_size):
+        result = provision_users(records[offset:offset + batch_size], workers)
+        created += result["created"]
+        failed += result["failed"]
+        for outcome in result["results"]:
+            if outcome["code"] != 200:
+                print(f"Row {offset + outcome['row'] + 1} ({outcome['email']}): {outcome['msg']}")
+        print(
+            f"Batch {offset // batch_size + 1}: {result['created']} created, "
+            f"{result['failed']} failed, {result['users_per_second']} users/s"
+        )
+
+    elapsed = time.perf_counter() - started
+    rate = created / elapsed if elapsed > 0 else 0
+    print(f"Imported {created} users ({failed} failed) in {elapsed:.1f}s, {rate:.1f} users/s.")
+
+
+@app.cli.command("utilization-report")
+@click.option("--start", "start", required=True, help="First day of the window (YYYY-MM-DD).")
+@click.option("--end", "end", required=True, help="Last day of the window (YYYY-MM-DD).")
+@click.option("--group-by", "group_by", default="store", type=click.Choice(["vehicle", "type", "store"]))
+@click.option("--store-id", "store_id", default=None, type=int, help="Only vehicles at this store.")
+def utilization_report_command(start, end, group_by, store_id):
+    """Print fleet utilization over a date window."""
+    from datetime import datetime
+    from .app.utils.utilization import cached_utilization_report
+
+    report = cached_utilization_report(
+        datetime.strptime(start, "%Y-%m-%d").date(),
+        datetime.strptime(end, "%Y-%m-%d").date(),
+        group_by=group_by,
+        store_id=store_id,
+        ttl=app.config["UTILIZATION_CACHE_TTL"],
+    )
+
+    key = f"{group_by}_id"
+    print(f"Utilization {report['start_date']} .. {report['end_date']} ({report['window_days']} days)")
+    print(f"{key:>12} {'vehicles':>8} {'rented':>8} {'transfer':>8} {'idle':>8}")
+    for row in report["rows"]:
+        print(
+            f"{str(row[key]):>12} {row['vehicles']:>8} {row['rented_fraction']:>8.1%} "
+            f"{row['transfer_fraction']:>8.1%} {row['idle_fraction']:>8.1%}"
+        )
+
+@app.cli.command("rollup-rentals")
+@click.option("--day", "day", default=None, help="Day to snapshot (YYYY-MM-DD), defaults to today.")
+def rollup_rentals_command(day):
+    """Snapshot active / overdue rental gauges into the daily rollups."""
+    from datetime import datetime
+    from .app.utils.rollups import snapshot_gauges
+    from .app.utils.sharding import gather
+
+    day = datetime.strptime(day, "%Y-%m-%d").date() if day else None
+    rows = sum(gather(snapshot_gauges, day))
+    print(f"Rollup gauges written for {rows} store/type combinations.")
+
+
+@app.cli.command("backfill-rollups")
+@click.option("--start", "start", required=True, help="First day to rebuild (YYYY-MM-DD).")
+@click.option("--end", "end", default=None, help="Last day to rebuild (YYYY-MM-DD), defaults to yesterday.")
+def backfill_rollups_command(start, end):
+    """Rebuild daily rental rollups from the rentals table."""
+    from datetime import datetime, timedelta
+    from .app.utils.rollups import backfill_rollups
+    from .app.utils.sharding import gather
+
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date() if end else datetime.utcnow().date() - timedelta(days=1)
+    rows = sum(gather(backfill_rollups, start_date, end_date))
+    print(f"Backfilled {rows} rollup rows.")
+
+
+@app.cli.command("archive-rentals")
+@click.option("--older-than-days", "older_than_days", type=int, default=None,
+              help="Archive rentals that started more than this many days ago (defaults to RENTAL_ARCHIVE_AFTER_DAYS).")
+@click.option("--batch-size", "batch_size", type=int, default=1000, help="Rentals moved per transaction.")
+@click.option("--max-batches", "max_batches", type=int, default=None, help="Stop after this many batches.")
+def archive_rentals_command(older_than_days, batch_size, max_batches):
+    """Move old returned / cancelled rentals to the archive table. Safe to re-run."""
+    from datetime import datetime, timedelta
+    from .app.utils.archive import archive_rentals
+    from .app.utils.sharding import gather
+
+    if older_than_days is None:
+        older_than_days = app.config["RENTAL_ARCHIVE_AFTER_DAYS"]
+    cutoff = datetime.utcnow().date() - timedelta(days=older_than_days)
+    # With sharding each shard archives its own rentals; the progress counts restart per shard
+    archived = sum(
+        gather(
+            archive_rentals,
+            cutoff,
+            batch_size=batch_size,
+            max_batches=max_batches,
+            progress=lambda total: print(f"  archived {total} rentals..."),
+        )
+    )
+    print(f"Archived {archived} rentals that started before {cutoff}.")
+
+
+@app.cli.command("shard-init")
+def shard_init_command():
+    """Create the shard tables, copy stores and vehicle types into them and reserve id blocks. Safe to re-run."""
+    from .app.utils.sharding import create_shard_schemas, sharding_enabled
+
+    if not sharding_enabled():
+        raise click.ClickException("No shards are configured; set SHARD_DATABASE_URLS.")
+    names = create_shard_schemas()
+    print(f"Initialized {len(names)} shards: {', '.join(names)}.")
+
+
+@app.cli.command("shard-migrate")
+@click.option("--batch-size", "batch_size", type=int, default=1000, help="Rows inserted per statement.")
+def shard_migrate_command(batch_size):
+    """Copy the vehicles, rentals, transfers, events and rollups of the primary database into the shards."""
+    from .app.utils.sharding import migrate_to_shards, sharding_enabled
+
+    if not sharding_enabled():
+        raise click.ClickException("No shards are configured; set SHARD_DATABASE_URLS.")
+    try:
+        copied = migrate_to_shards(batch_size=batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, counts in copied.items():
+        print(f"{table:>22}: " + ", ".join(f"{name} {rows}" for name, rows in counts.items()))
+
+
+@app.cli.command("worker")
+@click.option("--queue", "queue", default="default", help="Queue to consume.")
+@click.option("--batch-size", "batch_size", type=int, default=10, help="Jobs claimed per round trip.")
+@click.option("--burst", is_flag=True, help="Exit once the queue is empty.")
+def worker_command(queue, batch_size, burst):
+    """Run background jobs from the job queue."""
+    from .app.utils.jobs import work, worker_name
+
+    name = worker_name()
+    print(f"Worker {name} consuming queue '{queue}'.")
+    try:
+        succeeded, failed = work(
+            queue=queue,
+            batch_size=batch_size,
+            poll_interval=app.config["WORKER_POLL_INTERVAL"],
+            lock_timeout=app.config["JOB_LOCK_TIMEOUT"],
+            burst=burst,
+            worker=name,
+        )
+    except KeyboardInterrupt:
+        print("Worker stopped.")
+        return
+    print(f"Queue empty: {succeeded} jobs succeeded, {failed} failed.")
+
+
+@app.cli.command("job-stats")
+@click.option("--queue", "queue", default=None, help="Restrict to one queue.")
+def job_stats_command(queue):
+    """Print job queue depth and latency."""
+    from .app.utils.jobs import queue_stats
+
+    for key, value in queue_stats(queue).items():
+        print(f"{key:<20} {value}")
+
+@app.cli.command("purge-idempotency-keys")
+def purge_idempotency_keys_command():
+    """Delete saved Idempotency-Key responses past their TTL."""
+    from .app.utils.idempotency import purge_expired_keys
+
+    print(f"Purged {purge_expired_keys()} expired idempotency keys.")
+
+
+@app.cli.command("purge-token-revocations")
+def purge_token_revocations_command():
+    """Delete token revocations whose tokens have all expired."""
+    from .app.utils.revocation import purge_expired_revocations
+
+    print(f"Purged {purge_expired_revocations()} expired token revocations.")
+
+
+@app.cli.command("bench-status-encoding")
+@click.option("--rows", "rows", type=int, default=1000000, help="Rows per scratch table.")
+@click.option("--repeats", "repeats", type=int, default=5, help="Timed rounds per query (the median is reported).")
+def bench_status_encoding_command(rows, repeats):
+    """Measure size and filter speed of VARCHAR, enum and smallint status columns."""
+    from .app.utils.benchmarks import bench_status_encoding
+
+    def mb(value):
+        return f"{value / 1048576:.1f} MB" if value is not None else "n/a"
+
+    results = bench_status_encoding(rows=rows, repeats=repeats, progress=print)
+    print(f"{'encoding':<10} {'type':<20} {'table':>10} {'indexes':>10} {'IN filter':>10} {'GROUP BY':>10}")
+    for r in results:
+        print(
+            f"{r['encoding']:<10} {r['column_type'][:20]:<20} {mb(r['table_bytes']):>10} "
+            f"{mb(r['index_bytes']):>10} {r['selective_filter_seconds'] * 1000:>8.1f}ms "
+            f"{r['full_scan_seconds'] * 1000:>8.1f}ms"
+        )
+    if "enum" not in {r["encoding"] for r in results}:
+        print(f"enum: not measured; {db.engine.dialect.name} stores it as VARCHAR with a CHECK, like varchar")
+
+
+@app.cli.command("bench-lookups")
+@click.option("--iterations", "iterations", type=int, default=2000, help="Calls per lookup and path.")
+def bench_lookups_command(iterations):
+    """Compare legacy Model.query lookups with the prebuilt statements (read only)."""
+    import warnings
+    from sqlalchemy.exc import LegacyAPIWarning
+    from .app.utils.benchmarks import bench_lookups
+
+    warnings.simplefilter("ignore", LegacyAPIWarning)
+    try:
+        results = bench_lookups(iterations)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"{'lookup':<32} {'legacy':>10} {'prebuilt':>10} {'legacy py':>10} {'prebuilt py':>12} {'saved':>7}")
+    for r in results:
+        saved = 1 - r["prebuilt_python_us"] / r["legacy_python_us"]
+        print(
+            f"{r['lookup']:<32} {r['legacy_us']:>8.1f}us {r['prebuilt_us']:>8.1f}us "
+            f"{r['legacy_python_us']:>8.1f}us {r['prebuilt_python_us']:>10.1f}us {saved:>7.0%}"
+        )
+    legacy = sum(r["legacy_python_us"] for r in results)
+    prebuilt = sum(r["prebuilt_python_us"] for r in results)
+    print(f"Python overhead of one call to each lookup: {legacy:.0f}us -> {prebuilt:.0f}us.")
+
+
+@app.cli.command("bench-async-reads")
+@click.option("--sync-url", "sync_url", default="http://127.0.0.1:11451", help="Server started with `flask serve`.")
+@click.option("--async-url", "async_url", default="http://127.0.0.1:11452", help="Server started with `flask serve-async`.")
+@click.option("--path", "paths", multiple=True, help="Endpoint to request (repeatable; defaults to the heavy reads).")
+@click.option("--concurrency", "concurrency", type=int, default=32, help="Requests in flight at once.")
+@click.option("--requests", "requests", type=int, default=500, help="Requests sent to each server.")
+def bench_async_reads_command(sync_url, async_url, paths, concurrency, requests):
+    """Compare many concurrent list / report reads against the sync and the asyncio server."""
+    from .app.utils.benchmarks import bench_concurrent_reads, global_admin_token
+
+    try:
+        token = global_admin_token()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.remove()
+    paths = list(paths) or [
+        "/api/rentals",
+        "/api/transfers",
+        "/api/reports/revenue",
+        "/api/reports/rental-trend",
+        "/api/search?q=a",
+    ]
+    print(f"{requests} requests, {concurrency} at a time, over {len(paths)} endpoint(s).")
+    print(f"{'server':<8} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} {'rejected':>9}")
+    for name, url in (("sync", sync_url), ("async", async_url)):
+        row = bench_concurrent_reads(url, paths, token, concurrency, requests)["overall"]
+        print(
+            f"{name:<8} {row['throughput_rps'] or 0:>8.1f} {row['p50_ms'] or 0:>7.1f}ms {row['p95_ms'] or 0:>7.1f}ms "
+            f"{row['p99_ms'] or 0:>7.1f}ms {row['error_rate']:>7.1%} {row['rejected_rate'] + row['throttled_rate']:>9.1%}"
+        )
+
+
+@app.cli.command("query-audit")
+@click.option("--baseline", "baseline_path", default=None, help="Baseline file (defaults to backend/query_baseline.json).")
+@click.option("--update-baseline", "update", is_flag=True, help="Accept the current plans and counts as the baseline.")
+@click.option("--scale", "scale", type=int, default=1, help="Multiplier of the seeded data volume.")
+def query_audit_command(baseline_path, update, scale):
+    """Check every route's query count and plans against budgets and the baseline (drops all tables)."""
+    from .app.utils.query_audit import BASELINE_PATH, load_baseline, run_audit, save_baseline
+
+    if not app.config.get("TESTING"):
+        raise click.ClickException("query-audit recreates the schema; run it with FLASK_ENV=testing.")
+    baseline_path = baseline_path or BASELINE_PATH
+    dialect = db.engine.dialect.name
+    results, failures, diff = run_audit(app, scale=scale, baseline=load_baseline(dialect, baseline_path))
+    for line in diff:
+        print(line)
+    for name, result in results.items():
+        known_issue = f" (known: {result['known_issue']})" if "known_issue" in result else ""
+        print(f"{result['queries']:>3}/{result['budget']:<3} {name}{known_issue}")
+    if update:
+        save_baseline(dialect, results, baseline_path)
+        print(f"Saved {dialect} baseline to {baseline_path}.")
+    if failures:
+        print(f"{len(failures)} problem(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        if not update:
+            raise SystemExit(1)
+
+
+@app.cli.command("load-sim")
+@click.option("--url", "url", default="http://127.0.0.1:11451", help="Root URL of the running server.")
+@click.option("--users", "users", type=int, default=20, help="Concurrent virtual users.")
+@click.option("--duration", "duration", type=int, default=300, help="Seconds to run.")
+@click.option("--mix", "mix", default=None, help="Workflow weights, e.g. book=40,approve=20,return=15,extend=15,transfer=10.")
+@click.option("--stores", "stores", type=int, default=4, help="Stores (those with the most vehicles) to send traffic to.")
+@click.option("--customers", "customers", type=int, default=None, help="Customer accounts (defaults to --users).")
+@click.option("--think-time", "think_time", type=float, default=0.5, help="Mean seconds between a user's workflows.")
+@click.option("--sweep-interval", "sweep_interval", type=int, default=30, help="Seconds between overdue sweeps (0 disables).")
+@click.option("--report-interval", "report_interval", type=int, default=10, help="Seconds between progress lines.")
+@click.option("--pid", "pid", type=int, default=None, help="Server process whose memory (with its workers) is sampled.")
+@click.option("--seed", "seed", type=int, default=0, help="Random seed of the users' choices.")
+@click.option("--output", "output", default=None, help="Write the full results, with the timeline, to this JSON file.")
+def load_sim_command(url, users, duration, mix, stores, customers, think_time, sweep_interval, report_interval,
+                     pid, seed, output):
+    """Replay a mix of rental workflows against a running server and report throughput, latency and errors."""
+    import json
+    from .app.utils.loadsim import parse_mix, prepare_accounts, simulate
+
+    try:
+        mix = parse_mix(mix) if mix else None
+        fixtures = prepare_accounts(customers or users, stores)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.remove()
+
+    print(f"{users} users against {url} for {duration}s, stores {', '.join(map(str, fixtures['stores']))}.")
+    result = simulate(
+        url,
+        fixtures,
+        users=users,
+        duration=duration,
+        mix=mix,
+        think_time=think_time,
+        sweep_interval=sweep_interval,
+        report_interval=report_interval,
+        pid=pid,
+        seed=seed,
+        progress=print,
+    )
+
+    print(f"{'endpoint':<42} {'requests':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'conflict':>8} {'rejected':>8} {'error':>8}")
+    for label, row in [*result["endpoints"].items(), ("overall", result["overall"])]:
+        print(
+            f"{label:<42} {row['requests']:>8} {row['p50_ms'] or 0:>6.1f}ms {row['p95_ms'] or 0:>6.1f}ms "
+            f"{row['p99_ms'] or 0:>6.1f}ms {row['conflict_rate']:>8.1%} {row['rejected_rate']:>8.1%} "
+            f"{row['error_rate']:>8.1%}"
+        )
+    for label, row in result["endpoints"].items():
+        for message, count in row["messages"].items():
+            print(f"  {label}: {count} x {message}")
+    print(f"Throughput {result['overall']['throughput_rps']} req/s, {result['overall']['throttled_rate']:.1%} throttled.")
+    if "rss" in result:
+        rss = result["rss"]
+        growth = rss["growth_bytes_per_hour"]
+        print(
+            f"Server RSS {rss['start_bytes'] / 1048576:.0f}MB -> {rss['end_bytes'] / 1048576:.0f}MB "
+            f"(peak {rss['peak_bytes'] / 1048576:.0f}MB"
+            + (f", {growth / 1048576:+.1f}MB/h over the second half)" if growth is not None else ")")
+        )
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {output}.")
+
+
+@app.cli.command("serve")
+@click.option("--host", "host", default="127.0.0.1", help="Interface to bind.")
+@click.option("--port", "port", type=int, default=11451, help="Port to bind.")
+@click.option("--workers", "workers", type=int, default=None, help="Worker processes (defaults to SERVER_WORKERS).")
+@click.option("--threads", "threads", type=int, default=None, help="Threads per worker (defaults to SERVER_THREADS).")
+@click.option("--timeout", "timeout", type=int, default=30, help="Seconds before a stuck worker is restarted.")
+def serve_command(host, port, workers, threads, timeout):
+    """Run the API under a pre-forking multi-worker server (HUP reloads, TERM stops gracefully)."""
+    from .app.utils.server import serve
+
+    serve(
+        app,
+        host=host,
+        port=port,
+        workers=workers or app.config["SERVER_WORKERS"],
+        threads=threads or app.config["SERVER_THREADS"],
+        timeout=timeout,
+    )
+
+
+@app.cli.command("serve-async")
+@click.option("--host", "host", default="127.0.0.1", help="Interface to bind.")
+@click.option("--port", "port", type=int, default=11451, help="Port to bind.")
+@click.option("--workers", "workers", type=int, default=None, help="Worker processes (defaults to SERVER_WORKERS).")
+def serve_async_command(host, port, workers):
+    """Run the API under Uvicorn, serving the list, search and report endpoints on asyncio (experimental)."""
+    from .app.utils.server import serve_async
+
+    serve_async(host=host, port=port, workers=workers or app.config["SERVER_WORKERS"])
+
+
 def main():
     """Run the application or perform database operations based on command-line arguments."""
     import sys
@@ -27,6 +27,13 @@ export function fetchUpdateToken(data: any) {
   return method
 }
 
+/**
+ * 注销当前令牌 (传入刷新令牌时注销刷新令牌)
+ */
+export function fetchLogout() {
+  return request.Post<Service.ResponseResult<null>>('/users/logout')
+}
+
 export function fetchRegister(data: Iregister) {
   const methodInstance = request.Post<Service.ResponseResult<Api.Login.Info>>('/users/register', data)
   methodInstance.meta = {
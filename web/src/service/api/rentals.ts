@@ -6,6 +6,7 @@ interface ICreateRentalData {
   expected_return_date: string // YYYY-MM-DD
   return_store_id: number
   vehicle_type_id: number // 新增：用户期望的车辆类型ID
+  rental_date?: string // 可选：预订开始日期 YYYY-MM-DD，默认当天
 }
 
 /**
@@ -15,6 +16,22 @@ export function fetchGetRentals() {
   return request.Get<Service.ResponseResult<Entity.Rental[]>>('/rentals')
 }
 
+/** 历史租借单分页结果 (包含已归档的租借单) */
+export interface IRentalHistoryPage {
+  items: (Entity.Rental & { archived?: boolean })[]
+  total: number
+  page: number
+  page_size: number
+}
+
+/**
+ * 分页获取历史租借单 (包含已归档的租借单，按租借日期倒序)
+ * @param params - 分页参数
+ */
+export function fetchGetRentalHistory(params: { page?: number, page_size?: number } = {}) {
+  return request.Get<Service.ResponseResult<IRentalHistoryPage>>('/rentals/history', { params })
+}
+
 /**
  * 根据ID获取特定租借单详情
  * @param rentalId - 租借单ID
@@ -82,3 +99,51 @@ export function fetchRejectExtension(rentalId: number, originalReturnDate: strin
 export function fetchCancelRental(rentalId: number) {
   return request.Put<Service.ResponseResult<Entity.Rental>>(`/rentals/${rentalId}/cancel`)
 }
+
+/** 批量操作中单个租借单的处理结果 */
+export interface IBulkRentalResult {
+  rental_id: number
+  code: number
+  msg: string
+  rental_status?: string
+}
+
+/** 批量操作的汇总结果 */
+export interface IBulkRentalResponse {
+  results: IBulkRentalResult[]
+  succeeded: number
+  failed: number
+  transfer_ids: number[] // 跨门店归还自动创建的调拨单ID
+}
+
+/**
+ * 批量标记租借单为已归还
+ * @param rentalIds - 租借单ID列表
+ */
+export function fetchBulkReturnRentals(rentalIds: number[]) {
+  return request.Put<Service.ResponseResult<IBulkRentalResponse>>('/rentals/bulk/return', { rental_ids: rentalIds })
+}
+
+/**
+ * 批量取消租借单
+ * @param rentalIds - 租借单ID列表
+ */
+export function fetchBulkCancelRentals(rentalIds: number[]) {
+  return request.Put<Service.ResponseResult<IBulkRentalResponse>>('/rentals/bulk/cancel', { rental_ids: rentalIds })
+}
+
+/**
+ * 批量批准延长租借请求 (管理员操作)
+ * @param rentalIds - 租借单ID列表
+ */
+export function fetchBulkApproveExtensions(rentalIds: number[]) {
+  return request.Put<Service.ResponseResult<IBulkRentalResponse>>('/rentals/bulk/approve-extension', { rental_ids: rentalIds })
+}
+
+/**
+ * 批量拒绝延长租借请求 (管理员操作)
+ * @param items - 租借单ID及其原始归还日期 (YYYY-MM-DD)
+ */
+export function fetchBulkRejectExtensions(items: { rental_id: number, original_return_date: string }[]) {
+  return request.Put<Service.ResponseResult<IBulkRentalResponse>>('/rentals/bulk/reject-extension', { items })
+}
@@ -0,0 +1,19 @@
+import { request } from '../http'
+
+/** 每日租赁汇总（来自后端预聚合的日汇总表） */
+export interface IRentalTrendPoint {
+  day: string // YYYY-MM-DD
+  new_rentals: number
+  returns: number
+  cancellations: number
+  active_count: number
+  overdue_count: number
+}
+
+/**
+ * 获取每日租赁趋势 (管理员)
+ * @param params - 起止日期 (YYYY-MM-DD)，默认最近7日
+ */
+export function fetchGetRentalTrend(params: { start?: string, end?: string } = {}) {
+  return request.Get<Service.ResponseResult<IRentalTrendPoint[]>>('/reports/rental-trend', { params })
+}
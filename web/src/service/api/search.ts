@@ -0,0 +1,30 @@
+import { request } from '../http'
+
+/** 搜索结果类型 */
+export type SearchKind = 'user' | 'store' | 'vehicle_type' | 'rental'
+
+/** 单条搜索结果 */
+export interface ISearchItem {
+  kind: SearchKind
+  id: number
+  score: number
+  title: string
+  subtitle: string
+  data: Record<string, any>
+}
+
+/** 搜索结果分页 */
+export interface ISearchPage {
+  items: ISearchItem[]
+  total: number
+  page: number
+  page_size: number
+}
+
+/**
+ * 服务端搜索用户、门店、车型及租借单号 (结果按相关度排序，并按当前角色过滤)
+ * @param params - 关键字、限定类型 (逗号分隔) 及分页参数
+ */
+export function fetchSearch(params: { q: string, kinds?: string, page?: number, page_size?: number }) {
+  return request.Get<Service.ResponseResult<ISearchPage>>('/search', { params })
+}
@@ -4,6 +4,18 @@ interface IStore {
   store_name: string
   address: string
   phone_number: string
+  latitude?: number | null
+  longitude?: number | null
+}
+
+/** 附近门店查询参数 */
+interface INearbyStoresParams {
+  lat: number
+  lon: number
+  k?: number // 返回的门店数量，默认 5
+  type_id?: number // 仅返回有该类型空闲车辆的门店
+  start?: string // YYYY-MM-DD，默认当天
+  end?: string // YYYY-MM-DD
 }
 
 export function fetchGetStores() {
@@ -26,3 +38,11 @@ export function fetchDeleteStore(id: string) {
   const methodInstance = request.Delete<Service.ResponseResult<Entity.Store>>(`/stores/${id}`)
   return methodInstance
 }
+
+/**
+ * 查询距离指定坐标最近的门店
+ * @param params - 坐标及可选的车辆类型过滤
+ */
+export function fetchGetNearbyStores(params: INearbyStoresParams) {
+  return request.Get<Service.ResponseResult<(Entity.Store & { distance_km: number })[]>>('/stores/nearby', { params })
+}
@@ -24,3 +24,29 @@ export function fetchUpdateUser(userId: number, data: Partial<Pick<Entity.User,
 export function fetchUpdateUserPermissions(userId: number, data: { is_admin: boolean, managed_store_id?: number | null }) {
   return request.Put<Service.ResponseResult<Entity.User>>(`/users/${userId}/permissions`, data)
 }
+
+/** 批量创建用户时单个用户的数据 */
+export interface IBulkUserData {
+  name: string
+  email: string
+  password: string
+  address: string
+  phone_number: string
+}
+
+/** 批量创建用户的结果 */
+export interface IBulkUserResponse {
+  results: { row: number, email: string | null, code: number, msg: string, user_id?: number }[]
+  created: number
+  failed: number
+  elapsed_seconds: number
+  users_per_second: number | null
+}
+
+/**
+ * 批量创建普通用户 (全局管理员操作)
+ * @param users - 用户数据列表
+ */
+export function fetchBulkCreateUsers(users: IBulkUserData[]) {
+  return request.Post<Service.ResponseResult<IBulkUserResponse>>('/users/bulk', { users })
+}
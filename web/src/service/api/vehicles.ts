@@ -26,3 +26,26 @@ export function fetchDeleteVehicle(id: number) {
   const methodInstance = request.Delete<Service.ResponseResult<null>>(`/vehicles/${id}`)
   return methodInstance
 }
+
+/** 车辆实例页面的聚合数据：分页车辆（含派生状态）以及类型、门店查找表 */
+export interface IVehicleInstanceView {
+  items: Entity.Vehicle[]
+  total: number
+  page: number
+  page_size: number
+  vehicle_types: Entity.VehicleType[]
+  stores: Entity.Store[]
+}
+
+export interface IVehicleInstanceViewQuery {
+  page?: number
+  page_size?: number
+  brand?: string
+  model?: string
+}
+
+export function fetchGetVehicleInstanceView(params: IVehicleInstanceViewQuery = {}) {
+  const methodInstance
+    = request.Get<Service.ResponseResult<IVehicleInstanceView>>('/views/vehicle-instances', { params })
+  return methodInstance
+}
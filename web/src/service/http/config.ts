@@ -22,6 +22,7 @@ export const ERROR_STATUS = {
   404: $t('http.404'),
   405: $t('http.405'),
   408: $t('http.408'),
+  429: $t('http.429'),
   500: $t('http.500'),
   501: $t('http.501'),
   502: $t('http.502'),
@@ -1,5 +1,5 @@
 import { defineStore } from 'pinia'
-import { fetchCreateVehicle, fetchDeleteVehicle, fetchGetVehicles, fetchUpdateVehicle } from '@/service/api/vehicles'
+import { fetchCreateVehicle, fetchDeleteVehicle, fetchGetVehicleInstanceView, fetchGetVehicles, fetchUpdateVehicle } from '@/service/api/vehicles'
 import { fetchGetVehicleTypes } from '@/service/api/vehicle_type'
 import type { SelectOption } from 'naive-ui'
 import { useStoreModule } from '../storeModule' // 引入门店模块
@@ -17,6 +17,10 @@ interface VehicleInstanceState {
   isLoadingTypes: boolean
   storeOptions: SelectOption[] // 新增：门店选项
   isLoadingStores: boolean // 新增：加载门店状态
+  pageItems: Entity.Vehicle[] // 车辆实例页面当前页（含后端派生的状态）
+  page: number // 服务端分页：当前页
+  pageSize: number // 服务端分页：每页条数
+  total: number // 服务端分页：符合条件的车辆总数
 }
 
 const initialFilterModel = {
@@ -35,9 +39,14 @@ export const useVehicleInstanceStore = defineStore('vehicle-instance', {
     isLoadingTypes: false,
     storeOptions: [], // 初始化门店选项
     isLoadingStores: false, // 初始化加载门店状态
+    pageItems: [],
+    page: 1,
+    pageSize: 10,
+    total: 0,
   }),
   actions: {
     async fetchVehicles() {
+      // 完整车辆列表：供仪表盘、饼图和租赁审批选项使用，由这些使用方自行拉取
       this.loading = true
       try {
         const res: any = await fetchGetVehicles()
@@ -59,6 +68,47 @@ export const useVehicleInstanceStore = defineStore('vehicle-instance', {
         this.loading = false
       }
     },
+    async fetchInstancePage() {
+      // 车辆实例页面：一次请求获取分页车辆（含派生状态）及车辆类型、门店查找表
+      this.loading = true
+      try {
+        const res: any = await fetchGetVehicleInstanceView({
+          page: this.page,
+          page_size: this.pageSize,
+          brand: this.filterModel.brand.trim() || undefined,
+          model: this.filterModel.model.trim() || undefined,
+        })
+        if (res.isSuccess && res.data) {
+          this.pageItems = res.data.items || []
+          this.total = res.data.total || 0
+          this.vehicleTypeOptions = (res.data.vehicle_types || []).map((vt: Entity.VehicleType) => ({
+            label: `${vt.brand} ${vt.model} (￥${vt.daily_rent_price.toFixed(2)})`,
+            value: vt.type_id,
+          }))
+          this.storeOptions = (res.data.stores || []).map((store: Entity.Store) => ({
+            label: store.store_name,
+            value: store.store_id,
+          }))
+        }
+        else {
+          this.pageItems = []
+          this.total = 0
+        }
+      }
+      catch (error) {
+        console.error('获取车辆列表失败:', error)
+        this.pageItems = []
+        this.total = 0
+      }
+      finally {
+        this.loading = false
+      }
+    },
+    async changePage(page: number, pageSize: number) {
+      this.page = page
+      this.pageSize = pageSize
+      await this.fetchInstancePage()
+    },
     async loadVehicleTypes() {
       this.isLoadingTypes = true
       try {
@@ -101,26 +151,21 @@ export const useVehicleInstanceStore = defineStore('vehicle-instance', {
         this.isLoadingStores = false
       }
     },
-    applyFilters() {
+    async applyFilters() {
+      // 筛选在服务端完成，重新从第一页加载
       this.searchLoading = true
-      this.loading = true
-      let filteredData = [...this.items]
-      const brandFilter = this.filterModel.brand.trim().toLowerCase()
-      const modelFilter = this.filterModel.model.trim().toLowerCase()
-
-      if (brandFilter)
-        filteredData = filteredData.filter(vehicle => vehicle.type?.brand?.toLowerCase().includes(brandFilter))
-
-      if (modelFilter)
-        filteredData = filteredData.filter(vehicle => vehicle.type?.model?.toLowerCase().includes(modelFilter))
-
-      this.displayedItems = filteredData
-      this.loading = false
-      this.searchLoading = false
+      this.page = 1
+      try {
+        await this.fetchInstancePage()
+      }
+      finally {
+        this.searchLoading = false
+      }
     },
-    resetFilters() {
+    async resetFilters() {
       this.filterModel = { ...initialFilterModel }
-      this.displayedItems = [...this.items]
+      this.page = 1
+      await this.fetchInstancePage()
     },
     async createVehicle(itemData: { type_id: number, manufacture_date: string, store_id: number }) {
       this.loading = true
@@ -128,7 +173,7 @@ export const useVehicleInstanceStore = defineStore('vehicle-instance', {
         const res: any = await fetchCreateVehicle(itemData)
         if (res.isSuccess) {
           window.$message.success('车辆添加成功')
-          await this.fetchVehicles()
+          await this.fetchInstancePage()
         }
       }
       catch (error) {
@@ -145,7 +190,7 @@ export const useVehicleInstanceStore = defineStore('vehicle-instance', {
         const res: any = await fetchUpdateVehicle(vehicleId, itemData)
         if (res.isSuccess) {
           window.$message.success('车辆信息更新成功')
-          await this.fetchVehicles()
+          await this.fetchInstancePage()
         }
       }
       catch (error) {
@@ -162,7 +207,7 @@ export const useVehicleInstanceStore = defineStore('vehicle-instance', {
         const res: any = await fetchDeleteVehicle(vehicleId)
         if (res.isSuccess) {
           window.$message.success('删除成功')
-          await this.fetchVehicles()
+          await this.fetchInstancePage()
         }
       }
       catch (error) {
@@ -6,5 +6,7 @@ namespace Entity{
     store_name: string
     address: string
     phone_number: string
+    latitude?: number | null // 纬度，用于查找附近门店
+    longitude?: number | null // 经度
   }
 }
@@ -7,7 +7,7 @@ declare namespace Entity {
     type_id: number // 外键，关联到 VehicleType
     manufacture_date: string // 生产日期，格式 YYYY-MM-DD
     store_id: number // 外键，关联到 Store
-    status?: string // 可选，车辆状态，例如 'available', 'rented', 'maintenance'
+    status?: 'rented' | 'in_transfer' | 'available' // 可选，由 /views/vehicle-instances 在后端派生的车辆状态
 
     type?: VehicleType // 嵌套的车辆类型详细信息，用于显示品牌、型号、日租金等
     store?: Store // 嵌套的门店详细信息